@@ -1,10 +1,13 @@
 from sqlalchemy import create_engine, text, exc
 import pandas as pd
+import numpy as np
 import os
 import re
 import logging
+import threading
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional, List
+from typing import Optional, List, Tuple
 
 logger = logging.getLogger(__name__)
 
@@ -14,6 +17,26 @@ DB_HOST = os.getenv("DB_HOST")
 DB_NAME = os.getenv("DB_NAME")
 DB_PORT = os.getenv("DB_PORT", "5432")
 
+# indexed time column of the tables written by the loader
+TIME_COLUMN = "time_tag"
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+# number of points per series a downsampled query aims at
+TARGET_POINTS = int(os.getenv("DASHBOARD_TARGET_POINTS", "2000"))
+# bucket sizes in seconds a downsampled query picks from
+BUCKET_SECONDS = (1, 5, 10, 30, 60, 120, 300, 600, 900, 1800, 3600, 7200, 10800, 21600, 43200, 86400)
+# time the buckets of a downsampled query are aligned to
+BUCKET_ORIGIN = datetime(2000, 1, 1)
+# seconds after which cached rows are refreshed, only rows from the newest cached time on are read then
+CACHE_TTL_SECONDS = int(os.getenv("DASHBOARD_CACHE_TTL", "600"))
+# seconds after which a cached table is read again in full, picking up rows inserted before its newest row (backfills)
+FULL_REFRESH_SECONDS = int(os.getenv("DASHBOARD_FULL_REFRESH", "86400"))
+# memory the cached DataFrames may use, the least recently used entries are evicted above it
+CACHE_MAX_BYTES = int(os.getenv("DASHBOARD_CACHE_MB", "512")) * 2 ** 20
+
+if int(pd.__version__.split(".")[0]) < 3:
+    # pandas 3 always copies on write, cached frames are handed out as shallow copies relying on it
+    pd.set_option("mode.copy_on_write", True)
+
 if not (DB_USER and DB_PASSWORD and DB_HOST and DB_NAME):
     engine = None
     logger.warning("Database credentials not configured - database operations will fail")
@@ -80,7 +103,120 @@ def find_table_like(keywords: List[str]):
     return None
 
 
-_MEM_CACHE = {}
+class FrameCache:
+    """
+    LRU cache of DataFrames bounded by the memory they use, shared by all sessions of the dashboard.
+    Cached frames are handed out as shallow copies, copy-on-write keeps callers modifying them from changing the cache
+    """
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES):
+        """
+        :param max_bytes: memory the cached frames may use, measured with memory_usage(deep=True)
+        :type max_bytes: int
+        """
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: tuple) -> bool:
+        return key in self._entries
+
+    def get(self, key: tuple, ttl_seconds: Optional[int] = None) -> Tuple[Optional[dict], bool]:
+        """
+        Look an entry up and mark it as recently used, a fresh entry counts as a hit and anything else as a miss
+
+        :param key: key starting with the table name
+        :type key: tuple
+        :param ttl_seconds: age after which an entry is stale, None if entries never get stale
+        :type ttl_seconds: Optional[int]
+        :return: the entry, also when stale, and whether it is fresh; None and False if the key is not cached
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, False
+            self._entries.move_to_end(key)
+            fresh = ttl_seconds is None or (datetime.now() - entry['ts']) <= timedelta(seconds=ttl_seconds)
+            if fresh:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return entry, fresh
+
+    def put(self, key: tuple, df: pd.DataFrame, **fields) -> dict:
+        """
+        Cache a DataFrame, which must not be modified afterwards, and evict the least recently used entries above max_bytes
+
+        :param key: key starting with the table name
+        :type key: tuple
+        :param df:
+        :type df: pd.DataFrame
+        :param fields: additional fields of the entry, ts defaults to now
+        :return: the new entry
+        """
+        entry = {'ts': datetime.now(), **fields, 'df': df, 'bytes': _frame_bytes(df)}
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous['bytes']
+            self._entries[key] = entry
+            self.bytes += entry['bytes']
+            while self.bytes > self.max_bytes and self._entries:
+                evicted_key, evicted = self._entries.popitem(last=False)
+                self.bytes -= evicted['bytes']
+                self.evictions += 1
+                logger.info(f"Evicted cached data for table {evicted_key[0]} ({evicted['bytes'] / 2 ** 20:.1f} MiB)")
+        logger.debug(f"Cached data for table {key[0]} (rows={len(df)}, cache {self.bytes / 2 ** 20:.1f} MiB)")
+        return entry
+
+    def clear(self, table_name: Optional[str] = None) -> int:
+        """
+        :param table_name: table whose entries are removed, None to remove all entries
+        :type table_name: Optional[str]
+        :return: number of removed entries
+        """
+        with self._lock:
+            keys = [k for k in self._entries if table_name is None or k[0] == table_name]
+            for k in keys:
+                self.bytes -= self._entries.pop(k)['bytes']
+        return len(keys)
+
+    def stats(self) -> dict:
+        """
+        :return: number of entries, bytes used, budget, hits, misses, evictions and hit ratio
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': self.hits / lookups if lookups else 0.0
+            }
+
+
+def _frame_bytes(df: pd.DataFrame) -> int:
+    """
+    Memory used by a DataFrame, including the contents of object columns
+
+    :param df:
+    :type df: pd.DataFrame
+    :return:
+    """
+    return int(df.memory_usage(deep=True).sum())
+
+
+_CACHE = FrameCache()
 
 
 def clear_cache(table_name: Optional[str] = None):
@@ -91,14 +227,20 @@ def clear_cache(table_name: Optional[str] = None):
     :type table_name: Optional[str]
     :return:
     """
+    removed = _CACHE.clear(table_name)
     if table_name is None:
-        logger.info("Clearing all cache entries")
-        _MEM_CACHE.clear()
+        logger.info(f"Cleared all cache entries ({removed} entries)")
     else:
-        keys = [k for k in _MEM_CACHE.keys() if k[0] == table_name]
-        logger.info(f"Clearing cache for table {table_name} ({len(keys)} entries)")
-        for k in keys:
-            _MEM_CACHE.pop(k, None)
+        logger.info(f"Cleared cache for table {table_name} ({removed} entries)")
+
+
+def cache_stats() -> dict:
+    """
+    Usage and effectiveness of the memory cache
+
+    :return: see FrameCache.stats
+    """
+    return _CACHE.stats()
 
 
 def _is_time_like(col: str) -> bool:
@@ -112,73 +254,426 @@ def _is_time_like(col: str) -> bool:
     return bool(re.search(r"time|date|timetag|processedat|processed_at|observed", col))
 
 
-def read_table(table_name: str, limit: Optional[int] = None, use_cache: bool = True, ttl_seconds: Optional[int] = None, force_refresh: bool = False) -> pd.DataFrame:
+def _quote_identifier(name: str) -> str:
     """
-    Read a table from the database into a pandas DataFrame
+    Quote a table or column name for use in a query
 
-    :param table_name:
-    :type table_name: str
-    :param limit:
-    :type limit: Optional[int]
-    :param use_cache:
-    :type use_cache: bool
-    :param ttl_seconds:
-    :type ttl_seconds: Optional[int]
-    :param force_refresh:
-    :type force_refresh: bool
+    :param name: identifier, letters, digits and underscores only
+    :type name: str
     :return:
+    :raises ValueError: if the name is not a plain identifier
     """
-    if table_name is None:
-        logger.warning("read_table called with None table_name")
-        return pd.DataFrame()
+    if not _IDENTIFIER.match(name):
+        raise ValueError(f"Invalid table or column name: {name!r}")
+    return f'"{name}"'
 
-    key = (table_name, int(limit) if limit is not None else None)
 
-    # try memory cache
-    if use_cache and not force_refresh:
-        entry = _MEM_CACHE.get(key)
-        if entry is not None:
-            ts = entry.get('ts')
-            if ttl_seconds is None or (datetime.now() - ts) <= timedelta(seconds=ttl_seconds):
-                logger.debug(f"Returning cached data for table {table_name} (limit={limit})")
-                # return cached copy to prevent accidental mutation
-                return entry['df'].copy()
+def _read_sql(table_name: str, q: str, params: dict) -> pd.DataFrame:
+    """
+    Run a query reading from a table
 
+    :param table_name: table the query reads, for error messages
+    :type table_name: str
+    :param q:
+    :type q: str
+    :param params: bound parameters of the query
+    :type params: dict
+    :return:
+    :raises DatabaseConnectionError: if the query fails
+    """
     if engine is None:
         logger.error("Database engine not configured")
         raise RuntimeError("DB engine not configured (set DB_USER/DB_PASSWORD/DB_HOST/DB_NAME)")
-
-    logger.info(f"Reading table {table_name} from database (limit={limit})")
-    q = f'SELECT * FROM "{table_name}"'
-    if limit:
-        q += f" LIMIT {limit}"
-    
     try:
-        df = pd.read_sql(text(q), con=engine)
+        return pd.read_sql(text(q), con=engine, params=params)
     except exc.SQLAlchemyError as e:
         logger.error(f"Error reading table {table_name}: {e}")
         raise DatabaseConnectionError("Resources have been used up and please contact the author")
     except Exception as e:
         logger.error(f"Unexpected error reading table {table_name}: {e}")
         raise DatabaseConnectionError("Resources have been used up and please contact the author")
-    # normalize column names
-    df.columns = [c.lower() for c in df.columns]
 
+
+def _time_bounds(time_column: str, start: Optional[datetime], end: Optional[datetime]) -> Tuple[str, dict]:
+    """
+    WHERE clause limiting time_column to [start, end)
+
+    :param time_column:
+    :type time_column: str
+    :param start:
+    :type start: Optional[datetime]
+    :param end:
+    :type end: Optional[datetime]
+    :return: the clause, empty without bounds, and its parameters
+    """
+    conditions = []
+    params = {}
+    if start is not None:
+        conditions.append(f"{_quote_identifier(time_column)} >= :start")
+        params["start"] = start
+    if end is not None:
+        conditions.append(f"{_quote_identifier(time_column)} < :end")
+        params["end"] = end
+    return (" WHERE " + " AND ".join(conditions) if conditions else ""), params
+
+
+def _normalize(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Lowercase column names and parse time-like columns
+
+    :param df:
+    :type df: pd.DataFrame
+    :return:
+    """
+    df.columns = [c.lower() for c in df.columns]
     for c in df.columns:
         if _is_time_like(c):
             try:
                 df[c] = pd.to_datetime(df[c])
             except Exception:
                 pass
+    return df
 
-    try:
-        _MEM_CACHE[key] = {'ts': datetime.now(), 'df': df.copy()}
-        logger.debug(f"Cached data for table {table_name} (rows={len(df)})")
-    except Exception:
-        pass
 
+def _read_rows(table_name: str, columns: Optional[List[str]], time_column: str, condition: str, params: dict) -> pd.DataFrame:
+    """
+    Read the rows of a table matching a condition on time_column, ordered by it
+
+    :param table_name:
+    :type table_name: str
+    :param columns: columns to read, all columns when not given
+    :type columns: Optional[List[str]]
+    :param time_column:
+    :type time_column: str
+    :param condition: WHERE condition using bound parameters, empty for all rows
+    :type condition: str
+    :param params:
+    :type params: dict
+    :return:
+    """
+    select = ", ".join(_quote_identifier(c) for c in columns) if columns else "*"
+    q = f"SELECT {select} FROM {_quote_identifier(table_name)}"
+    if condition:
+        q += f" WHERE {condition}"
+    q += f" ORDER BY {_quote_identifier(time_column)}"
+    return _normalize(_read_sql(table_name, q, params))
+
+
+def _read_incremental(table_name: str, start: Optional[datetime], columns: Optional[List[str]], time_column: str,
+                      ttl_seconds: Optional[int], force_refresh: bool) -> pd.DataFrame:
+    """
+    Read rows from start on through an append-only cache of the table.
+    A cached table is extended instead of read again: once the TTL expires only rows from its newest time_column value on
+    are read, replacing the cached rows of that time, and a start earlier than the cached rows reads only the missing rows before them.
+    Every FULL_REFRESH_SECONDS the table is read in full, so rows inserted in the past are picked up as well
+
+    :param table_name:
+    :type table_name: str
+    :param start:
+    :type start: Optional[datetime]
+    :param columns:
+    :type columns: Optional[List[str]]
+    :param time_column:
+    :type time_column: str
+    :param ttl_seconds:
+    :type ttl_seconds: Optional[int]
+    :param force_refresh:
+    :type force_refresh: bool
+    :return:
+    """
+    if columns and time_column not in columns:
+        columns = [*columns, time_column]
+    key = (table_name, "incremental", tuple(columns) if columns else None, time_column)
+    tcol = _quote_identifier(time_column)
+    now = datetime.now()
+    entry, fresh = (None, False) if force_refresh else _CACHE.get(key, ttl_seconds)
+    if entry is not None and (now - entry['loaded']) > timedelta(seconds=FULL_REFRESH_SECONDS):
+        entry = None
+
+    if entry is None:
+        logger.info(f"Reading table {table_name} from database (start={start})")
+        df = _read_rows(table_name, columns, time_column, f"{tcol} >= :start" if start is not None else "", {"start": start})
+        entry = _CACHE.put(key, df, start=start, loaded=now)
+    else:
+        # cached frames are never modified, extending a table caches a new frame
+        df, cached_start, ts = entry['df'], entry['start'], entry['ts']
+        if cached_start is not None and (start is None or start < cached_start):
+            logger.info(f"Extending cached table {table_name} back to {start}")
+            condition = f"{tcol} < :cached_start" + (f" AND {tcol} >= :start" if start is not None else "")
+            head = _read_rows(table_name, columns, time_column, condition, {"start": start, "cached_start": cached_start})
+            df = pd.concat([head, df], ignore_index=True) if not head.empty else df
+            cached_start = start
+        if not fresh:
+            last = df[time_column].max() if not df.empty else None
+            if last is None:
+                condition, params = (f"{tcol} >= :start", {"start": cached_start}) if cached_start is not None else ("", {})
+            else:
+                # rows sharing the newest time may still be inserted (other satellites, energies or regions of the day),
+                # they are read again and replace the cached ones, so no row is missed or duplicated
+                condition, params = f"{tcol} >= :last", {"last": last.to_pydatetime()}
+            new = _read_rows(table_name, columns, time_column, condition, params)
+            if last is not None:
+                new = new[new[time_column] >= last]
+                df = df[df[time_column] < last]
+            logger.info(f"Appended {len(new)} new rows to cached table {table_name} (from {last})")
+            df = pd.concat([df, new], ignore_index=True) if not new.empty else df
+            ts = now
+        if df is not entry['df'] or ts != entry['ts']:
+            entry = _CACHE.put(key, df, ts=ts, start=cached_start, loaded=entry['loaded'])
+
+    df = entry['df']
+    if start is not None and entry['start'] != start:
+        df = df.iloc[df[time_column].searchsorted(pd.Timestamp(start)):]
     logger.info(f"Successfully loaded {len(df)} rows from table {table_name}")
-    return df
+    # a new frame sharing the cached data, copy-on-write protects the cache
+    return df.reset_index(drop=True)
+
+
+def read_table(table_name: str, limit: Optional[int] = None, use_cache: bool = True, ttl_seconds: Optional[int] = CACHE_TTL_SECONDS, force_refresh: bool = False,
+               start: Optional[datetime] = None, end: Optional[datetime] = None, columns: Optional[List[str]] = None, time_column: Optional[str] = TIME_COLUMN) -> pd.DataFrame:
+    """
+    Read a table from the database into a pandas DataFrame.
+    Time bounds, ordering and limit are applied in SQL on time_column, so only the requested window leaves the database.
+    Reads without limit and end are cached per table and refreshed incrementally, see _read_incremental
+
+    :param table_name:
+    :type table_name: str
+    :param limit: maximum number of rows, the latest rows by time_column are returned
+    :type limit: Optional[int]
+    :param use_cache:
+    :type use_cache: bool
+    :param ttl_seconds: age after which cached data is refreshed, None to never refresh it
+    :type ttl_seconds: Optional[int]
+    :param force_refresh:
+    :type force_refresh: bool
+    :param start: first time (inclusive) of the rows to read, in UTC like the stored time tags
+    :type start: Optional[datetime]
+    :param end: time (exclusive) the rows to read end at, in UTC like the stored time tags
+    :type end: Optional[datetime]
+    :param columns: columns to read, all columns when not given
+    :type columns: Optional[List[str]]
+    :param time_column: indexed column the bounds, ordering, limit and incremental refresh apply to, None to read the table unordered
+    :type time_column: Optional[str]
+    :return:
+    """
+    if table_name is None:
+        logger.warning("read_table called with None table_name")
+        return pd.DataFrame()
+
+    if (start is not None or end is not None) and time_column is None:
+        raise ValueError("start and end require a time_column")
+    if use_cache and time_column is not None and not limit and end is None:
+        return _read_incremental(table_name, start, columns, time_column, ttl_seconds, force_refresh)
+
+    key = (table_name, int(limit) if limit is not None else None, start, end, tuple(columns) if columns else None, time_column)
+
+    # try memory cache
+    if use_cache and not force_refresh:
+        entry, fresh = _CACHE.get(key, ttl_seconds)
+        if fresh:
+            logger.debug(f"Returning cached data for table {table_name} (limit={limit}, start={start}, end={end})")
+            return entry['df'].copy(deep=False)
+
+    select = ", ".join(_quote_identifier(c) for c in columns) if columns else "*"
+    q = f"SELECT {select} FROM {_quote_identifier(table_name)}"
+    where, params = _time_bounds(time_column, start, end) if time_column is not None else ("", {})
+    q += where
+    latest_first = bool(limit) and time_column is not None
+    if time_column is not None and (where or limit):
+        q += f" ORDER BY {_quote_identifier(time_column)}" + (" DESC" if latest_first else "")
+    if limit:
+        q += f" LIMIT {int(limit)}"
+
+    logger.info(f"Reading table {table_name} from database (limit={limit}, start={start}, end={end})")
+    df = _read_sql(table_name, q, params)
+    if latest_first:
+        df = df.iloc[::-1].reset_index(drop=True)
+    df = _normalize(df)
+
+    if use_cache:
+        _CACHE.put(key, df)
+
+    logger.info(f"Successfully loaded {len(df)} rows from table {table_name}")
+    return df.copy(deep=False)
+
+
+def pick_bucket(start: datetime, end: datetime, target_points: int = TARGET_POINTS) -> int:
+    """
+    Pick the smallest bucket size which covers a time range with at most target_points buckets
+
+    :param start:
+    :type start: datetime
+    :param end:
+    :type end: datetime
+    :param target_points:
+    :type target_points: int
+    :return: bucket size in seconds, one of BUCKET_SECONDS
+    """
+    if target_points < 1:
+        raise ValueError(f"target_points must be positive, got {target_points}")
+    span = (end - start).total_seconds()
+    for bucket in BUCKET_SECONDS:
+        if span / bucket <= target_points:
+            return bucket
+    return BUCKET_SECONDS[-1]
+
+
+def read_downsampled(table_name: str, value_columns: List[str], start: Optional[datetime] = None, end: Optional[datetime] = None,
+                     target_points: int = TARGET_POINTS, group_by: Optional[List[str]] = None, time_column: str = TIME_COLUMN,
+                     use_cache: bool = True, ttl_seconds: Optional[int] = CACHE_TTL_SECONDS, force_refresh: bool = False) -> pd.DataFrame:
+    """
+    Read a table aggregated into time buckets, so a long range of high-rate data arrives as about target_points rows per series.
+    The bucket size is picked from the time range of the rows between start and end, and the aggregation runs in PostgreSQL
+    with date_bin (PostgreSQL 14+). Every value column is returned as its mean, with <column>_min and <column>_max
+    holding the extremes of the bucket, and samples holding the number of rows in the bucket.
+    The bucket size in seconds is stored in df.attrs["bucket_seconds"]
+
+    :param table_name:
+    :type table_name: str
+    :param value_columns: numeric columns to aggregate
+    :type value_columns: List[str]
+    :param start: first time (inclusive) of the rows to read, in UTC like the stored time tags
+    :type start: Optional[datetime]
+    :param end: time (exclusive) the rows to read end at, in UTC like the stored time tags
+    :type end: Optional[datetime]
+    :param target_points: maximum number of buckets per series
+    :type target_points: int
+    :param group_by: columns splitting the rows into separate series, e.g. satellite
+    :type group_by: Optional[List[str]]
+    :param time_column: indexed column the rows are bucketed by, the bucket start is returned under its name
+    :type time_column: str
+    :param use_cache:
+    :type use_cache: bool
+    :param ttl_seconds: age after which cached data is read again, None to never refresh it
+    :type ttl_seconds: Optional[int]
+    :param force_refresh:
+    :type force_refresh: bool
+    :return:
+    """
+    if table_name is None:
+        logger.warning("read_downsampled called with None table_name")
+        return pd.DataFrame()
+    group_by = list(group_by or [])
+    key = (table_name, "downsampled", tuple(value_columns), start, end, int(target_points), tuple(group_by), time_column)
+    if use_cache and not force_refresh:
+        entry, fresh = _CACHE.get(key, ttl_seconds)
+        if fresh:
+            logger.debug(f"Returning cached downsampled data for table {table_name} (start={start}, end={end})")
+            return entry['df'].copy(deep=False)
+
+    table = _quote_identifier(table_name)
+    tcol = _quote_identifier(time_column)
+    where, params = _time_bounds(time_column, start, end)
+    # the actual extent of the data decides the bucket, an index-only scan of time_column
+    extent = _read_sql(table_name, f"SELECT min({tcol}) AS first, max({tcol}) AS last FROM {table}{where}", params)
+    first, last = extent["first"].iloc[0], extent["last"].iloc[0]
+    if pd.isna(first):
+        logger.info(f"No rows in table {table_name} between {start} and {end}")
+        return pd.DataFrame(columns=[time_column, *group_by, *value_columns])
+    bucket = pick_bucket(pd.Timestamp(first), pd.Timestamp(last), target_points)
+
+    groups = [_quote_identifier(c) for c in group_by]
+    aggregates = []
+    for c in value_columns:
+        col = _quote_identifier(c)
+        aggregates += [f"avg({col}) AS {col}", f"min({col}) AS {_quote_identifier(c + '_min')}", f"max({col}) AS {_quote_identifier(c + '_max')}"]
+    positions = ", ".join(str(i + 1) for i in range(len(groups) + 1))
+    q = (
+        f"SELECT date_bin(make_interval(0, 0, 0, 0, 0, 0, :bucket), {tcol}, :origin) AS {tcol}, "
+        + "".join(f"{g}, " for g in groups)
+        + ", ".join(aggregates)
+        + f", count(*) AS samples FROM {table}{where} GROUP BY {positions} ORDER BY {positions}"
+    )
+
+    logger.info(f"Reading table {table_name} downsampled to {bucket}s buckets (start={start}, end={end})")
+    df = _read_sql(table_name, q, {**params, "bucket": bucket, "origin": BUCKET_ORIGIN})
+    df.columns = [c.lower() for c in df.columns]
+    df[time_column] = pd.to_datetime(df[time_column])
+    df.attrs["bucket_seconds"] = bucket
+
+    if use_cache:
+        _CACHE.put(key, df)
+    logger.info(f"Successfully loaded {len(df)} buckets from table {table_name}")
+    return df.copy(deep=False)
+
+
+def read_histogram(table_name: str, value_column: str, bins: int, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                   time_column: str = TIME_COLUMN, use_cache: bool = True, ttl_seconds: Optional[int] = CACHE_TTL_SECONDS,
+                   force_refresh: bool = False) -> pd.DataFrame:
+    """
+    Count the raw values of a column in equal-width bins between its minimum and maximum. The counting runs in PostgreSQL
+    with width_bucket, so a long range of high-rate data is not transferred, and unlike a histogram of bucket means
+    from read_downsampled the tails of the distribution are not narrowed by averaging.
+    Every bin is returned, empty ones with a zero count, with value_column holding the bin center
+
+    :param table_name:
+    :type table_name: str
+    :param value_column: numeric column to count
+    :type value_column: str
+    :param bins: number of bins
+    :type bins: int
+    :param start: first time (inclusive) of the rows to count, in UTC like the stored time tags
+    :type start: Optional[datetime]
+    :param end: time (exclusive) the rows to count end at, in UTC like the stored time tags
+    :type end: Optional[datetime]
+    :param time_column: indexed column start and end apply to
+    :type time_column: str
+    :param use_cache:
+    :type use_cache: bool
+    :param ttl_seconds: age after which cached counts are read again, None to never refresh them
+    :type ttl_seconds: Optional[int]
+    :param force_refresh:
+    :type force_refresh: bool
+    :return: DataFrame with value_column, bin_start, bin_end and count columns
+    """
+    if bins < 1:
+        raise ValueError(f"bins must be positive, got {bins}")
+    columns = [value_column, "bin_start", "bin_end", "count"]
+    if table_name is None:
+        logger.warning("read_histogram called with None table_name")
+        return pd.DataFrame(columns=columns)
+    key = (table_name, "histogram", value_column, int(bins), start, end, time_column)
+    if use_cache and not force_refresh:
+        entry, fresh = _CACHE.get(key, ttl_seconds)
+        if fresh:
+            logger.debug(f"Returning cached histogram of {value_column} for table {table_name} (start={start}, end={end})")
+            return entry['df'].copy(deep=False)
+
+    table = _quote_identifier(table_name)
+    col = _quote_identifier(value_column)
+    where, params = _time_bounds(time_column, start, end)
+    where += (" AND " if where else " WHERE ") + f"{col} IS NOT NULL"
+    extent = _read_sql(table_name, f"SELECT min({col}) AS lo, max({col}) AS hi FROM {table}{where}", params)
+    lo, hi = extent["lo"].iloc[0], extent["hi"].iloc[0]
+    if pd.isna(lo):
+        logger.info(f"No values of {value_column} in table {table_name} between {start} and {end}")
+        return pd.DataFrame(columns=columns)
+    lo, hi = float(lo), float(hi)
+
+    if lo == hi:
+        # width_bucket needs distinct bounds, every value falls into a single bin
+        total = _read_sql(table_name, f"SELECT count(*) AS count FROM {table}{where}", params)["count"].iloc[0]
+        df = pd.DataFrame({value_column: [lo], "bin_start": [lo], "bin_end": [hi], "count": [int(total)]})
+    else:
+        # the maximum lands in bin bins + 1 of width_bucket, it is counted in the last bin instead
+        q = (
+            f"SELECT least(width_bucket(CAST({col} AS double precision), :lo, :hi, :bins), :bins) AS bin, count(*) AS count "
+            f"FROM {table}{where} GROUP BY 1 ORDER BY 1"
+        )
+        logger.info(f"Reading histogram of {value_column} in table {table_name} (bins={bins}, start={start}, end={end})")
+        counts = _read_sql(table_name, q, {**params, "lo": lo, "hi": hi, "bins": int(bins)})
+        counts.columns = [c.lower() for c in counts.columns]
+        counts = counts.set_index("bin")["count"].reindex(range(1, bins + 1), fill_value=0)
+        width = (hi - lo) / bins
+        bin_start = lo + width * np.arange(bins)
+        df = pd.DataFrame({
+            value_column: bin_start + width / 2, "bin_start": bin_start, "bin_end": bin_start + width,
+            "count": counts.to_numpy(dtype="int64")
+        })
+
+    if use_cache:
+        _CACHE.put(key, df)
+    return df.copy(deep=False)
 
 
 def pick_time_column(df: pd.DataFrame) -> Optional[str]:
@@ -1,4 +1,5 @@
-from typing import Optional
+from datetime import datetime
+from typing import Optional, Tuple
 import streamlit as st
 import plotly.express as px
 import pandas as pd
@@ -9,10 +10,13 @@ try:
 except Exception:
     from dashboard.db import find_table_like, read_table, pick_time_column
 
-from plot_utils import add_gray_areas_empty, set_layout, add_download_button, kp_to_g_scale
+from plot_utils import add_gray_areas_empty, set_layout, add_download_button, kp_to_g_scale, decimate, PLOT_POINTS
 
 logger = logging.getLogger(__name__)
 
+PLANETARY_COLUMNS = ("time_tag", "kp_index", "estimated_kp", "kp")
+BOULDER_COLUMNS = ("time_tag", "k_index")
+
 
 def _detect_k_column(df: pd.DataFrame):
     """
@@ -29,35 +33,42 @@ def _detect_k_column(df: pd.DataFrame):
     return nums[0] if nums else None
 
 
-@st.cache_data(ttl=600)
-def _load_table_cached(name: str, limit: Optional[int] = None):
+def _load_table_cached(name: str, limit: Optional[int] = None, start: Optional[datetime] = None, columns: Optional[Tuple[str, ...]] = None):
     """
-    Load table from database with caching
+    Load table through the shared cache of db
 
     :param name:
     :type name: str
     :param limit:
     :type limit: int or None
+    :param start: first time to load, the whole history when not given
+    :type start: datetime or None
+    :param columns: columns to load, all when not given
+    :type columns: tuple[str, ...] or None
     :return:
     """
-    return read_table(name, limit=limit)
+    return read_table(name, limit=limit, start=start, columns=list(columns) if columns else None)
 
 
-def render(limit: Optional[int] = None):
+def render(limit: Optional[int] = None, start: Optional[datetime] = None, max_points: Optional[int] = PLOT_POINTS):
     """
     Render geomagnetic K-index plots
 
     :param limit:
     :type limit: int or None
+    :param start: first time to show, the whole history when not given
+    :type start: datetime or None
+    :param max_points: maximum number of points per plotted trace, None plots every point
+    :type max_points: int or None
     :return:
     """
-    logger.info(f"Rendering geomagnetyzm page (limit={limit})")
+    logger.info(f"Rendering geomagnetyzm page (limit={limit}, start={start}, max_points={max_points})")
     st.title("Geomagnetism")
     st.subheader("Planetary and Local K-index")
 
     p_table = find_table_like(["planetary", "k"]) or find_table_like(["k", "index"]) or find_table_like(["planetary","kp"])
     logger.debug(f"Found planetary K table: {p_table}")
-    df_p = _load_table_cached(p_table, limit) if p_table else pd.DataFrame()
+    df_p = _load_table_cached(p_table, limit, start, PLANETARY_COLUMNS) if p_table else pd.DataFrame()
     if not df_p.empty:
         tcol = pick_time_column(df_p)
         ycol = _detect_k_column(df_p)
@@ -82,7 +93,7 @@ def render(limit: Optional[int] = None):
         - **7-9**: Strong to extreme geomagnetic storm
         ''')
     if tcol and ycol:
-        fig = px.line(df_p.sort_values(tcol), x=tcol, y=ycol, labels={tcol: "Observation date", ycol: "Kp Index"}, markers=True)
+        fig = px.line(decimate(df_p, tcol, ycol, max_points).sort_values(tcol), x=tcol, y=ycol, labels={tcol: "Observation date", ycol: "Kp Index"}, markers=True)
         fig.update_traces(mode='lines+markers', marker=dict(size=4), line=dict(width=1.5))
         set_layout(fig, "Planetary Kp — KpIndex vs Observation date", tcol_data=df_p[tcol],
                     autorange=False)
@@ -197,7 +208,7 @@ def render(limit: Optional[int] = None):
 
     b_table = find_table_like(["boulder"]) or find_table_like(["boulder", "k"]) or find_table_like(["boulder","kindex"])
     logger.debug(f"Found Boulder K table: {b_table}")
-    df_b = _load_table_cached(b_table, limit) if b_table else pd.DataFrame()
+    df_b = _load_table_cached(b_table, limit, start, BOULDER_COLUMNS) if b_table else pd.DataFrame()
     if not df_b.empty:
         tcol = pick_time_column(df_b)
         ycol = None
@@ -227,7 +238,7 @@ def render(limit: Optional[int] = None):
             differences in geomagnetic activity.
             ''')
         if tcol and ycol:
-            fig = px.line(df_b.sort_values(tcol), x=tcol, y=ycol, labels={tcol: 'Observation date', ycol: 'K Index'}, line_shape='spline')
+            fig = px.line(decimate(df_b, tcol, ycol, max_points).sort_values(tcol), x=tcol, y=ycol, labels={tcol: 'Observation date', ycol: 'K Index'}, line_shape='spline')
             fig.update_traces(marker=dict(size=3), line=dict(width=1.25))
             set_layout(fig, 'K Index vs Observation date', tcol_data=df_p[tcol])
             add_gray_areas_empty(fig, df_b, tcol)
@@ -1,32 +1,37 @@
-from typing import Optional
+from datetime import datetime
+from typing import Optional, Tuple
 import streamlit as st
 import plotly.express as px
 import pandas as pd
 import logging
 
 try:
-    from db import find_table_like, read_table, pick_time_column
+    from db import find_table_like, read_downsampled, read_histogram, pick_time_column
 except Exception:
-    from dashboard.db import find_table_like, read_table, pick_time_column
+    from dashboard.db import find_table_like, read_downsampled, read_histogram, pick_time_column
 
-from plot_utils import set_layout, add_gray_areas_empty, add_download_button
+from plot_utils import set_layout, add_gray_areas_empty, add_download_button, bucket_label, decimate, PLOT_POINTS
 
 logger = logging.getLogger(__name__)
 
+MAG_COLUMNS = ("bt", "bx_gsm", "by_gsm", "bz_gsm")
+BZ_BINS = 15
 
-@st.cache_data(ttl=600)
-def _load_table_cached(name: str, limit: Optional[int] = None) -> pd.DataFrame:
+
+def _load_downsampled_cached(name: str, columns: Tuple[str, ...], start: Optional[datetime] = None) -> pd.DataFrame:
     """
-    Load table with caching
+    Load table aggregated into time buckets through the shared cache of db
 
     :param name:
     :type name: str
-    :param limit:
-    :type limit: Optional[int]
+    :param columns: columns to aggregate
+    :type columns: Tuple[str, ...]
+    :param start: first time to load, the whole history when not given
+    :type start: Optional[datetime]
     :return:
     :rtype: pd.DataFrame
     """
-    return read_table(name, limit=limit)
+    return read_downsampled(name, list(columns), start=start)
 
 
 def _label_for_col(col_name: str) -> str:
@@ -50,19 +55,23 @@ def _label_for_col(col_name: str) -> str:
     return col_name.replace('_', ' ').title()
 
 
-def render(limit: Optional[int] = None):
+def render(limit: Optional[int] = None, start: Optional[datetime] = None, max_points: Optional[int] = PLOT_POINTS):
     """
     Render the interplanetary magnetic field (DSCOVR) dashboard section
 
     :param limit:
     :type limit: Optional[int]
+    :param start: first time to show, the whole history when not given
+    :type start: Optional[datetime]
+    :param max_points: maximum number of points per plotted trace, None plots every point
+    :type max_points: Optional[int]
     :return:
     """
-    logger.info(f"Rendering magnetic field page (limit={limit})")
+    logger.info(f"Rendering magnetic field page (limit={limit}, start={start}, max_points={max_points})")
     st.title("Interplanetary Magnetic Field (DSCOVR)")
     table_name = find_table_like(["dscovr", "mag"]) or find_table_like(["magnetometer"]) or find_table_like(["dscovr"])
     logger.debug(f"Found magnetic field table: {table_name}")
-    df = _load_table_cached(table_name, limit) if table_name else pd.DataFrame()
+    df = _load_downsampled_cached(table_name, MAG_COLUMNS, start) if table_name else pd.DataFrame()
     if df.empty:
         st.info("No DSCOVR magnetometer data")
         return
@@ -85,11 +94,12 @@ def render(limit: Optional[int] = None):
         - **Observation date**: Time of measurement
 
         ''')
-    comps = [c for c in df.columns if any(x in c for x in ["bt", "bx", "by", "bz"]) ]
+    # bucket means are plotted, their _min and _max extremes stay in the downloaded data
+    comps = [c for c in df.columns if any(x in c for x in ["bt", "bx", "by", "bz"]) and not c.endswith(("_min", "_max"))]
     if tcol and comps:
         # build nice labels mapping and rename for plotting
         name_map = {c: _label_for_col(c) for c in comps}
-        fig = px.line(df.sort_values(tcol), x=tcol, y=comps, labels={tcol: 'Observation date', 'variable': 'Component'}, color_discrete_sequence=px.colors.qualitative.Set2)
+        fig = px.line(decimate(df, tcol, comps, max_points).sort_values(tcol), x=tcol, y=comps, labels={tcol: 'Observation date', 'variable': 'Component'}, color_discrete_sequence=px.colors.qualitative.Set2)
         # update trace names
         for tr in fig.data:
             orig = tr.name
@@ -101,7 +111,8 @@ def render(limit: Optional[int] = None):
 
         add_gray_areas_empty(fig, df, tcol)
         st.plotly_chart(fig, use_container_width=True)
-        download_cols = [tcol] + comps if tcol and comps else df.columns.tolist()
+        st.caption(f"Mean of every {bucket_label(df)} interval")
+        download_cols = [c for c in df.columns if c == tcol or c.startswith(tuple(comps))]
         download_df = df[download_cols].copy()
         add_download_button(download_df, "magnetic_field_dscovr", "Download chart data as CSV")
     else:
@@ -109,7 +120,7 @@ def render(limit: Optional[int] = None):
 
     bzg = None
     for c in df.columns:
-        if 'bz_gsm' in c or c == 'bz' or c.endswith('bz'):
+        if c == 'bz_gsm' or c == 'bz' or c.endswith('bz'):
             bzg = c
             break
     if bzg:
@@ -133,8 +144,11 @@ def render(limit: Optional[int] = None):
             - Positive (northward) Bz values act protectively and reduce coupling efficiency
             - A distribution with a prevalence of negative values indicates periods of increased geomagnetic activity
             ''')
-        fig2 = px.histogram(df, x=bzg, nbins=15, labels={bzg: 'Bz (GSM) [nT]'}, color_discrete_sequence=['#636EFA'])
+        # counted over the raw measurements, bucket means would narrow the distribution
+        hist = read_histogram(table_name, bzg, BZ_BINS, start=start)
+        fig2 = px.bar(hist, x=bzg, y='count', labels={bzg: 'Bz (GSM) [nT]', 'count': 'Count in range'}, color_discrete_sequence=['#636EFA'])
+        fig2.update_layout(bargap=0)
         set_layout(fig2, 'Statistical Distribution of Bz Component (GSM)', rangeslider=False, yaxis_title="Count in range")
         st.plotly_chart(fig2, use_container_width=True)
-        download_df = df[[bzg]].copy() if bzg else df.copy()
+        download_df = hist.copy()
         add_download_button(download_df, "bz_distribution", "Download chart data as CSV")
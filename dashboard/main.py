@@ -1,8 +1,10 @@
 import streamlit as st
 import runpy
 import logging
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from db import DatabaseConnectionError, check_db_connection
+from db import DatabaseConnectionError, check_db_connection, cache_stats
+from plot_utils import PLOT_POINTS
 
 logger = logging.getLogger(__name__)
 
@@ -19,14 +21,47 @@ PAGES = [
     ("Solar Regions", "solar_regions.py")
 ]
 
+# time windows the pages read from the database, None reads the whole history
+WINDOWS = {
+    "Last 24 hours": timedelta(days=1),
+    "Last 3 days": timedelta(days=3),
+    "Last 7 days": timedelta(days=7),
+    "Last 30 days": timedelta(days=30),
+    "Last 90 days": timedelta(days=90),
+    "All data": None
+}
+# choices of the maximum number of points per plotted trace
+POINT_CHOICES = sorted({500, 1000, 2000, 5000, 10000, PLOT_POINTS})
+# the window start is rounded down to this step, so reruns within it hit the page caches
+WINDOW_STEP = timedelta(minutes=10)
+
+
+def _window_start(window: timedelta | None) -> datetime | None:
+    """
+    Start of a time window ending now, as a naive UTC datetime like the stored time tags
+
+    :param window:
+    :type window: timedelta | None
+    :return:
+    """
+    if window is None:
+        return None
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    start = now - window
+    return start - (start - datetime.min) % WINDOW_STEP
+
+
 page_names = [p[0] for p in PAGES]
 choice = st.sidebar.selectbox("Select Analysis Type", page_names)
+window_name = st.sidebar.selectbox("Time range", list(WINDOWS), index=list(WINDOWS).index("Last 7 days"))
+start = _window_start(WINDOWS[window_name])
+max_points = st.sidebar.select_slider("Points per trace", POINT_CHOICES, value=PLOT_POINTS)
 
 sel_index = page_names.index(choice)
 sel_file = PAGES[sel_index][1]
 sel_path = BASE / sel_file
 
-logger.info(f"User selected page: {choice} ({sel_file})")
+logger.info(f"User selected page: {choice} ({sel_file}), time range: {window_name}")
 
 if not sel_path.exists():
     logger.error(f"Page file not found: {sel_file}")
@@ -37,11 +72,12 @@ else:
         logger.info(f"Loading and rendering page: {sel_file}")
         mod = runpy.run_path(str(sel_path))
         if 'render' in mod and callable(mod['render']):
-            mod['render']()
+            mod['render'](start=start, max_points=max_points)
             logger.info(f"Successfully rendered page: {sel_file}")
+            logger.info(f"Data cache: {cache_stats()}")
         else:
             logger.error(f"Page {sel_file} does not have a render() function")
-            st.error('Missing render(limit=...) function in page module')
+            st.error('Missing render(limit=..., start=..., max_points=...) function in page module')
     except DatabaseConnectionError as e:
         logger.error(f"Database error on page {sel_file}: {e}")
         st.error(str(e))
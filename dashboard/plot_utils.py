@@ -1,9 +1,16 @@
+import os
 from datetime import datetime
+from typing import List, Optional, Union
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 from plotly.graph_objects import Figure
 import streamlit as st
 
+# maximum number of points per trace sent to the browser, see decimate
+PLOT_POINTS = int(os.getenv("DASHBOARD_PLOT_POINTS", "2000"))
+DECIMATION_METHODS = ("lttb", "minmax")
+
 
 def set_layout(fig: go.Figure,
                title: str = None,
@@ -151,6 +158,147 @@ def add_download_button(df: pd.DataFrame, filename: str, button_label: str = "Do
     )
 
 
+def bucket_label(df: pd.DataFrame) -> str:
+    """
+    Describe the bucket size of data returned by db.read_downsampled, e.g. "5 min"
+
+    :param df:
+    :type df: pd.DataFrame
+    :return:
+    """
+    seconds = df.attrs.get("bucket_seconds", 1)
+    if seconds % 3600 == 0:
+        return f"{seconds // 3600} h"
+    if seconds % 60 == 0:
+        return f"{seconds // 60} min"
+    return f"{seconds} s"
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling, keeps the points which shape the line the most
+
+    :param x: sorted x values, finite
+    :type x: np.ndarray
+    :param y: y values, finite
+    :type y: np.ndarray
+    :param n_out: number of points to keep, the first and the last point are always kept
+    :type n_out: int
+    :return: sorted positions of the kept points
+    :rtype: np.ndarray
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # n_out - 2 buckets over the points between the first and the last one
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    starts, ends = edges[:-1], edges[1:]
+    counts = ends - starts
+    # the third vertex of the triangles of a bucket is the average of the next bucket, the last point for the last bucket
+    avg_x = np.append(np.add.reduceat(x[:n - 1], starts)[1:] / counts[1:], x[-1])
+    avg_y = np.append(np.add.reduceat(y[:n - 1], starts)[1:] / counts[1:], y[-1])
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i, (lo, hi) in enumerate(zip(starts, ends)):
+        area = np.abs((x[a] - avg_x[i]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y[i] - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax_indices(y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Min/max envelope downsampling, keeps the lowest and the highest point of every bucket, so no peak is lost
+
+    :param y: y values ordered by x, finite
+    :type y: np.ndarray
+    :param n_out: number of points to keep, two per bucket
+    :type n_out: int
+    :return: sorted positions of the kept points
+    :rtype: np.ndarray
+    """
+    n = len(y)
+    if n_out >= n:
+        return np.arange(n)
+    # equal buckets of size points, the last one padded with values which are never picked
+    size = -(-n // max(n_out // 2, 1))
+    n_buckets = -(-n // size)
+    offsets = np.arange(n_buckets) * size
+    padded = np.full(n_buckets * size, np.inf)
+    padded[:n] = y
+    mins = padded.reshape(n_buckets, size).argmin(axis=1) + offsets
+    padded[n:] = -np.inf
+    maxs = padded.reshape(n_buckets, size).argmax(axis=1) + offsets
+    return np.unique(np.concatenate([mins, maxs, [0, n - 1]]))
+
+
+def _numeric_x(values: pd.Series) -> np.ndarray:
+    """
+    Convert x values to floats, datetimes to seconds
+
+    :param values:
+    :type values: pd.Series
+    :return:
+    """
+    if pd.api.types.is_datetime64_any_dtype(values) or values.dtype == object:
+        t = pd.to_datetime(values, errors='coerce')
+        seconds = t.to_numpy(dtype='datetime64[ns]').astype(np.int64) / 1e9
+        return np.where(t.isna().to_numpy(), np.nan, seconds)
+    return values.to_numpy(dtype=float)
+
+
+def decimate(df: pd.DataFrame, x: str, y: Union[str, List[str]], max_points: Optional[int] = PLOT_POINTS, method: str = 'lttb',
+             group: Optional[Union[str, List[str]]] = None, log_y: bool = False) -> pd.DataFrame:
+    """
+    Reduce the rows of a DataFrame to at most max_points per trace before building a figure from it.
+    Points are picked per trace and per y column, a row is kept if any of its y values is picked
+
+    :param df:
+    :type df: pd.DataFrame
+    :param x: column of the x axis, usually the time column
+    :type x: str
+    :param y: column or columns plotted as traces
+    :type y: Union[str, List[str]]
+    :param max_points: maximum number of points per trace, None keeps all rows
+    :type max_points: Optional[int]
+    :param method: 'lttb' to keep the shape of the line, 'minmax' to keep the extremes of every bucket
+    :type method: str
+    :param group: column or columns splitting the rows into traces, e.g. satellite
+    :type group: Optional[Union[str, List[str]]]
+    :param log_y: pick the points on the log10 of the values, for traces on a logarithmic axis
+    :type log_y: bool
+    :return: the kept rows in their original order
+    """
+    if method not in DECIMATION_METHODS:
+        raise ValueError(f"Unknown decimation method {method}, expected one of {', '.join(DECIMATION_METHODS)}")
+    if df is None or df.empty or max_points is None or len(df) <= max_points:
+        return df
+    ys = [y] if isinstance(y, str) else list(y)
+    xs = _numeric_x(df[x])
+    traces = df.groupby(group, sort=False, dropna=False).indices.values() if group else [np.arange(len(df))]
+    keep = []
+    for positions in traces:
+        positions = positions[np.argsort(xs[positions], kind='stable')]
+        if len(positions) <= max_points:
+            keep.append(positions)
+            continue
+        for col in ys:
+            values = df[col].to_numpy(dtype=float)[positions]
+            if log_y:
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    values = np.where(values > 0, np.log10(values), np.nan)
+            finite = np.flatnonzero(np.isfinite(values) & np.isfinite(xs[positions]))
+            if method == 'lttb':
+                picked = lttb_indices(xs[positions][finite], values[finite], max_points)
+            else:
+                picked = minmax_indices(values[finite], max_points)
+            keep.append(positions[finite[picked]])
+    return df.iloc[np.unique(np.concatenate(keep))]
+
+
 def kp_to_g_scale(kp_value):
                 """Convert Kp index to G-scale"""
                 g_value = int(kp_value) - 4
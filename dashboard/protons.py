@@ -1,23 +1,26 @@
 import logging
 import re
-from typing import Optional, Union
+from datetime import datetime
+from typing import Optional, Tuple, Union
 import streamlit as st
 import plotly.express as px
 import pandas as pd
 import numpy as np
 
 try:
-    from db import find_table_like, read_table, pick_time_column
+    from db import find_table_like, read_downsampled, pick_time_column
 except Exception:
-    from dashboard.db import find_table_like, read_table, pick_time_column
+    from dashboard.db import find_table_like, read_downsampled, pick_time_column
 
 try:
-    from plot_utils import set_layout, add_gray_areas_empty, add_download_button
+    from plot_utils import set_layout, add_gray_areas_empty, add_download_button, bucket_label, decimate, PLOT_POINTS
 except Exception:
-    from dashboard.plot_utils import set_layout, add_gray_areas_empty, add_download_button
+    from dashboard.plot_utils import set_layout, add_gray_areas_empty, add_download_button, bucket_label, decimate, PLOT_POINTS
 
 logger = logging.getLogger(__name__)
 
+PROTON_COLUMNS = ("flux",)
+
 
 def _parse_energy_val(e: Union[str, float, int, None]) -> float:
     """
@@ -38,35 +41,43 @@ def _parse_energy_val(e: Union[str, float, int, None]) -> float:
     return float(parts[0]) if parts else np.nan
 
 
-@st.cache_data(ttl=600)
-def _load_table_cached(name: str, limit: Optional[int] = None):
+def _load_downsampled_cached(name: str, columns: Tuple[str, ...], start: Optional[datetime] = None, group_by: Tuple[str, ...] = ()):
     """
-    Load table with caching
+    Load table aggregated into time buckets through the shared cache of db
 
     :param name:
     :type name: str
-    :param limit:
-    :type limit: Optional[int]
+    :param columns: columns to aggregate
+    :type columns: Tuple[str, ...]
+    :param start: first time to load, the whole history when not given
+    :type start: Optional[datetime]
+    :param group_by: columns splitting the rows into separate series
+    :type group_by: Tuple[str, ...]
     :return:
     """
-    return read_table(name, limit=limit)
+    return read_downsampled(name, list(columns), start=start, group_by=list(group_by))
 
 
-def render(limit: Optional[int] = None):
+def render(limit: Optional[int] = None, start: Optional[datetime] = None, max_points: Optional[int] = PLOT_POINTS):
     """
     Render proton radiation (integral fluxes) section
 
     :param limit:
     :type limit: Optional[int]
+    :param start: first time to show, the whole history when not given
+    :type start: Optional[datetime]
+    :param max_points: maximum number of points per plotted trace, None plots every point
+    :type max_points: Optional[int]
     :return:
     """
-    logger.info(f"Rendering protons page (limit={limit})")
+    logger.info(f"Rendering protons page (limit={limit}, start={start}, max_points={max_points})")
     st.title('Proton Radiation — Integral Fluxes')
     p_tab = find_table_like(['primary','integral','proton'])
     s_tab = find_table_like(['secondary','integral','proton'])
     logger.debug(f"Found primary proton table: {p_tab}, secondary: {s_tab}")
-    df_p = _load_table_cached(p_tab, limit) if p_tab else pd.DataFrame()
-    df_s = _load_table_cached(s_tab, limit) if s_tab else pd.DataFrame()
+    # one series per energy band, measurements of the band are averaged over satellites
+    df_p = _load_downsampled_cached(p_tab, PROTON_COLUMNS, start, ('energy',)) if p_tab else pd.DataFrame()
+    df_s = _load_downsampled_cached(s_tab, PROTON_COLUMNS, start, ('energy',)) if s_tab else pd.DataFrame()
 
     for name, df in (('Primary Data Source', df_p), ('Secondary Data Source', df_s)):
         if df.empty:
@@ -103,7 +114,7 @@ def render(limit: Optional[int] = None):
                 key=lambda s: float(re.findall(r'[\d.]+', s)[0])
             )
             fig = px.line(
-                df.sort_values([tcol, 'energy']),
+                decimate(df, tcol, ycol, max_points, group='energy', log_y=True).sort_values([tcol, 'energy']),
                 x=tcol,
                 y=ycol,
                 color='energy',
@@ -117,7 +128,7 @@ def render(limit: Optional[int] = None):
             set_layout(fig, f'{name} — Proton Fluxes by Energy', rangeslider=True, legend_title_text="Proton Energy", tcol_data=df[tcol])
         else:
             ycol = 'flux' if 'flux' in df.columns else df.select_dtypes('number').columns[0]
-            fig = px.line(df.sort_values(tcol), x=tcol, y=ycol, labels={tcol: 'Observation date', ycol: 'Proton Flux [pfu]', 'energy': 'Proton Energy'}, log_y=True, markers=True)
+            fig = px.line(decimate(df, tcol, ycol, max_points, log_y=True).sort_values(tcol), x=tcol, y=ycol, labels={tcol: 'Observation date', ycol: 'Proton Flux [pfu]', 'energy': 'Proton Energy'}, log_y=True, markers=True)
             fig.update_traces(line=dict(width=1.8), marker=dict(size=3))
             set_layout(fig, f'{name} — Proton Fluxes', rangeslider=True, legend_title_text="Proton Energy", tcol_data=df[tcol])
 
@@ -128,6 +139,7 @@ def render(limit: Optional[int] = None):
             )
         )
         st.plotly_chart(fig, use_container_width=True)
+        st.caption(f"Mean flux of every {bucket_label(df)} interval")
         download_df = df.copy()
         source_suffix = "primary" if name == 'Primary Data Source' else "secondary"
         add_download_button(download_df, f"protons_{source_suffix}", "Download chart data as CSV")
@@ -1,3 +1,4 @@
+from datetime import datetime
 from typing import Optional
 import streamlit as st
 import plotly.express as px
@@ -9,38 +10,46 @@ try:
 except Exception:
     from dashboard.db import find_table_like, read_table
 
-from plot_utils import set_layout, add_download_button
+from plot_utils import set_layout, add_download_button, decimate, PLOT_POINTS
 
 logger = logging.getLogger(__name__)
 
 
-@st.cache_data(ttl=600)
-def _load_table_cached(name: str, limit: Optional[int] = None) -> pd.DataFrame:
+def _load_table_cached(name: str, limit: Optional[int] = None, start: Optional[datetime] = None) -> pd.DataFrame:
     """
-    Load table from database with caching
+    Load table through the shared cache of db
 
     :param name:
     :type name: str
     :param limit:
     :type limit: Optional[int]
+    :param start: first observation date to load, the whole history when not given
+    :type start: Optional[datetime]
     :return:
     """
-    return read_table(name, limit=limit)
+    if start is not None:
+        # observed_date is a DATE column, a start within a day would drop the regions observed on that day
+        start = start.date()
+    return read_table(name, limit=limit, start=start, time_column="observed_date")
 
 
-def render(limit: Optional[int] = None):
+def render(limit: Optional[int] = None, start: Optional[datetime] = None, max_points: Optional[int] = PLOT_POINTS):
     """
     Render solar regions section
 
     :param limit:
     :type limit: Optional[int]
+    :param start: first observation date to show, the whole history when not given
+    :type start: Optional[datetime]
+    :param max_points: maximum number of points per plotted trace, None plots every point
+    :type max_points: Optional[int]
     :return:
     """
-    logger.info(f"Rendering solar regions page (limit={limit})")
+    logger.info(f"Rendering solar regions page (limit={limit}, start={start}, max_points={max_points})")
     st.title('Active Solar Regions')
     tname = find_table_like(['solar','region']) or find_table_like(['solarregions'])
     logger.debug(f"Found solar regions table: {tname}")
-    df = _load_table_cached(tname, limit) if tname else pd.DataFrame()
+    df = _load_table_cached(tname, limit, start) if tname else pd.DataFrame()
     if df.empty:
         st.info('No data for SolarRegions')
         return
@@ -75,7 +84,7 @@ def render(limit: Optional[int] = None):
             ''')
 
         area_ts = df.groupby('observed_date')['area'].mean().reset_index()
-        fig2 = px.line(area_ts, x='observed_date', y='area', labels={'observed_date':'Observation date','area':'Mean Area [μhem]'})
+        fig2 = px.line(decimate(area_ts, 'observed_date', 'area', max_points), x='observed_date', y='area', labels={'observed_date':'Observation date','area':'Mean Area [μhem]'})
         set_layout(fig2, rangeslider=True, tcol_data=area_ts['observed_date'])
         st.plotly_chart(fig2, use_container_width=True)
         add_download_button(area_ts, "solar_regions_areas_evolution", "Download chart data as CSV")
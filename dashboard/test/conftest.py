@@ -0,0 +1,64 @@
+import math
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import StaticPool
+
+# the pages import their siblings as top-level modules, as when run by streamlit from the dashboard directory
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import db  # noqa: E402
+
+
+def _width_bucket(value, low, high, count):
+    """
+    PostgreSQL width_bucket for low < high
+    """
+    if value is None:
+        return None
+    if value < low:
+        return 0
+    if value >= high:
+        return count + 1
+    return math.floor((value - low) / (high - low) * count) + 1
+
+
+def _make_interval(years, months, weeks, days, hours, mins, secs):
+    """
+    PostgreSQL make_interval for intervals of fixed length, as seconds
+    """
+    return (((weeks * 7 + days) * 24 + hours) * 60 + mins) * 60 + secs
+
+
+def _date_bin(stride, source, origin):
+    """
+    PostgreSQL date_bin on the ISO timestamps SQLite stores, stride in seconds
+    """
+    if source is None:
+        return None
+    source, origin = datetime.fromisoformat(source), datetime.fromisoformat(origin)
+    offset = (source - origin).total_seconds()
+    return str(origin + timedelta(seconds=offset - offset % stride))
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    """
+    In-memory SQLite database used by db instead of PostgreSQL, with the PostgreSQL functions the queries need
+    """
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+
+    @event.listens_for(engine, "connect")
+    def register_functions(connection, _):
+        connection.create_function("width_bucket", 4, _width_bucket)
+        connection.create_function("least", 2, min)
+        connection.create_function("make_interval", 7, _make_interval)
+        connection.create_function("date_bin", 3, _date_bin)
+
+    monkeypatch.setattr(db, "engine", engine)
+    db.clear_cache()
+    yield engine
+    db.clear_cache()
+    engine.dispose()
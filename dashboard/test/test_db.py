@@ -0,0 +1,355 @@
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import event
+
+import db
+
+
+def store(engine, name, values):
+    times = pd.date_range("2024-01-01", periods=len(values), freq="s")
+    pd.DataFrame({"time_tag": times, "bz_gsm": values}).to_sql(name, engine, index=False)
+
+
+class TestReadTable:
+    def test_start_and_end(self, engine):
+        store(engine, "mag", [0.0, 1.0, 2.0, 3.0, 4.0])
+
+        df = db.read_table("mag", start=datetime(2024, 1, 1, 0, 0, 1), end=datetime(2024, 1, 1, 0, 0, 3))
+
+        assert df["bz_gsm"].tolist() == [1.0, 2.0]
+
+    def test_columns(self, engine):
+        store(engine, "mag", [0.0, 1.0])
+
+        df = db.read_table("mag", columns=["bz_gsm"], end=datetime(2025, 1, 1))
+
+        assert list(df.columns) == ["bz_gsm"]
+
+    @pytest.mark.parametrize("use_cache", [False, True])
+    def test_limit_returns_latest_rows_in_order(self, engine, use_cache):
+        store(engine, "mag", [0.0, 1.0, 2.0, 3.0, 4.0])
+
+        df = db.read_table("mag", limit=2, use_cache=use_cache)
+
+        assert df["bz_gsm"].tolist() == [3.0, 4.0]
+        assert df.index.tolist() == [0, 1]
+
+    def test_bounds_require_time_column(self, engine):
+        with pytest.raises(ValueError):
+            db.read_table("mag", start=datetime(2024, 1, 1), time_column=None)
+
+    @pytest.mark.parametrize("kwargs", [
+        {"table_name": "mag; DROP TABLE mag"},
+        {"table_name": "mag", "columns": ["bz_gsm", 'x" FROM mag --']},
+        {"table_name": "mag", "time_column": "time tag", "end": datetime(2025, 1, 1)},
+    ])
+    def test_invalid_identifiers_rejected(self, engine, kwargs):
+        store(engine, "mag", [0.0])
+
+        with pytest.raises(ValueError, match="Invalid table or column name"):
+            db.read_table(**kwargs)
+
+    def test_quote_identifier(self):
+        assert db._quote_identifier("time_tag") == '"time_tag"'
+        for name in ["", "1st", "a-b", 'a"b', "a b"]:
+            with pytest.raises(ValueError):
+                db._quote_identifier(name)
+
+
+class TestReadHistogram:
+    def test_counts_raw_values(self, engine):
+        rng = np.random.default_rng(0)
+        values = rng.normal(0, 5, 10_000)
+        store(engine, "mag", values)
+
+        hist = db.read_histogram("mag", "bz_gsm", 15)
+
+        expected, edges = np.histogram(values, bins=15)
+        assert hist["count"].tolist() == expected.tolist()
+        assert np.allclose(hist["bin_start"], edges[:-1])
+        assert np.allclose(hist["bin_end"], edges[1:])
+        assert np.allclose(hist["bz_gsm"], (edges[:-1] + edges[1:]) / 2)
+
+    def test_tails_are_kept(self, engine):
+        # a histogram of one minute means would put every value into the center bin
+        values = np.tile([-20.0, 20.0], 600)
+        store(engine, "mag", values)
+
+        hist = db.read_histogram("mag", "bz_gsm", 4)
+
+        assert hist["count"].tolist() == [600, 0, 0, 600]
+
+    def test_start_and_nulls(self, engine):
+        store(engine, "mag", [100.0, None, 1.0, 2.0, 3.0])
+
+        hist = db.read_histogram("mag", "bz_gsm", 2, start=datetime(2024, 1, 1, 0, 0, 1))
+
+        assert hist["count"].tolist() == [1, 2]
+        assert hist["bin_start"].tolist() == [1.0, 2.0]
+
+    def test_single_value(self, engine):
+        store(engine, "mag", [4.0, 4.0, 4.0])
+
+        hist = db.read_histogram("mag", "bz_gsm", 10)
+
+        assert hist["count"].tolist() == [3]
+
+    def test_no_values(self, engine):
+        store(engine, "mag", [None, None])
+
+        assert db.read_histogram("mag", "bz_gsm", 10).empty
+
+    def test_cached(self, engine):
+        store(engine, "mag", [1.0, 2.0])
+
+        first = db.read_histogram("mag", "bz_gsm", 2)
+        with engine.begin() as conn:
+            conn.exec_driver_sql("DELETE FROM mag")
+        hits = db.cache_stats()["hits"]
+
+        assert db.read_histogram("mag", "bz_gsm", 2)["count"].tolist() == first["count"].tolist()
+        assert db.cache_stats()["hits"] == hits + 1
+
+
+class TestFrameCache:
+    @staticmethod
+    def frame(rows):
+        return pd.DataFrame({"value": np.arange(rows, dtype=np.float64)})
+
+    def test_least_recently_used_evicted_above_budget(self):
+        size = db._frame_bytes(self.frame(100))
+        cache = db.FrameCache(max_bytes=2 * size)
+        cache.put(("a",), self.frame(100))
+        cache.put(("b",), self.frame(100))
+        cache.get(("a",))
+
+        cache.put(("c",), self.frame(100))
+
+        assert ("a",) in cache and ("c",) in cache and ("b",) not in cache
+        assert cache.bytes == 2 * size
+        assert cache.stats()["evictions"] == 1
+
+    def test_frame_above_budget_not_kept(self):
+        cache = db.FrameCache(max_bytes=10)
+
+        cache.put(("a",), self.frame(100))
+
+        assert len(cache) == 0
+        assert cache.bytes == 0
+
+    def test_replacing_entry_updates_bytes(self):
+        cache = db.FrameCache()
+        cache.put(("a",), self.frame(100))
+
+        cache.put(("a",), self.frame(10))
+
+        assert len(cache) == 1
+        assert cache.bytes == db._frame_bytes(self.frame(10))
+
+    def test_hits_and_misses(self):
+        cache = db.FrameCache()
+        cache.put(("a",), self.frame(1), ts=datetime(2000, 1, 1))
+        cache.put(("b",), self.frame(1))
+
+        assert cache.get(("missing",)) == (None, False)
+        assert cache.get(("a",), ttl_seconds=60)[1] is False
+        assert cache.get(("b",), ttl_seconds=60)[1] is True
+        assert cache.get(("a",))[1] is True
+
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"]) == (2, 2)
+        assert stats["hit_ratio"] == 0.5
+
+    def test_clear_table(self):
+        cache = db.FrameCache()
+        cache.put(("a", 1), self.frame(1))
+        cache.put(("a", 2), self.frame(1))
+        cache.put(("b", 1), self.frame(1))
+
+        assert cache.clear("a") == 2
+        assert list(cache._entries) == [("b", 1)]
+        assert cache.bytes == db._frame_bytes(self.frame(1))
+
+    @pytest.mark.parametrize("time_column", [None, "time_tag"])
+    def test_mutating_returned_frame_keeps_cache(self, engine, time_column):
+        store(engine, "mag", [1.0, 2.0, 3.0])
+
+        df = db.read_table("mag", time_column=time_column)
+        df.loc[0, "bz_gsm"] = 100.0
+        df["extra"] = 1
+        df.drop(index=1, inplace=True)
+        hits = db.cache_stats()["hits"]
+
+        again = db.read_table("mag", time_column=time_column)
+        assert again["bz_gsm"].tolist() == [1.0, 2.0, 3.0]
+        assert list(again.columns) == ["time_tag", "bz_gsm"]
+        assert db.cache_stats()["hits"] == hits + 1
+
+
+class TestReadIncremental:
+    @staticmethod
+    def insert(engine, times, satellite, value):
+        pd.DataFrame({"time_tag": pd.to_datetime(times), "satellite": satellite, "flux": value}).to_sql(
+            "xrays", engine, index=False, if_exists="append")
+
+    @staticmethod
+    def statements(engine):
+        executed = []
+        event.listen(engine, "before_cursor_execute", lambda conn, cursor, statement, *args: executed.append(statement))
+        return executed
+
+    def test_same_time_rows_inserted_later_are_read(self, engine):
+        self.insert(engine, ["2024-01-01 00:00:00", "2024-01-01 00:01:00"], 16, 1.0)
+        assert len(db.read_table("xrays")) == 2
+
+        self.insert(engine, ["2024-01-01 00:01:00"], 17, 2.0)
+        df = db.read_table("xrays", ttl_seconds=0)
+
+        assert len(df) == 3
+        assert df[["satellite", "flux"]].values.tolist()[1:] == [[16, 1.0], [17, 2.0]]
+
+    def test_refresh_appends_newer_rows_only(self, engine):
+        self.insert(engine, ["2024-01-01 00:00:00", "2024-01-01 00:01:00"], 16, 1.0)
+        db.read_table("xrays")
+        self.insert(engine, ["2024-01-01 00:02:00"], 16, 3.0)
+        executed = self.statements(engine)
+
+        df = db.read_table("xrays", ttl_seconds=0)
+
+        assert df["flux"].tolist() == [1.0, 1.0, 3.0]
+        assert df["time_tag"].is_monotonic_increasing
+        assert len(executed) == 1 and '"time_tag" >= ?' in executed[0]
+
+    def test_fresh_entry_not_refreshed(self, engine):
+        self.insert(engine, ["2024-01-01 00:00:00"], 16, 1.0)
+        db.read_table("xrays")
+        self.insert(engine, ["2024-01-01 00:01:00"], 16, 2.0)
+
+        assert len(db.read_table("xrays")) == 1
+        assert len(db.read_table("xrays", force_refresh=True)) == 2
+
+    def test_earlier_start_reads_only_missing_rows(self, engine):
+        self.insert(engine, [f"2024-01-01 00:0{i}:00" for i in range(6)], 16, 1.0)
+        assert len(db.read_table("xrays", start=datetime(2024, 1, 1, 0, 3))) == 3
+        executed = self.statements(engine)
+
+        df = db.read_table("xrays", start=datetime(2024, 1, 1, 0, 1))
+
+        assert df["time_tag"].tolist() == list(pd.date_range("2024-01-01 00:01", periods=5, freq="min"))
+        assert len(executed) == 1 and '"time_tag" < ?' in executed[0]
+
+    def test_later_start_sliced_from_cache(self, engine):
+        self.insert(engine, [f"2024-01-01 00:0{i}:00" for i in range(6)], 16, 1.0)
+        db.read_table("xrays", start=datetime(2024, 1, 1, 0, 1))
+        executed = self.statements(engine)
+
+        df = db.read_table("xrays", start=datetime(2024, 1, 1, 0, 4))
+
+        assert df["time_tag"].tolist() == list(pd.date_range("2024-01-01 00:04", periods=2, freq="min"))
+        assert df.index.tolist() == [0, 1]
+        assert executed == []
+
+    def test_rows_inserted_in_the_past_read_after_full_refresh(self, engine, monkeypatch):
+        self.insert(engine, ["2024-01-01 00:00:00", "2024-01-01 00:02:00"], 16, 1.0)
+        db.read_table("xrays")
+        self.insert(engine, ["2024-01-01 00:01:00"], 16, 2.0)
+
+        assert len(db.read_table("xrays", ttl_seconds=0)) == 2
+        monkeypatch.setattr(db, "FULL_REFRESH_SECONDS", 0)
+        df = db.read_table("xrays", ttl_seconds=0)
+
+        assert df["flux"].tolist() == [1.0, 2.0, 1.0]
+
+    def test_empty_table_refreshed_from_start(self, engine):
+        self.insert(engine, ["2024-01-01 00:00:00"], 16, 1.0)
+        assert db.read_table("xrays", start=datetime(2024, 1, 2)).empty
+        self.insert(engine, ["2024-01-02 00:00:00", "2024-01-03 00:00:00"], 16, 2.0)
+
+        assert len(db.read_table("xrays", start=datetime(2024, 1, 2), ttl_seconds=0)) == 2
+
+
+class TestPickBucket:
+    @pytest.mark.parametrize("hours, target_points, expected", [
+        (0, 2000, 1),
+        (0.5, 2000, 1),
+        (1, 2000, 5),
+        (24, 2000, 60),
+        (24 * 7, 2000, 600),
+        (24 * 365, 2000, 21600),
+        (24 * 365 * 10, 2000, 86400),
+        (1, 60, 60),
+    ])
+    def test_smallest_bucket_within_target(self, hours, target_points, expected):
+        start = datetime(2024, 1, 1)
+
+        assert db.pick_bucket(start, start + pd.Timedelta(hours=hours), target_points) == expected
+
+    def test_target_points_must_be_positive(self):
+        with pytest.raises(ValueError):
+            db.pick_bucket(datetime(2024, 1, 1), datetime(2024, 1, 2), 0)
+
+
+class TestReadDownsampled:
+    @staticmethod
+    def store(engine, minutes):
+        times = pd.date_range("2024-01-01", periods=minutes * 60, freq="s")
+        df = pd.concat([
+            pd.DataFrame({"time_tag": times, "satellite": 16, "flux": np.arange(len(times), dtype=np.float64)}),
+            pd.DataFrame({"time_tag": times, "satellite": 18, "flux": -np.arange(len(times), dtype=np.float64)}),
+        ])
+        df.to_sql("xrays", engine, index=False)
+
+    def test_buckets_per_group(self, engine):
+        self.store(engine, 10)
+
+        df = db.read_downsampled("xrays", ["flux"], target_points=10, group_by=["satellite"])
+
+        assert df.attrs["bucket_seconds"] == 60
+        assert list(df.columns) == ["time_tag", "satellite", "flux", "flux_min", "flux_max", "samples"]
+        assert df["satellite"].tolist() == [16, 18] * 10
+        assert df["time_tag"].tolist() == list(pd.date_range("2024-01-01", periods=10, freq="min").repeat(2))
+        first = df.iloc[0]
+        assert (first["flux"], first["flux_min"], first["flux_max"], first["samples"]) == (29.5, 0.0, 59.0, 60)
+        last = df.iloc[-1]
+        assert (last["flux"], last["flux_min"], last["flux_max"], last["samples"]) == (-569.5, -599.0, -540.0, 60)
+
+    def test_without_groups(self, engine):
+        self.store(engine, 10)
+
+        df = db.read_downsampled("xrays", ["flux"], target_points=2)
+
+        assert df.attrs["bucket_seconds"] == 300
+        assert list(df.columns) == ["time_tag", "flux", "flux_min", "flux_max", "samples"]
+        assert df["samples"].tolist() == [600, 600]
+        assert df["flux"].tolist() == [0.0, 0.0]
+        assert df["flux_max"].tolist() == [299.0, 599.0]
+
+    def test_bucket_from_rows_between_bounds(self, engine):
+        self.store(engine, 10)
+
+        df = db.read_downsampled("xrays", ["flux"], start=datetime(2024, 1, 1, 0, 2), end=datetime(2024, 1, 1, 0, 3),
+                                 target_points=12, group_by=["satellite"])
+
+        assert df.attrs["bucket_seconds"] == 5
+        assert len(df) == 24
+        assert df["samples"].sum() == 120
+        assert df["time_tag"].iloc[0] == pd.Timestamp("2024-01-01 00:02")
+
+    def test_no_rows(self, engine):
+        self.store(engine, 1)
+
+        df = db.read_downsampled("xrays", ["flux"], start=datetime(2025, 1, 1), group_by=["satellite"])
+
+        assert df.empty
+        assert list(df.columns) == ["time_tag", "satellite", "flux"]
+
+    def test_cached(self, engine):
+        self.store(engine, 1)
+        first = db.read_downsampled("xrays", ["flux"])
+        with engine.begin() as conn:
+            conn.exec_driver_sql("DELETE FROM xrays")
+
+        assert db.read_downsampled("xrays", ["flux"])["samples"].tolist() == first["samples"].tolist()
+        assert db.read_downsampled("xrays", ["flux"], force_refresh=True).empty
@@ -0,0 +1,130 @@
+import math
+import numpy as np
+import pandas as pd
+import pytest
+
+from plot_utils import decimate, lttb_indices, minmax_indices
+
+
+def reference_lttb(x, y, n_out):
+    """
+    Straightforward LTTB after Steinarsson, one bucket at a time
+    """
+    n = len(x)
+    every = (n - 2) / (n_out - 2)
+    selected = [0]
+    a = 0
+    for i in range(n_out - 2):
+        avg_start = math.floor((i + 1) * every) + 1
+        avg_end = min(math.floor((i + 2) * every) + 1, n)
+        avg_x = sum(x[avg_start:avg_end]) / (avg_end - avg_start)
+        avg_y = sum(y[avg_start:avg_end]) / (avg_end - avg_start)
+        best, best_area = None, -1.0
+        for j in range(math.floor(i * every) + 1, math.floor((i + 1) * every) + 1):
+            area = abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a]))
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+        a = best
+    selected.append(n - 1)
+    return selected
+
+
+def series(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.arange(n, dtype=float), np.cumsum(rng.normal(size=n))
+
+
+class TestLttb:
+    @pytest.mark.parametrize("n, n_out", [(1000, 100), (1001, 37), (5000, 3), (250, 249)])
+    def test_matches_reference(self, n, n_out):
+        x, y = series(n)
+
+        assert lttb_indices(x, y, n_out).tolist() == reference_lttb(x.tolist(), y.tolist(), n_out)
+
+    def test_short_input_kept(self):
+        x, y = series(10)
+
+        assert lttb_indices(x, y, 10).tolist() == list(range(10))
+        assert lttb_indices(x, y, 2).tolist() == list(range(10))
+
+
+class TestMinMax:
+    def test_spikes_kept(self):
+        _, y = series(100_000)
+        spikes = [7, 33_333, 77_777, 99_998]
+        y[spikes[:2]] = 1e4
+        y[spikes[2:]] = -1e4
+
+        picked = minmax_indices(y, 200)
+
+        assert len(picked) <= 202
+        assert set(spikes) <= set(picked.tolist())
+        assert picked[0] == 0 and picked[-1] == len(y) - 1
+
+    def test_uneven_last_bucket(self):
+        y = np.arange(11, dtype=float)
+
+        assert minmax_indices(y, 4).tolist() == [0, 5, 6, 10]
+
+
+class TestDecimate:
+    @staticmethod
+    def frame(n, **columns):
+        times = pd.date_range("2024-01-01", periods=n, freq="s")
+        return pd.DataFrame({"time_tag": times, **columns})
+
+    def test_small_frame_unchanged(self):
+        df = self.frame(5, flux=np.arange(5.0))
+
+        assert decimate(df, "time_tag", "flux", 10) is df
+
+    def test_unknown_method(self):
+        with pytest.raises(ValueError, match="Unknown decimation method"):
+            decimate(self.frame(1, flux=[1.0]), "time_tag", "flux", method="mean")
+
+    def test_rows_kept_in_original_order(self):
+        _, y = series(1000)
+        df = self.frame(1000, flux=y).sample(frac=1, random_state=0)
+
+        out = decimate(df, "time_tag", "flux", 50)
+
+        assert len(out) == 50
+        positions = [df.index.get_loc(i) for i in out.index]
+        assert positions == sorted(positions)
+        assert out.index.isin(df.sort_values("time_tag").index[[0, -1]]).sum() == 2
+
+    def test_every_group_decimated_on_its_own(self):
+        _, y = series(2000)
+        df = self.frame(2000, flux=y, satellite=np.repeat(["goes-16", "goes-18"], 1000))
+        df.loc[df.index[1500], "flux"] = 1e6
+
+        out = decimate(df, "time_tag", "flux", 100, method="minmax", group="satellite")
+
+        assert out.groupby("satellite").size().max() <= 102
+        assert set(out["satellite"]) == {"goes-16", "goes-18"}
+        assert df.index[1500] in out.index
+
+    def test_nan_rows_skipped(self):
+        _, y = series(1000)
+        y[::3] = np.nan
+        df = self.frame(1000, flux=y)
+
+        out = decimate(df, "time_tag", "flux", 40)
+
+        assert len(out) == 40
+        assert out["flux"].notna().all()
+
+    def test_log_y_picks_on_log_values(self):
+        _, y = series(1000)
+        flux = 10.0 ** (y / 10 - 6)
+        flux[[10, 500]] = [0.0, -1.0]
+        df = self.frame(1000, flux=flux)
+
+        out = decimate(df, "time_tag", "flux", 60, log_y=True)
+
+        finite = np.flatnonzero(flux > 0)
+        seconds = np.arange(1000, dtype=float)[finite]
+        expected = finite[lttb_indices(seconds, np.log10(flux[finite]), 60)]
+        assert out.index.tolist() == df.index[expected].tolist()
+        assert (out["flux"] > 0).all()
@@ -0,0 +1,16 @@
+from datetime import date, datetime
+import pandas as pd
+
+import solar_regions
+
+
+def test_start_truncated_to_observation_date(engine):
+    pd.DataFrame({
+        "observed_date": [date(2024, 1, 1), date(2024, 1, 2), date(2024, 1, 2), date(2024, 1, 3)],
+        "region": [1, 1, 2, 1],
+    }).to_sql("solarregions", engine, index=False)
+
+    df = solar_regions._load_table_cached("solarregions", start=datetime(2024, 1, 2, 16, 40))
+
+    assert df["region"].tolist() == [1, 2, 1]
+    assert df["observed_date"].min() == pd.Timestamp("2024-01-02")
@@ -1,18 +1,22 @@
 from uuid import uuid4
-from typing import Optional
+from datetime import datetime
+from typing import Optional, Tuple
 import streamlit as st
 import plotly.express as px
 import pandas as pd
 import logging
 
 try:
-    from db import find_table_like, read_table, pick_time_column
+    from db import find_table_like, read_table, read_downsampled, read_histogram, pick_time_column
 except Exception:
-    from dashboard.db import find_table_like, read_table, pick_time_column
-from plot_utils import set_layout, add_gray_areas_empty, add_download_button
+    from dashboard.db import find_table_like, read_table, read_downsampled, read_histogram, pick_time_column
+from plot_utils import set_layout, add_gray_areas_empty, add_download_button, bucket_label, decimate, PLOT_POINTS
 
 logger = logging.getLogger(__name__)
 
+XRAY_COLUMNS = ("flux",)
+FLUX_BINS = 50
+
 
 def _classify_flux(v: float) -> str:
     """
@@ -41,37 +45,61 @@ def _classify_flux(v: float) -> str:
     return 'A'
 
 
-@st.cache_data(ttl=600)
-def _load_table_cached(name: str, limit: Optional[int] = None):
+def _load_table_cached(name: str, limit: Optional[int] = None, start: Optional[datetime] = None, columns: Optional[Tuple[str, ...]] = None):
     """
-    Load table from database with caching
+    Load table through the shared cache of db
 
     :param name:
     :type name: str
     :param limit:
     :type limit: Optional[int]
+    :param start: first time to load, the whole history when not given
+    :type start: Optional[datetime]
+    :param columns: columns to load, all when not given
+    :type columns: Optional[Tuple[str, ...]]
+    :return:
+    """
+    return read_table(name, limit=limit, start=start, columns=list(columns) if columns else None)
+
+
+def _load_downsampled_cached(name: str, columns: Tuple[str, ...], start: Optional[datetime] = None, group_by: Tuple[str, ...] = ()):
+    """
+    Load table aggregated into time buckets through the shared cache of db
+
+    :param name:
+    :type name: str
+    :param columns: columns to aggregate
+    :type columns: Tuple[str, ...]
+    :param start: first time to load, the whole history when not given
+    :type start: Optional[datetime]
+    :param group_by: columns splitting the rows into separate series
+    :type group_by: Tuple[str, ...]
     :return:
     """
-    return read_table(name, limit=limit)
+    return read_downsampled(name, list(columns), start=start, group_by=list(group_by))
 
 
-def render(limit: Optional[int] = None):
+def render(limit: Optional[int] = None, start: Optional[datetime] = None, max_points: Optional[int] = PLOT_POINTS):
     """
     Render solar X-ray radiation section
 
     :param limit:
     :type limit: Optional[int]
+    :param start: first time to show, the whole history when not given
+    :type start: Optional[datetime]
+    :param max_points: maximum number of points per plotted trace, None plots every point
+    :type max_points: Optional[int]
     :return:
     """
-    logger.info(f"Rendering X-ray page (limit={limit})")
+    logger.info(f"Rendering X-ray page (limit={limit}, start={start}, max_points={max_points})")
     st.title('Solar X-Ray Radiation')
     p_tab = find_table_like(['primary','xray'])
     s_tab = find_table_like(['secondary','xray'])
     logger.debug(f"Found primary X-ray table: {p_tab}, secondary: {s_tab}")
-    df_p = _load_table_cached(p_tab, limit) if p_tab else pd.DataFrame()
-    df_s = _load_table_cached(s_tab, limit) if s_tab else pd.DataFrame()
+    df_p = _load_downsampled_cached(p_tab, XRAY_COLUMNS, start, ('satellite',)) if p_tab else pd.DataFrame()
+    df_s = _load_downsampled_cached(s_tab, XRAY_COLUMNS, start, ('satellite',)) if s_tab else pd.DataFrame()
 
-    for name, df in (('Primary Data Source', df_p), ('Secondary Data Source', df_s)):
+    for name, table_name, df in (('Primary Data Source', p_tab, df_p), ('Secondary Data Source', s_tab, df_s)):
         if df.empty:
             st.info(f'No data: {name} X-ray')
             continue
@@ -79,6 +107,8 @@ def render(limit: Optional[int] = None):
         if tcol is None:
             st.write(df.head())
             continue
+        # flares are short, the peak flux of every bucket is plotted and classified instead of its mean
+        peak = 'flux_max' if 'flux_max' in df.columns else 'flux'
         st.subheader(f'{name} — X-Ray Fluxes by Satellite')
         with st.expander('Description'):
             st.markdown('''
@@ -103,11 +133,12 @@ def render(limit: Optional[int] = None):
             ''')
         if 'satellite' in df.columns and 'flux' in df.columns:
             satellites = sorted(df['satellite'].unique())
+            # the min/max envelope keeps every flare spike
             fig = px.line(
-                df.sort_values(tcol),
-                x=tcol, y='flux',
+                decimate(df, tcol, peak, max_points, method='minmax', group='satellite', log_y=True).sort_values(tcol),
+                x=tcol, y=peak,
                 color='satellite', 
-                labels={tcol:'Observation date','flux':'Flux [W·m⁻²]', 'flare_class': 'Flare Class', 'satellite': 'Satellite'}, 
+                labels={tcol:'Observation date', peak:'Flux [W·m⁻²]', 'flare_class': 'Flare Class', 'satellite': 'Satellite'}, 
                 category_orders={'satellite': satellites},
                 log_y=True, 
                 color_discrete_sequence=px.colors.qualitative.Set2
@@ -116,14 +147,15 @@ def render(limit: Optional[int] = None):
             fig.update_traces(mode='lines+markers', marker=dict(size=3), line=dict(width=1.6))
             set_layout(fig, f'{name} — X-Ray Fluxes by Satellite', legend_title_text="Satellite", tcol_data=df[tcol])
         else:
-            ycol = 'flux' if 'flux' in df.columns else df.select_dtypes('number').columns[0]
-            fig = px.line(df.sort_values(tcol), x=tcol, y=ycol, labels={tcol:'Observation date', ycol:'Flux [W·m⁻²]'}, log_y=True, color_discrete_sequence=['#636EFA'])
+            ycol = peak if peak in df.columns else df.select_dtypes('number').columns[0]
+            fig = px.line(decimate(df, tcol, ycol, max_points, method='minmax', log_y=True).sort_values(tcol), x=tcol, y=ycol, labels={tcol:'Observation date', ycol:'Flux [W·m⁻²]'}, log_y=True, color_discrete_sequence=['#636EFA'])
             fig.update_traces(mode='lines+markers', marker=dict(size=3), line=dict(width=1.4))
             set_layout(fig, f'{name} — X-Ray Fluxes', tcol_data=df[tcol])
 
 
         add_gray_areas_empty(fig, df, tcol)
         st.plotly_chart(fig, use_container_width=True)
+        st.caption(f"Peak flux of every {bucket_label(df)} interval")
         download_df = df.copy()
         source_suffix = "primary" if name == 'Primary Data Source' else "secondary"
         add_download_button(download_df, f"x_ray_{source_suffix}", "Download chart data as CSV")
@@ -153,7 +185,7 @@ def render(limit: Optional[int] = None):
                 
                 **Colors:** X (red), M (orange), C (blue), B (brown), A (green), Unknown (grey)
                 ''')
-            df['flare_class'] = df['flux'].apply(_classify_flux)
+            df['flare_class'] = df[peak].apply(_classify_flux)
 
             flare_class = sorted(
                 df['flare_class'].unique(),
@@ -161,12 +193,12 @@ def render(limit: Optional[int] = None):
             )
 
             fig2 = px.scatter(
-                df, 
+                decimate(df, tcol, peak, max_points, method='minmax', group='flare_class', log_y=True), 
                 x=tcol, 
-                y='flux', 
+                y=peak, 
                 color='flare_class', 
                 category_orders={'flare_class': flare_class},
-                labels={tcol:'Observation date','flux':'Flux [W·m⁻²]', 'flare_class': 'Flare Class'}, 
+                labels={tcol:'Observation date', peak:'Flux [W·m⁻²]', 'flare_class': 'Flare Class'}, 
                 log_y=True,
                 color_discrete_map={'X':'#7f0000','M':'#ff7f0e','C':'#1f77b4','B':'#8c564b','A':'#2ca02c','Unknown':'#d3d3d3'}
             )
@@ -175,11 +207,11 @@ def render(limit: Optional[int] = None):
             set_layout(fig2, f'{name} — Solar Flare Classification', legend_title_text="Flare Class", tcol_data=df[tcol])
             add_gray_areas_empty(fig2, df, tcol)
             st.plotly_chart(fig2, use_container_width=True)
-            download_df = df[[tcol, 'flux', 'flare_class']].copy() if tcol and 'flux' in df.columns else df.copy()
+            download_df = df[[tcol, peak, 'flare_class']].copy() if tcol and peak in df.columns else df.copy()
             add_download_button(download_df, f"flares_classification_{source_suffix}", "Download chart data as CSV")
 
         pk_tab = find_table_like(['planetary','kp']) or find_table_like(['kp','index'])
-        df_k = _load_table_cached(pk_tab, limit) if pk_tab else pd.DataFrame()
+        df_k = _load_table_cached(pk_tab, limit, start) if pk_tab else pd.DataFrame()
 
         st.subheader('X-Ray Flux Distribution')
         with st.expander('Description'):
@@ -204,8 +236,11 @@ def render(limit: Optional[int] = None):
             - **Shift to the right**: A distribution with more higher values indicates a period 
             of increased solar activity (e.g., solar cycle maximum)
             ''')
-        fig4 = px.histogram(df, x='flux', nbins=50, labels={'flux':'Flux [W·m⁻²]', 'count': 'count'}, log_y=True, color_discrete_sequence=['#00CC96'])
+        # counted over the raw measurements, bucket means would cut off the flare tail
+        hist = read_histogram(table_name, 'flux', FLUX_BINS, start=start)
+        fig4 = px.bar(hist, x='flux', y='count', labels={'flux':'Flux [W·m⁻²]', 'count': 'count'}, log_y=True, color_discrete_sequence=['#00CC96'])
+        fig4.update_layout(bargap=0)
         set_layout(fig4, 'X-Ray Flux Distribution', rangeslider=False, yaxis_title="Count in range")
         st.plotly_chart(fig4, use_container_width=True)
-        download_df = df[['flux']].copy() if 'flux' in df.columns else df.copy()
+        download_df = hist.copy()
         add_download_button(download_df, f"x_ray_distribution_{str(uuid4())}", "Download chart data as CSV")
@@ -0,0 +1,407 @@
+import os
+import sys
+import threading
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from shutil import copyfile, copyfileobj
+from tempfile import SpooledTemporaryFile
+from typing import Optional, Union
+
+# zip compression methods, the DB loader (Go archive/zip) reads only "deflate" and "stored" members
+COMPRESSION_METHODS = {
+    "stored": zipfile.ZIP_STORED,
+    "deflate": zipfile.ZIP_DEFLATED,
+    "bzip2": zipfile.ZIP_BZIP2,
+    "lzma": zipfile.ZIP_LZMA,
+}
+# size up to which a zip member is kept in memory before it is committed to the archive
+SPOOL_MAX_SIZE = 32 * 1024 * 1024
+# size of the pieces of a file deflated independently by parallel_zip
+DEFLATE_CHUNK_SIZE = 4 * 1024 * 1024
+# Python versions whose zipfile internals parallel_zip writes deflated chunks with, each of them is tested in CI
+# (.github/workflows/tests.yaml). Other versions compress the files one by one through the public zipfile API
+RAW_MEMBER_VERSIONS = {(3, 10), (3, 11), (3, 12), (3, 13)}
+
+
+class _ReplacingFile:
+    """
+    File of a feed written next to the existing one and moved over it when closed,
+    so a failed write keeps the previous file. Nothing is replaced when the file stays empty, e.g. after a rollback,
+    or when it is left by an exception
+    """
+    def __init__(self, path: Path):
+        self.path = path
+        self.tmp_path = path.with_name(path.name + ".tmp")
+        self.file = open(self.tmp_path, "wb")
+
+    def write(self, data) -> int:
+        return self.file.write(data)
+
+    def tell(self) -> int:
+        return self.file.tell()
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        return self.file.seek(offset, whence)
+
+    def truncate(self, size: Optional[int] = None) -> int:
+        return self.file.truncate(size)
+
+    def flush(self):
+        self.file.flush()
+
+    def readable(self) -> bool:
+        return False
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    @property
+    def closed(self) -> bool:
+        return self.file.closed
+
+    def close(self):
+        if self.file.closed:
+            return
+        size = self.file.seek(0, os.SEEK_END)
+        self.file.close()
+        if size > 0:
+            self.tmp_path.replace(self.path)
+        else:
+            self.tmp_path.unlink(missing_ok=True)
+
+    def discard(self):
+        """
+        Close the file without replacing the existing one
+        """
+        self.file.close()
+        self.tmp_path.unlink(missing_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is not None:
+            self.discard()
+        else:
+            self.close()
+
+
+class DirectorySink:
+    """
+    Write feed files to a directory
+    """
+    def __init__(self, directory: Union[str, Path], replace: bool = False):
+        """
+        :param directory: directory the files are written to
+        :param replace: rewrite files written earlier instead of appending to them, e.g. for snapshot feeds
+            polled repeatedly into the directory of a day
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.replace = replace
+
+    def location(self, name: str) -> str:
+        return str(self.directory / name)
+
+    def exists(self, name: str) -> bool:
+        """
+        Whether the file of a feed was written earlier and is appended to
+        """
+        return not self.replace and (self.directory / name).exists()
+
+    def open(self, name: str, mode: str = "ab"):
+        """
+        Open a binary file of a feed, "ab" appends to the file written earlier unless the sink replaces files.
+        A file rewritten whole ("wb", or any write when the sink replaces files) replaces the earlier one only
+        once it is completely written
+        """
+        if mode == "wb" or (self.replace and mode != "rb"):
+            return _ReplacingFile(self.directory / name)
+        return open(self.directory / name, mode)
+
+    def add_file(self, name: str, source: Union[str, Path]):
+        """
+        Copy an existing file as the file of a feed
+        """
+        copyfile(source, self.directory / name)
+
+    def export(self, name: str, destination: Union[str, Path]):
+        """
+        Copy the file of a feed to the destination
+        """
+        copyfile(self.directory / name, destination)
+
+    def close(self):
+        pass
+
+
+class _ZipMember:
+    """
+    File of a single feed spooled in memory (or a temporary file when large)
+    and added to the archive when closed, empty members are dropped
+    """
+    def __init__(self, sink: "ZipSink", name: str):
+        self.sink = sink
+        self.name = name
+        self.buffer = SpooledTemporaryFile(max_size=sink.spool_max_size)
+        self.closed = False
+
+    def write(self, data) -> int:
+        return self.buffer.write(data)
+
+    def tell(self) -> int:
+        return self.buffer.tell()
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        return self.buffer.seek(offset, whence)
+
+    def truncate(self, size: Optional[int] = None) -> int:
+        return self.buffer.truncate(size)
+
+    def flush(self):
+        self.buffer.flush()
+
+    def readable(self) -> bool:
+        return False
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            size = self.buffer.seek(0, os.SEEK_END)
+            if size > 0:
+                self.buffer.seek(0)
+                self.sink.add_fileobj(self.name, self.buffer, size)
+        finally:
+            self.buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ZipSink:
+    """
+    Write feed files straight into a zip archive without an intermediate directory.
+    Members are laid out as <root_name>/<file name>, the same as make_archive over the data directory
+    """
+    def __init__(
+        self,
+        archive_path: Union[str, Path],
+        root_name: str,
+        compression: str = "deflate",
+        compresslevel: Optional[int] = None,
+        spool_max_size: int = SPOOL_MAX_SIZE
+    ):
+        """
+        :param archive_path: path of the created zip file
+        :param root_name: name of the directory inside the archive
+        :param compression: one of COMPRESSION_METHODS
+        :param compresslevel: compression level, None for the default of the method
+        :param spool_max_size: size up to which a member is kept in memory before it is added to the archive
+        """
+        if compression not in COMPRESSION_METHODS:
+            raise ValueError(f"Unknown compression {compression}, expected one of {', '.join(COMPRESSION_METHODS)}")
+        self.archive_path = Path(archive_path)
+        self.archive_path.parent.mkdir(parents=True, exist_ok=True)
+        self.tmp_path = self.archive_path.with_name(self.archive_path.name + ".tmp")
+        self.root_name = root_name
+        self.spool_max_size = spool_max_size
+        self.lock = threading.Lock()
+        self.zip = zipfile.ZipFile(
+            self.tmp_path, "w", compression=COMPRESSION_METHODS[compression], compresslevel=compresslevel
+        )
+
+    def arcname(self, name: str) -> str:
+        return f"{self.root_name}/{name}"
+
+    def location(self, name: str) -> str:
+        return f"{self.archive_path}:{self.arcname(name)}"
+
+    def exists(self, name: str) -> bool:
+        """
+        Members are written once by the run creating the archive, there is nothing to append to
+        """
+        return False
+
+    def open(self, name: str, mode: str = "ab") -> _ZipMember:
+        """
+        Open a new member, it is added to the archive when closed
+        """
+        return _ZipMember(self, name)
+
+    def add_fileobj(self, name: str, fileobj, size: int):
+        """
+        Compress a binary file object into a member of the archive
+
+        :param name: name of the feed file
+        :param fileobj: binary file object positioned at the start of the data
+        :param size: number of bytes to be read from the file object
+        """
+        with self.lock:
+            with self.zip.open(self.arcname(name), "w", force_zip64=size >= zipfile.ZIP64_LIMIT) as dst:
+                copyfileobj(fileobj, dst, 1024 * 1024)
+
+    def add_file(self, name: str, source: Union[str, Path]):
+        with open(source, "rb") as src:
+            self.add_fileobj(name, src, os.fstat(src.fileno()).st_size)
+
+    def export(self, name: str, destination: Union[str, Path]):
+        with self.lock:
+            with self.zip.open(self.arcname(name)) as src, open(destination, "wb") as dst:
+                copyfileobj(src, dst, 1024 * 1024)
+
+    def names(self) -> list:
+        with self.lock:
+            return self.zip.namelist()
+
+    def close(self):
+        """
+        Finish the archive and move it into place
+        """
+        with self.lock:
+            self.zip.close()
+        self.tmp_path.replace(self.archive_path)
+
+    def abort(self):
+        """
+        Drop the unfinished archive
+        """
+        with self.lock:
+            self.zip.close()
+        self.tmp_path.unlink(missing_ok=True)
+
+
+def parallel_zip(
+    source_dir: Union[str, Path],
+    archive_path: Union[str, Path],
+    workers: int,
+    compresslevel: Optional[int] = None,
+    chunk_size: int = DEFLATE_CHUNK_SIZE
+):
+    """
+    Deflate a directory into a zip archive on a thread pool, laid out like make_archive with the directory
+    as the root of the archive. Every file is split into chunks deflated independently and joined into a single
+    raw deflate stream, like pigz does, so the chunks of one large file are spread over the workers as well.
+    zlib releases the GIL while compressing, threads scale without pickling the data to worker processes.
+    zipfile has no public API for adding data compressed elsewhere, so the members are written with its internals,
+    only on the versions in RAW_MEMBER_VERSIONS, and the finished archive is checked before it is moved into place
+
+    :param source_dir: directory to be archived
+    :param archive_path: path of the created zip file
+    :param workers: number of compressing threads
+    :param compresslevel: deflate level, None for the zlib default
+    :param chunk_size: number of bytes deflated by a single job
+    """
+    source_dir = Path(source_dir)
+    archive_path = Path(archive_path)
+    level = zlib.Z_DEFAULT_COMPRESSION if compresslevel is None else compresslevel
+    tmp_path = archive_path.with_name(archive_path.name + ".tmp")
+    # chunks read ahead of the one being written, bounding the memory held by the pool
+    max_pending = 2 * workers
+    raw_members = sys.version_info[:2] in RAW_MEMBER_VERSIONS
+    try:
+        with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_DEFLATED, compresslevel=compresslevel) as zf, \
+                ThreadPoolExecutor(max_workers=workers, thread_name_prefix="deflate") as pool:
+            pending = deque()
+            for path in [source_dir, *sorted(source_dir.rglob("*"))]:
+                arcname = path.relative_to(source_dir.parent).as_posix()
+                if path.is_dir() or not raw_members:
+                    while pending:
+                        _write_deflated(zf, *pending.popleft())
+                    zf.write(path, arcname)
+                    continue
+                zinfo = zipfile.ZipInfo.from_file(path, arcname)
+                zinfo.compress_type = zipfile.ZIP_DEFLATED
+                # set once the last chunk is read, the header written with the first chunk is a placeholder
+                zinfo.CRC = 0
+                zip64 = zinfo.file_size * 1.05 > zipfile.ZIP64_LIMIT
+                with open(path, "rb") as f:
+                    crc = 0
+                    size = 0
+                    first = True
+                    while True:
+                        data = f.read(chunk_size)
+                        crc = zlib.crc32(data, crc)
+                        size += len(data)
+                        last = len(data) < chunk_size
+                        if last:
+                            zinfo.CRC = crc
+                            zinfo.file_size = size
+                        pending.append((zinfo, pool.submit(_deflate, data, level, last), first, last, zip64))
+                        first = False
+                        while len(pending) > max_pending:
+                            _write_deflated(zf, *pending.popleft())
+                        if last:
+                            break
+            while pending:
+                _write_deflated(zf, *pending.popleft())
+        if raw_members:
+            _check_archive(tmp_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    tmp_path.replace(archive_path)
+
+
+def _check_archive(path: Path):
+    """
+    Read every member back and compare it with its CRC, so an archive written wrongly is never handed to the DB loader
+
+    :raises zipfile.BadZipFile: if a member cannot be read or does not match its CRC
+    """
+    with zipfile.ZipFile(path) as zf:
+        bad = zf.testzip()
+    if bad is not None:
+        raise zipfile.BadZipFile(f"Member {bad} of {path} does not match its CRC")
+
+
+def _deflate(data: bytes, level: int, last: bool) -> bytes:
+    """
+    Deflate a chunk of a file, chunks other than the last one end with a sync flush at a byte boundary,
+    so the outputs of consecutive chunks can be concatenated into one stream
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+def _write_deflated(zf: zipfile.ZipFile, zinfo: zipfile.ZipInfo, chunk: Future, first: bool, last: bool, zip64: bool):
+    """
+    Append a deflated chunk to the archive. zipfile cannot add data compressed elsewhere, so the member is
+    written the way ZipFile.open does it: a header with sizes filled in once the last chunk is written.
+    Relies on ZipFile.fp, filelist, NameToInfo, start_dir, _didModify and ZipInfo.FileHeader, see RAW_MEMBER_VERSIONS
+    """
+    if first:
+        zinfo.header_offset = zf.fp.tell()
+        zinfo.compress_size = 0
+        zf.fp.write(zinfo.FileHeader(zip64))
+    data = chunk.result()
+    zf.fp.write(data)
+    zinfo.compress_size += len(data)
+    if last:
+        end = zf.fp.tell()
+        zf.fp.seek(zinfo.header_offset)
+        zf.fp.write(zinfo.FileHeader(zip64))
+        zf.fp.seek(end)
+        zf.filelist.append(zinfo)
+        zf.NameToInfo[zinfo.filename] = zinfo
+        zf.start_dir = end
+        zf._didModify = True
+
+
+Sink = Union[DirectorySink, ZipSink]
@@ -0,0 +1,196 @@
+import argparse
+import asyncio
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Union
+from retrieval.feeds import FEEDS, Feed
+from retrieval.fetch_data import (
+    SAVE_DIR, DROPBOX_DIR, FETCH_CONCURRENCY, OUTPUT_FORMAT, RETRY_POLICY, REPORT_SUFFIX, create_session,
+    fetch_batches, write_batch, close_appender, run_in_writer, logger
+)
+from retrieval.archive import ZipSink
+from retrieval.flatten import FeedSchema
+from retrieval.scheduler import FetchScheduler, RateLimiter
+from retrieval.timing import RunReport, feed_context
+from retrieval.watermarks import TIME_FIELD
+from retrieval.writers import OUTPUT_FORMATS, make_appender
+from retrieval.send2dropbox import dropbox_file_exists, send_to_dropbox
+
+# requests per second sent to NOAA by a backfill, retries included
+BACKFILL_RATE = 2.0
+# days compressed and uploaded at the same time
+DAY_CONCURRENCY = 4
+
+
+def date_range(start: date, end: date) -> List[date]:
+    """
+    :return: days from start to end, both included
+    """
+    if end < start:
+        raise ValueError(f"End date {end} is before start date {start}")
+    return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+
+def split_by_day(records: Iterable[dict], days: Iterable[str]) -> Dict[str, list]:
+    """
+    Group records by the UTC date of their time_tag
+
+    :param records: decoded records of a feed
+    :param days: dates (YYYY-MM-DD) to keep, records of other days and without a time_tag are dropped
+    :return: date -> records of that day, in their original order
+    """
+    days = set(days)
+    by_day = defaultdict(list)
+    for record in records:
+        day = (record.get(TIME_FIELD) or "")[:10]
+        if day in days:
+            by_day[day].append(record)
+    return dict(by_day)
+
+
+async def backfill(
+    start: date,
+    end: date,
+    feeds: Optional[Dict[str, Feed]] = None,
+    save_dir: Union[str, Path] = SAVE_DIR,
+    rate: float = BACKFILL_RATE,
+    concurrency: int = FETCH_CONCURRENCY,
+    output_format: str = OUTPUT_FORMAT,
+    upload: bool = True,
+    overwrite: bool = False
+) -> Dict[str, Path]:
+    """
+    Rebuild the archives of past days from the archival endpoints of the feeds (the last 7 days of GOES data).
+    Every archival feed is requested once for the whole range and streamed, batch by batch, into the archives
+    of the days its records belong to, with the same <day>.zip / <day>/<feed>_<day>.csv layout as a daily run.
+    Days are split by the UTC date of the time_tag, feeds without an archival endpoint are not backfilled.
+    Days already archived locally or, when uploading, in Dropbox are skipped unless overwrite is set
+
+    :param start: first day to backfill
+    :param end: last day to backfill
+    :param feeds: feeds to backfill, the registered feeds when not given, only those with an archive_url are used
+    :param save_dir: directory the archives are written to
+    :param rate: maximum number of requests per second, shared by all feeds
+    :param concurrency: maximum number of feeds fetched at the same time
+    :param output_format: format of the files written for each feed, one of writers.OUTPUT_FORMATS
+    :param upload: upload finished archives to Dropbox
+    :param overwrite: rebuild days which already have an archive in save_dir or Dropbox and replace it
+    :return: date -> path of every written archive
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format {output_format}, expected one of {', '.join(OUTPUT_FORMATS)}")
+    save_dir = Path(save_dir)
+    save_dir.mkdir(parents=True, exist_ok=True)
+    feeds = {name: feed for name, feed in (feeds if feeds is not None else FEEDS).items() if feed.archive_url}
+    if not feeds:
+        raise ValueError("None of the feeds has an archival endpoint")
+    days = []
+    for day in map(str, date_range(start, end)):
+        if overwrite:
+            days.append(day)
+        elif (save_dir / f"{day}.zip").exists():
+            logger.log(f"Archive of {day} already exists, not backfilling it")
+        elif upload and await asyncio.to_thread(dropbox_file_exists, f"{DROPBOX_DIR}/{day}.zip", logger):
+            # the upload would replace an archive of a daily run holding the feeds without an archival endpoint
+            logger.log(f"Archive of {day} already exists in Dropbox, not backfilling it")
+        else:
+            days.append(day)
+    if not days:
+        return {}
+
+    logger.log(f"Backfilling {len(days)} days from {days[0]} to {days[-1]} from {len(feeds)} archival feeds")
+    sinks = {day: ZipSink(save_dir / f"{day}.zip", day) for day in days}
+    covered = defaultdict(list)
+    limiter = RateLimiter(rate)
+    suffix = OUTPUT_FORMATS[output_format].suffix
+
+    async def fetch_feed(name: str, feed: Feed, session):
+        # day -> appender of the feed file in the archive of the day, its schema and whether it needs a header
+        appenders = {}
+
+        async def consume(records: list):
+            for day, day_records in split_by_day(records, days).items():
+                if day not in appenders:
+                    appender = make_appender(sinks[day], f"{name}_{day}{suffix}", feed.output_format or output_format)
+                    header = await run_in_writer(appender.open)
+                    appenders[day] = appender, FeedSchema(expected=feed.schema), header
+                appender, schema, header = appenders[day]
+                await run_in_writer(write_batch, appender, schema, day_records, name, header)
+
+        async def discard():
+            # empty members are dropped from the archive, a retry opens them again
+            for appender, _, _ in appenders.values():
+                await run_in_writer(appender.rollback)
+                await run_in_writer(close_appender, appender)
+            appenders.clear()
+
+        with feed_context(name):
+            await fetch_batches(feed.archive_url, session, consume, discard, feed.policy or RETRY_POLICY, limiter)
+            for day, (appender, _, _) in appenders.items():
+                await run_in_writer(close_appender, appender)
+                covered[day].append(name)
+
+    report = RunReport(f"backfill_{days[0]}_{days[-1]}")
+    with report.activate(save_dir / f"{report.name}{REPORT_SUFFIX}"):
+        try:
+            async with create_session() as session:
+                scheduler = FetchScheduler.from_feeds(feeds, concurrency, logger)
+                results = await scheduler.run({
+                    name: (lambda name=name, feed=feed: fetch_feed(name, feed, session))
+                    for name, feed in feeds.items()
+                })
+        except BaseException:
+            for sink in sinks.values():
+                sink.abort()
+            raise
+        if not any(result.ok for result in results.values()):
+            for sink in sinks.values():
+                sink.abort()
+            raise Exception("Failed to retrieve any archival data")
+
+        archives = {}
+        for day, sink in sinks.items():
+            if not covered[day]:
+                logger.log_warning(f"No archival data covers {day}, the day cannot be backfilled")
+                sink.abort()
+                continue
+            missing = sorted(set(feeds) - set(covered[day]))
+            if missing:
+                logger.log_warning(f"Backfilled {day} without {', '.join(missing)}")
+            archives[day] = sink.archive_path
+
+        semaphore = asyncio.Semaphore(DAY_CONCURRENCY)
+
+        async def finish_day(day: str):
+            async with semaphore:
+                await asyncio.to_thread(sinks[day].close)
+                logger.log(f"Backfilled {day} into {archives[day]}")
+                if upload:
+                    await asyncio.to_thread(send_to_dropbox, archives[day], f"{DROPBOX_DIR}/{day}.zip", logger)
+
+        await asyncio.gather(*[finish_day(day) for day in archives])
+    return archives
+
+
+def _parse_date(value: str) -> date:
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the archives of past days from archival NOAA feeds")
+    parser.add_argument("start", type=_parse_date, help="first day, YYYY-MM-DD")
+    parser.add_argument(
+        "end", type=_parse_date, nargs="?", default=datetime.now(timezone.utc).date(), help="last day, today by default"
+    )
+    parser.add_argument("--rate", type=float, default=BACKFILL_RATE, help="requests per second")
+    parser.add_argument("--output-format", choices=list(OUTPUT_FORMATS), default=OUTPUT_FORMAT)
+    parser.add_argument(
+        "--overwrite", action="store_true", help="rebuild days which already have an archive, locally or in Dropbox"
+    )
+    parser.add_argument("--no-upload", dest="upload", action="store_false", help="do not upload to Dropbox")
+    args = parser.parse_args()
+    asyncio.run(backfill(
+        args.start, args.end, rate=args.rate, output_format=args.output_format, upload=args.upload,
+        overwrite=args.overwrite
+    ))
@@ -0,0 +1,66 @@
+"""
+Time of compressing a data directory with make_archive, as compress_data did, vs parallel_zip with a growing
+number of threads. The directory holds 20 files of synthetic dscovr_mag_1s-like records, one per line,
+the first one as large as all the others together, like dscovr_mag_1s in a real run
+
+Usage: python -m retrieval.benchmarks.bench_compress [--size-mib 300] [--workers 1 2 4 8]
+"""
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+from shutil import make_archive
+
+from retrieval.archive import parallel_zip
+from retrieval.benchmarks.synthetic_server import synthetic_records
+
+DEFAULT_SIZE_MIB = 300
+DEFAULT_FEEDS = 20
+RECORDS_PER_WRITE = 10_000
+
+
+def write_data_dir(directory: Path, size: int, feeds: int = DEFAULT_FEEDS):
+    """
+    Write files adding up to about size bytes, half of it in the first one
+    """
+    directory.mkdir(parents=True)
+    block = synthetic_records(0, RECORDS_PER_WRITE).replace("},{", "}\n{").encode()
+    for i in range(feeds):
+        target = size // 2 if i == 0 else size // 2 // (feeds - 1)
+        with open(directory / f"feed_{i}_{directory.name}.csv", "wb") as f:
+            written = 0
+            while written < target:
+                written += f.write(block[:target - written])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size-mib", type=int, default=DEFAULT_SIZE_MIB)
+    parser.add_argument("--workers", type=int, nargs="+", default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = Path(tmp) / "2024-05-10"
+        write_data_dir(data_dir, args.size_mib * 2 ** 20)
+        size = sum(p.stat().st_size for p in data_dir.iterdir())
+        print(f"{size / 2 ** 20:.0f} MiB in {len(list(data_dir.iterdir()))} files, {os.cpu_count()} CPUs")
+
+        start = time.perf_counter()
+        archive = make_archive(str(Path(tmp) / "make_archive"), "zip", root_dir=tmp, base_dir=data_dir.name)
+        baseline = time.perf_counter() - start
+        print(f"{'make_archive':>22}: {baseline:6.2f}s  archive {Path(archive).stat().st_size / 2 ** 20:6.1f} MiB")
+
+        for workers in args.workers:
+            archive = Path(tmp) / f"parallel_{workers}.zip"
+            start = time.perf_counter()
+            parallel_zip(data_dir, archive, workers)
+            elapsed = time.perf_counter() - start
+            print(
+                f"{f'parallel_zip x{workers}':>22}: {elapsed:6.2f}s  archive {archive.stat().st_size / 2 ** 20:6.1f} MiB"
+                f"  speedup {baseline / elapsed:4.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Wall time of retrieve_all_data over 20 concurrent synthetic feeds with file writes
+done on the event loop vs on the writer executor
+
+Usage: python -m retrieval.benchmarks.bench_concurrent_writes [--feeds 20] [--records 100000]
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+from functools import partial
+from pathlib import Path
+from unittest.mock import patch
+
+from retrieval import fetch_data
+from retrieval.feeds import Feed, LARGE
+from retrieval.validator_cache import ValidatorCache
+from retrieval.benchmarks.synthetic_server import SyntheticFeedServer
+
+DEFAULT_FEEDS = 20
+DEFAULT_RECORDS = 100_000
+
+
+async def _measure(name2url: dict, executor) -> tuple:
+    with tempfile.TemporaryDirectory() as tmp, \
+            patch.object(fetch_data, "SAVE_DIR", Path(tmp)), \
+            patch.object(fetch_data, "ValidatorCache", partial(ValidatorCache, Path(tmp) / "cache")), \
+            patch.object(fetch_data, "WRITER_EXECUTOR", executor), \
+            patch.object(fetch_data, "compress_data"), \
+            patch.object(fetch_data, "send_to_dropbox"):
+        start = time.perf_counter()
+        await fetch_data.retrieve_all_data(
+            feeds={name: Feed(name, url, size=LARGE) for name, url in name2url.items()},
+            incremental=False
+        )
+        elapsed = time.perf_counter() - start
+        size = sum(p.stat().st_size for p in Path(tmp).rglob("*") if p.is_file())
+    return elapsed, size
+
+
+async def main(feeds: int, records: int):
+    async with SyntheticFeedServer() as server:
+        await server.warm_up(records)
+        name2url = {f"feed_{i}": server.url(f"feed_{i}", records) for i in range(feeds)}
+        print(f"{feeds} synthetic feeds, {records} records each")
+        for label, executor in (("on event loop", None), ("writer executor", fetch_data.WRITER_EXECUTOR)):
+            elapsed, size = await _measure(name2url, executor)
+            print(f"{label:>16}: {elapsed:7.2f}s  output {size / 2 ** 20:.1f} MiB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--feeds", type=int, default=DEFAULT_FEEDS)
+    parser.add_argument("--records", type=int, default=DEFAULT_RECORDS)
+    args = parser.parse_args()
+    asyncio.run(main(args.feeds, args.records))
@@ -0,0 +1,48 @@
+"""
+Decode time of a day of each feed with aiohttp's response.json() path (decoding the bytes to str,
+then json.loads) vs decoding the raw bytes with every installed backend of retrieval.decoding
+
+Usage: python -m retrieval.benchmarks.bench_decode [--repeat 5]
+"""
+import argparse
+import json
+import time
+
+from retrieval.decoding import available_decoders, get_decoder
+from retrieval.benchmarks.bench_output_formats import synthetic_day
+
+DEFAULT_REPEAT = 5
+
+
+def response_json(payload: bytes) -> list:
+    """
+    What aiohttp's response.json() does with the body of a response in utf-8
+    """
+    return json.loads(payload.decode("utf-8"))
+
+
+def _best_of(fn, payload: bytes, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(payload)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    args = parser.parse_args()
+
+    decoders = {"response.json": response_json, **{name: get_decoder(name) for name in available_decoders()}}
+    for name, records in synthetic_day().items():
+        payload = json.dumps(records).encode()
+        timings = "  ".join(
+            f"{decoder} {_best_of(decode, payload, args.repeat):6.3f}s" for decoder, decode in decoders.items()
+        )
+        print(f"{name:>32}: {len(payload) / 2 ** 20:6.1f} MiB  {timings}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Time of turning a day of decoded records into CSV rows with the former per-row flattening
+vs the columnar flatten_columns + FeedSchema stage. Formatting the rows as CSV costs the same for both
+and is left out. Note that the per-row variant writes nested objects as dict reprs and misaligns records
+with missing keys, the columnar one produces dotted columns aligned to the schema
+
+Usage: python -m retrieval.benchmarks.bench_flatten [--repeat 5]
+"""
+import argparse
+import time
+
+from retrieval.flatten import FeedSchema, flatten_columns
+from retrieval.benchmarks.bench_output_formats import synthetic_day
+
+DEFAULT_REPEAT = 5
+
+
+def per_row(data: list) -> list:
+    """
+    The flattening formerly done in retrieve_data, followed by taking values in the order of each record
+    """
+    data = [
+        {**item, **{k: v for k, v in item.items() if isinstance(v, dict)}}
+        for item in data
+    ]
+    return [list(data[0].keys())] + [list(item.values()) for item in data]
+
+
+def columnar(data: list) -> list:
+    columns = flatten_columns(data)
+    schema = FeedSchema(columns)
+    return [schema.columns] + list(zip(*schema.align(columns, len(data))))
+
+
+def nested_records(count: int) -> list:
+    """
+    Records with a nested object and keys missing from some of them
+    """
+    return [
+        {
+            "time_tag": f"2024-05-10T00:00:{i % 60:02d}Z", "flux": i * 1e-9,
+            "source": {"satellite": 16 + i % 3, "instrument": {"name": "xrs", "channel": i % 2}},
+            **({"flag": True} if i % 10 == 0 else {}),
+        }
+        for i in range(count)
+    ]
+
+
+def _best_of(fn, data: list, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(data)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    args = parser.parse_args()
+
+    feeds = synthetic_day()
+    feeds["nested"] = nested_records(200_000)
+    for name, data in feeds.items():
+        before = _best_of(per_row, data, args.repeat)
+        after = _best_of(columnar, data, args.repeat)
+        print(f"{name:>32}: {len(data):>7} records  per-row {before:6.3f}s  columnar {after:6.3f}s")
+
+
+if __name__ == "__main__":
+    main()
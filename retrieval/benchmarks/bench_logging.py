@@ -0,0 +1,68 @@
+"""
+Time the event loop spends in logger calls of the fetch path with the handlers writing the log file
+and console in the calling thread vs the queued mode, where a call only enqueues the record.
+Console output goes to /dev/null, so the numbers are a lower bound of a real terminal or docker log
+
+Usage: python -m retrieval.benchmarks.bench_logging [--feeds 20] [--messages 50]
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from retrieval.logger import Logger
+
+DEFAULT_FEEDS = 20
+DEFAULT_MESSAGES = 50
+
+
+async def fetch(logger: Logger, name: str, messages: int) -> float:
+    """
+    Log like a feed being retried and written in batches, yielding to the loop between messages
+
+    :return: time spent in logger calls
+    """
+    spent = 0.0
+    for i in range(messages):
+        start = time.perf_counter()
+        logger.log(f"Data of {name} streamed and saved to {name}_2024-05-10.csv ({i * 5000} rows)")
+        spent += time.perf_counter() - start
+        await asyncio.sleep(0)
+    return spent
+
+
+async def _measure(queued: bool, feeds: int, messages: int) -> tuple:
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, "w") as devnull:
+        with contextlib.redirect_stderr(devnull):
+            logger = Logger(Path(tmp) / "logs.log", queued=queued, name=f"bench-{queued}")
+        start = time.perf_counter()
+        spent = await asyncio.gather(*[fetch(logger, f"feed_{i}", messages) for i in range(feeds)])
+        elapsed = time.perf_counter() - start
+        logger.close()
+        flushed = time.perf_counter() - start
+        for handler in logger.logger.handlers:
+            handler.close()
+    return sum(spent), max(spent), elapsed, flushed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--feeds", type=int, default=DEFAULT_FEEDS)
+    parser.add_argument("--messages", type=int, default=DEFAULT_MESSAGES)
+    args = parser.parse_args()
+
+    print(f"{args.feeds} feeds x {args.messages} messages")
+    for queued in (False, True):
+        total, worst, elapsed, flushed = asyncio.run(_measure(queued, args.feeds, args.messages))
+        mode = "queued" if queued else "direct"
+        print(
+            f"{mode:>7}: {total * 1e3:7.1f} ms in log calls (worst feed {worst * 1e3:6.1f} ms), "
+            f"run {elapsed * 1e3:7.1f} ms, written after {flushed * 1e3:7.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Size and throughput comparison of CSV and Parquet output on a day of real-sized synthetic data
+
+Usage: python -m retrieval.benchmarks.bench_output_formats
+"""
+import json
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+import pandas as pd
+
+from retrieval.fetch_data import write_records
+from retrieval.archive import DirectorySink
+from retrieval.writers import OUTPUT_FORMATS
+from retrieval.benchmarks.synthetic_server import synthetic_records
+
+MINUTES_PER_DAY = 1440
+SECONDS_PER_DAY = 86400
+
+
+def _time_tag(minute: int) -> str:
+    return f"2024-05-10T{minute // 60:02d}:{minute % 60:02d}:00Z"
+
+
+def synthetic_day() -> dict:
+    """
+    Records of a single day shaped like dscovr_mag_1s, primary-xray-1-day and primary-integral-protons-1-day
+    """
+    xray = [
+        {
+            "time_tag": _time_tag(m), "satellite": sat, "flux": 1e-8 * (1 + (m % 97) / 10) * (10 if e else 1),
+            "observed_flux": 1.1e-8 * (1 + (m % 89) / 10), "electron_correction": 0.0,
+            "electron_contaminaton": False, "energy": "0.1-0.8nm" if e else "0.05-0.4nm"
+        }
+        for m in range(MINUTES_PER_DAY) for sat in (18, 19) for e in (0, 1)
+    ]
+    energies = [">=1 MeV", ">=5 MeV", ">=10 MeV", ">=30 MeV", ">=50 MeV", ">=60 MeV", ">=100 MeV"]
+    protons = [
+        {"time_tag": _time_tag(m), "satellite": sat, "flux": 0.2 + (m % 53) / (i + 1), "energy": energy}
+        for m in range(MINUTES_PER_DAY) for sat in (18, 19) for i, energy in enumerate(energies)
+    ]
+    return {
+        "dscovr_mag_1s": json.loads(f"[{synthetic_records(0, SECONDS_PER_DAY)}]"),
+        "primary-xray-1-day": xray,
+        "primary-integral-protons-1-day": protons,
+    }
+
+
+def main():
+    day = synthetic_day()
+    for name, data in day.items():
+        print(f"{name}: {len(data)} records")
+    with tempfile.TemporaryDirectory() as tmp:
+        for output_format, appender in OUTPUT_FORMATS.items():
+            target_dir = Path(tmp) / output_format
+            target_dir.mkdir()
+            start = time.perf_counter()
+            sink = DirectorySink(target_dir)
+            for name, data in day.items():
+                write_records(sink, f"{name}{appender.suffix}", name, data, output_format)
+            write_time = time.perf_counter() - start
+
+            files = sorted(target_dir.iterdir())
+            size = sum(p.stat().st_size for p in files)
+            archive = Path(tmp) / f"{output_format}.zip"
+            with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+                for p in files:
+                    zf.write(p, p.name)
+
+            start = time.perf_counter()
+            for p in files:
+                pd.read_parquet(p) if output_format == "parquet" else pd.read_csv(p)
+            load_time = time.perf_counter() - start
+
+            print(
+                f"{output_format:>8}: write {write_time:6.2f}s  files {size / 2 ** 20:6.2f} MiB  "
+                f"zip {archive.stat().st_size / 2 ** 20:6.2f} MiB  load {load_time:6.2f}s"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+End-to-end benchmark of a daily run: retrieve_all_data fetches every registered feed from a local server
+replaying synthetic (or recorded) NOAA payloads, writes the archive and uploads it to an in-memory Dropbox.
+Every feed is served records with the fields of its schema.
+Reports wall time, peak traced memory and bytes written, and exits with status 1 when a threshold is exceeded,
+so regressions in fetch_data or send2dropbox fail the job running it. With --report-only exceeded thresholds
+are only reported, for shared machines such as CI runners whose timings vary too much for absolute budgets;
+an upload not matching the archive always fails
+
+Usage: python -m retrieval.benchmarks.bench_pipeline [--scale 1.0] [--payload-dir DIR] [--repeat 3]
+    [--max-seconds 20] [--max-peak-mib 300] [--baseline FILE] [--tolerance 0.25] [--save-baseline FILE]
+    [--report-only]
+"""
+import argparse
+import asyncio
+import copy
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from functools import partial
+from pathlib import Path
+from typing import Optional
+from unittest.mock import MagicMock, patch
+
+from dropbox.exceptions import ApiError
+from dropbox.files import GetMetadataError, LookupError as PathLookupError
+
+from retrieval import fetch_data
+from retrieval.feeds import FEEDS, LARGE
+from retrieval.validator_cache import ValidatorCache
+from retrieval.benchmarks.synthetic_server import SyntheticFeedServer
+
+# records served per feed, about a day of 1 s data for large feeds and of two satellites' 1 min data otherwise
+LARGE_FEED_RECORDS = 86_400
+SMALL_FEED_RECORDS = 2_880
+DEFAULT_REPEAT = 3
+# budgets of a run at scale 1.0, well above what a laptop needs, so only real regressions fail
+MAX_SECONDS = 20.0
+MAX_PEAK_MIB = 300.0
+DEFAULT_TOLERANCE = 0.25
+
+
+class FakeDropbox:
+    """
+    Dropbox client keeping only the sizes of uploaded files, every file is new to it
+    """
+    def __init__(self, **kwargs):
+        self.uploaded = {}
+        self.sessions = {}
+        self.requests = 0
+
+    def files_get_metadata(self, path):
+        raise ApiError("bench", GetMetadataError.path(PathLookupError.not_found), None, None)
+
+    def files_upload(self, f, path, mode):
+        self.requests += 1
+        self.uploaded[path] = len(f)
+
+    def files_upload_session_start(self, f):
+        self.requests += 1
+        session_id = f"session-{len(self.sessions)}"
+        self.sessions[session_id] = len(f)
+        return MagicMock(session_id=session_id)
+
+    def files_upload_session_append_v2(self, f, cursor):
+        self.requests += 1
+        self.sessions[cursor.session_id] += len(f)
+
+    def files_upload_session_finish(self, f, cursor, commit):
+        self.requests += 1
+        self.uploaded[commit.path] = self.sessions.pop(cursor.session_id) + len(f)
+
+
+def local_feeds(server: SyntheticFeedServer, scale: float) -> dict:
+    """
+    Registered feeds with their metadata, fetched from the local server
+    """
+    feeds = {}
+    for name, feed in FEEDS.items():
+        records = int((LARGE_FEED_RECORDS if feed.size == LARGE else SMALL_FEED_RECORDS) * scale)
+        feeds[name] = copy.copy(feed)
+        feeds[name].url = server.url(name, max(records, 1), feed.schema)
+    return feeds
+
+
+async def run_pipeline(feeds: dict, trace_memory: bool = False) -> dict:
+    """
+    Run retrieve_all_data once in a temporary directory
+
+    :param feeds: feeds to retrieve
+    :param trace_memory: measure peak memory with tracemalloc, which slows the run down
+    :return: measurements of the run
+    """
+    dbx = FakeDropbox()
+    with tempfile.TemporaryDirectory() as tmp, \
+            patch.object(fetch_data, "SAVE_DIR", Path(tmp)), \
+            patch.object(fetch_data, "ValidatorCache", partial(ValidatorCache, Path(tmp) / "cache")), \
+            patch("retrieval.send2dropbox.dropbox.Dropbox", return_value=dbx):
+        if trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        await fetch_data.retrieve_all_data(feeds=feeds, incremental=False)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if trace_memory else 0
+        tracemalloc.stop()
+        report = json.loads(next(Path(tmp).glob(f"*{fetch_data.REPORT_SUFFIX}")).read_text())
+    totals = report["totals"]
+    return {
+        "seconds": elapsed,
+        "peak_mib": peak / 2 ** 20,
+        "downloaded_mib": (totals.get("download", {}).get("bytes", 0) + totals.get("stream", {}).get("bytes", 0)) / 2 ** 20,
+        "rows": totals.get("write", {}).get("rows", 0),
+        "archive_mib": totals["compress"]["bytes"] / 2 ** 20,
+        "uploaded_mib": sum(dbx.uploaded.values()) / 2 ** 20,
+        "upload_requests": dbx.requests,
+        "stages": {stage: stats["seconds"] for stage, stats in totals.items()},
+    }
+
+
+def verify(result: dict) -> list:
+    """
+    :return: descriptions of wrong results of the run, empty if it produced what it should
+    """
+    errors = []
+    if result["uploaded_mib"] != result["archive_mib"]:
+        errors.append(f"uploaded {result['uploaded_mib']:.2f} MiB of a {result['archive_mib']:.2f} MiB archive")
+    return errors
+
+
+def check(result: dict, max_seconds: float, max_peak_mib: float, baseline: Optional[dict], tolerance: float) -> list:
+    """
+    :return: descriptions of exceeded thresholds, empty if the run passed
+    """
+    failures = []
+    if result["seconds"] > max_seconds:
+        failures.append(f"wall time {result['seconds']:.2f}s exceeds {max_seconds:.2f}s")
+    if result["peak_mib"] > max_peak_mib:
+        failures.append(f"peak memory {result['peak_mib']:.1f} MiB exceeds {max_peak_mib:.1f} MiB")
+    if baseline is not None:
+        for key in ("seconds", "peak_mib"):
+            limit = baseline[key] * (1 + tolerance)
+            if result[key] > limit:
+                failures.append(f"{key} {result[key]:.2f} is more than {tolerance:.0%} above baseline {baseline[key]:.2f}")
+    return failures
+
+
+async def main(args) -> int:
+    async with SyntheticFeedServer(args.payload_dir) as server:
+        feeds = local_feeds(server, args.scale)
+        # the first run warms up the server cache and imports, it is not measured
+        await run_pipeline(feeds)
+        runs = [await run_pipeline(feeds) for _ in range(args.repeat)]
+        result = min(runs, key=lambda run: run["seconds"])
+        result["peak_mib"] = (await run_pipeline(feeds, trace_memory=True))["peak_mib"]
+
+    print(f"{len(feeds)} feeds at scale {args.scale}, best of {args.repeat} runs")
+    print(
+        f"wall time {result['seconds']:.2f}s  peak traced memory {result['peak_mib']:.1f} MiB  "
+        f"downloaded {result['downloaded_mib']:.1f} MiB  {result['rows']} rows"
+    )
+    print(
+        f"archive {result['archive_mib']:.2f} MiB  uploaded {result['uploaded_mib']:.2f} MiB "
+        f"in {result['upload_requests']} requests"
+    )
+    print("stage seconds summed over feeds: " + "  ".join(f"{k} {v:.2f}" for k, v in result["stages"].items()))
+
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(json.dumps(result, indent=2))
+        print(f"baseline saved to {args.save_baseline}")
+    baseline = json.loads(Path(args.baseline).read_text()) if args.baseline else None
+    # traced memory is dominated by the largest feed and the interpreter, only the time budget scales
+    failures = check(result, args.max_seconds * args.scale, args.max_peak_mib, baseline, args.tolerance)
+    errors = verify(result)
+    for failure in failures:
+        print(f"{'OVER BUDGET' if args.report_only else 'FAIL'}: {failure}")
+    for error in errors:
+        print(f"FAIL: {error}")
+    if args.report_only:
+        failures = []
+    print("FAIL" if failures or errors else "PASS")
+    return 1 if failures or errors else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier of the number of records per feed")
+    parser.add_argument("--payload-dir", help="directory with recorded payloads named <feed>.json")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--max-seconds", type=float, default=MAX_SECONDS, help="budget at scale 1.0")
+    parser.add_argument("--max-peak-mib", type=float, default=MAX_PEAK_MIB)
+    parser.add_argument("--baseline", help="JSON result of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="allowed slowdown vs the baseline")
+    parser.add_argument("--save-baseline", help="save the result as a baseline")
+    parser.add_argument("--report-only", action="store_true", help="report exceeded thresholds without failing")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,46 @@
+"""
+Memory benchmark of buffered vs streaming retrieve_data on a synthetic feed
+
+Usage: python -m retrieval.benchmarks.bench_streaming [--records 1000000]
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from retrieval.fetch_data import retrieve_data
+from retrieval.benchmarks.synthetic_server import SyntheticFeedServer
+
+DEFAULT_RECORDS = 1_000_000
+
+
+async def _measure(url: str, streaming: bool) -> tuple:
+    with tempfile.TemporaryDirectory() as tmp:
+        tracemalloc.start()
+        start = time.perf_counter()
+        await retrieve_data("dscovr_mag_1s", url, tmp, streaming=streaming)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        size = sum(p.stat().st_size for p in Path(tmp).glob("*.csv"))
+    return elapsed, peak, size
+
+
+async def main(records: int):
+    async with SyntheticFeedServer() as server:
+        await server.warm_up(records)
+        url = server.url("dscovr_mag_1s", records)
+        print(f"synthetic feed: {records} records")
+        for streaming in (False, True):
+            elapsed, peak, size = await _measure(url, streaming)
+            mode = "streaming" if streaming else "buffered"
+            print(f"{mode:>10}: {elapsed:7.2f}s  peak traced memory {peak / 2 ** 20:8.1f} MiB  csv {size / 2 ** 20:.1f} MiB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", type=int, default=DEFAULT_RECORDS)
+    args = parser.parse_args()
+    asyncio.run(main(args.records))
@@ -0,0 +1,152 @@
+import asyncio
+import multiprocessing
+import socket
+import time
+from pathlib import Path
+from typing import Optional, Sequence, Union
+from urllib.parse import quote
+from aiohttp import web
+
+RECORDS_PER_WRITE = 10_000
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _synthetic_value(column: str, i: int) -> str:
+    """
+    JSON value of a column of the i-th synthetic record, typed after the columns of the NOAA feeds
+    """
+    if column == "time_tag":
+        return f'"2024-05-10T{(i // 3600) % 24:02d}:{(i // 60) % 60:02d}:{i % 60:02d}"'
+    if column == "satellite":
+        return str(16 + i % 2)
+    if column == "energy":
+        return '">=10 MeV"'
+    if column.endswith("_flag"):
+        return "false"
+    return f"{(i % 13) * 0.37 - len(column) % 5:.2f}"
+
+
+def synthetic_records(start: int, end: int, columns: Optional[Sequence[str]] = None) -> str:
+    """
+    Comma separated records with indices in [start, end), dscovr_mag_1s-like ones unless columns are given
+
+    :param start:
+    :param end:
+    :param columns: fields of every record, e.g. the schema of a registered feed
+    """
+    if columns:
+        return ",".join(
+            "{" + ",".join(f'"{column}":{_synthetic_value(column, i)}' for column in columns) + "}"
+            for i in range(start, end)
+        )
+    return ",".join(
+        f'{{"time_tag":"2024-05-10T{(i // 3600) % 24:02d}:{(i // 60) % 60:02d}:{i % 60:02d}",'
+        f'"active":true,"source":"ac","range":{i % 7},"scale":null,"sensitivity":0,"manual_mode":false,'
+        f'"bt":{5 + (i % 13) * 0.37:.2f},"bx_gsm":{-(i % 11) * 0.41:.2f},"by_gsm":{(i % 5) * 0.93:.2f},'
+        f'"bz_gsm":{-(i % 17) * 0.29:.2f}}}'
+        for i in range(start, end)
+    )
+
+
+def _serve(port: int, payload_dir: Optional[Path] = None):
+    """
+    Serve synthetic feeds streamed in chunks. The number of records is taken from the "records" query parameter
+    and their fields from the comma separated "columns" one, generated chunks are kept, so the server is not
+    the bottleneck of repeated requests.
+    A feed recorded as <payload_dir>/<name>.json is replayed instead
+    """
+    chunks = {}
+    recorded = {}
+
+    def get_chunks(records: int, columns: tuple) -> list:
+        if (records, columns) not in chunks:
+            chunks[records, columns] = [
+                (
+                    ("," if start else "")
+                    + synthetic_records(start, min(start + RECORDS_PER_WRITE, records), columns)
+                ).encode()
+                for start in range(0, records, RECORDS_PER_WRITE)
+            ]
+        return chunks[records, columns]
+
+    async def handler(request: web.Request):
+        path = payload_dir / request.match_info["name"] if payload_dir is not None else None
+        if path is not None and path.is_file():
+            if path not in recorded:
+                recorded[path] = path.read_bytes()
+            return web.Response(body=recorded[path], content_type="application/json")
+        records = int(request.query.get("records", 1000))
+        columns = tuple(column for column in request.query.get("columns", "").split(",") if column)
+        response = web.StreamResponse(headers={"Content-Type": "application/json"})
+        await response.prepare(request)
+        await response.write(b"[")
+        for chunk in get_chunks(records, columns):
+            await response.write(chunk)
+        await response.write(b"]")
+        await response.write_eof()
+        return response
+
+    app = web.Application()
+    app.router.add_get("/{name:.*}", handler)
+    web.run_app(app, host="127.0.0.1", port=port, print=None, handle_signals=False)
+
+
+class SyntheticFeedServer:
+    """
+    Synthetic NOAA-like feed server running in a separate process, so it does not affect
+    the memory and CPU measurements of the benchmarked client
+    """
+    def __init__(self, payload_dir: Optional[Union[str, Path]] = None):
+        """
+        :param payload_dir: directory with recorded payloads named <feed>.json, replayed instead of synthetic records
+        """
+        self.port = _free_port()
+        payload_dir = Path(payload_dir) if payload_dir is not None else None
+        self.process = multiprocessing.Process(target=_serve, args=(self.port, payload_dir), daemon=True)
+
+    def url(self, name: str, records: int, columns: Sequence[str] = ()) -> str:
+        """
+        :param name: name of the feed
+        :param records: number of served records
+        :param columns: fields of the served records, dscovr_mag_1s-like records when not given
+        """
+        url = f"http://127.0.0.1:{self.port}/{name}.json?records={records}"
+        if columns:
+            url += "&columns=" + quote(",".join(columns), safe=",")
+        return url
+
+    async def wait_ready(self, timeout: float = 10.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                _, writer = await asyncio.open_connection("127.0.0.1", self.port)
+                writer.close()
+                return
+            except OSError:
+                await asyncio.sleep(0.1)
+        raise RuntimeError("Benchmark server did not start")
+
+    async def warm_up(self, records: int):
+        """
+        Request a payload once, so it is generated before measurements start
+        """
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+        writer.write(f"GET /warm-up.json?records={records} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n".encode())
+        await writer.drain()
+        while await reader.read(2 ** 16):
+            pass
+        writer.close()
+
+    async def __aenter__(self):
+        self.process.start()
+        await self.wait_ready()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.process.terminate()
+        self.process.join()
@@ -0,0 +1,191 @@
+import asyncio
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, Optional, Union
+import aiohttp
+from retrieval.url_mapping import NAME2URL
+from retrieval.feeds import DEFAULT_CADENCE, FEEDS, feed_for
+from retrieval.fetch_data import (
+    SAVE_DIR, DROPBOX_DIR, FETCH_CONCURRENCY, OUTPUT_FORMAT, RETRY_POLICY, create_session, retrieve_data,
+    compress_data, logger
+)
+from retrieval.archive import DirectorySink
+from retrieval.validator_cache import ValidatorCache
+from retrieval.watermarks import WatermarkStore
+from retrieval.send2dropbox import send_to_dropbox
+
+DEFAULT_POLL_INTERVAL = DEFAULT_CADENCE
+
+
+class PollingDaemon:
+    """
+    Long-running alternative to the daily retrieve_all_data run. Every feed is polled at its own interval,
+    records newer than its watermark are appended to the files of the current day, snapshots and conditional
+    feeds, which are written whole, replace the file of the day. After midnight the finished day is compressed
+    and uploaded to Dropbox like the output of a daily run
+    """
+    def __init__(
+        self,
+        name2url: Optional[Dict[str, str]] = None,
+        intervals: Optional[Dict[str, float]] = None,
+        default_interval: float = DEFAULT_POLL_INTERVAL,
+        save_dir: Union[str, Path] = SAVE_DIR,
+        concurrency: int = FETCH_CONCURRENCY,
+        output_format: str = OUTPUT_FORMAT,
+        clock: Callable[[], datetime] = datetime.now
+    ):
+        """
+        :param name2url: feeds to poll, NAME2URL when not given
+        :param intervals: per-feed polling intervals in seconds, the cadence of registered feeds when not given
+        :param default_interval: polling interval in seconds of feeds missing in intervals
+        :param save_dir: directory holding a subdirectory with the files of every day
+        :param concurrency: maximum number of feeds fetched at the same time
+        :param output_format: format of the written files, one of writers.OUTPUT_FORMATS, "csv" is recommended
+            as every poll of a Parquet file reads and rewrites the whole file of the day
+        :param clock: source of the current local time, deciding about the day records are written to
+        """
+        self.name2url = name2url if name2url is not None else NAME2URL
+        self.feeds = {name: feed_for(name, url) for name, url in self.name2url.items()}
+        if intervals is None:
+            intervals = {name: feed.cadence for name, feed in self.feeds.items() if feed is FEEDS.get(name)}
+        self.intervals = intervals
+        self.default_interval = default_interval
+        self.save_dir = Path(save_dir)
+        self.concurrency = concurrency
+        self.output_format = output_format
+        self.clock = clock
+        self.cache = ValidatorCache()
+        self.watermarks = WatermarkStore()
+        # day -> polls writing into its directory which have not finished yet
+        self.in_flight = defaultdict(set)
+        self.semaphore = asyncio.Semaphore(concurrency)
+
+    def interval_for(self, name: str) -> float:
+        return self.intervals.get(name, self.default_interval)
+
+    def today(self) -> str:
+        return f"{self.clock().date()}"
+
+    async def poll(self, session: aiohttp.ClientSession, name: str, url: str, day: str) -> bool:
+        """
+        Fetch a feed once and append its new records to the files of a day, or replace the file of the day
+        for feeds without a watermark
+
+        :param session: shared client session
+        :param name: name of the feed
+        :param url: url of the feed
+        :param day: date of the day the records are written to
+        :return: False if the feed could not be retrieved
+        """
+        feed = self.feeds[name]
+        try:
+            async with self.semaphore:
+                await asyncio.wait_for(
+                    retrieve_data(
+                        name,
+                        url,
+                        DirectorySink(self.save_dir / day, replace=not feed.incremental),
+                        session,
+                        streaming=feed.streaming,
+                        cache=self.cache if feed.conditional else None,
+                        policy=feed.policy or RETRY_POLICY,
+                        output_format=feed.output_format or self.output_format,
+                        watermarks=self.watermarks if feed.incremental else None,
+                        date=day,
+                        schema=feed.schema
+                    ),
+                    feed.timeout
+                )
+            return True
+        except asyncio.TimeoutError:
+            logger.log_error(f"Polling {name} timed out")
+            return False
+        except Exception as e:
+            logger.log_error(f"Polling {name} failed: {e}")
+            return False
+        finally:
+            # the written files stay in the directory, the marks have to match them
+            self.watermarks.save()
+
+    async def poll_forever(self, session: aiohttp.ClientSession, name: str, url: str):
+        """
+        Poll a feed at its interval, a poll taking longer than the interval delays the next one
+        """
+        interval = self.interval_for(name)
+        while True:
+            started_at = time.monotonic()
+            day = self.today()
+            task = asyncio.ensure_future(self.poll(session, name, url, day))
+            self.in_flight[day].add(task)
+            task.add_done_callback(self.in_flight[day].discard)
+            await task
+            await asyncio.sleep(max(0.0, interval - (time.monotonic() - started_at)))
+
+    async def roll_over(self, day: str):
+        """
+        Compress the files of a finished day and upload the archive, once the polls still writing into it are done
+
+        :param day: date of the finished day
+        """
+        pending = self.in_flight.pop(day, set())
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        target_dir = self.save_dir / day
+        if not target_dir.exists() or not any(target_dir.iterdir()):
+            logger.log_warning(f"No data polled on {day}, nothing to upload")
+            return
+        archive_path = target_dir.parent / f"{day}.zip"
+        try:
+            await asyncio.to_thread(compress_data, day, target_dir)
+            logger.log(f"Data of {day} compressed to {archive_path}")
+            await asyncio.to_thread(send_to_dropbox, archive_path, f"{DROPBOX_DIR}/{day}.zip", logger)
+        except Exception as e:
+            logger.log_error(f"Failed to roll over data of {day}: {e}")
+
+    async def roll_over_previous_days(self):
+        """
+        Roll over directories of days which ended while the daemon was not running
+        """
+        today = self.today()
+        for target_dir in sorted(self.save_dir.iterdir()):
+            if target_dir.is_dir() and _is_date(target_dir.name) and target_dir.name < today:
+                await self.roll_over(target_dir.name)
+
+    async def roll_over_at_midnight(self):
+        """
+        Roll over every day right after it ends
+        """
+        while True:
+            now = self.clock()
+            midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+            await asyncio.sleep((midnight - now).total_seconds())
+            await self.roll_over(f"{now.date()}")
+
+    async def run(self):
+        """
+        Poll all feeds until cancelled
+        """
+        logger.log(f"Polling {len(self.name2url)} feeds, archives are rolled over at midnight")
+        if self.output_format == "parquet":
+            logger.log_warning("Parquet files are rewritten whole on every poll, use csv output for the daemon")
+        self.save_dir.mkdir(parents=True, exist_ok=True)
+        await self.roll_over_previous_days()
+        async with create_session() as session:
+            await asyncio.gather(
+                self.roll_over_at_midnight(),
+                *[self.poll_forever(session, name, url) for name, url in self.name2url.items()]
+            )
+
+
+def _is_date(name: str) -> bool:
+    try:
+        datetime.strptime(name, "%Y-%m-%d")
+    except ValueError:
+        return False
+    return True
+
+
+if __name__ == "__main__":
+    asyncio.run(PollingDaemon().run())
@@ -0,0 +1,78 @@
+import json
+from os import getenv
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+# decoder of buffered responses, "auto" picks the fastest installed one (orjson, msgspec, json)
+JSON_DECODER = getenv("RETRIEVAL_JSON_DECODER", "auto")
+
+
+class DecodeError(ValueError):
+    """Exception raised when a payload is not a JSON array of records"""
+    pass
+
+
+def _decode_orjson(payload: bytes) -> Any:
+    return orjson.loads(payload)
+
+
+def _decode_msgspec(payload: bytes) -> Any:
+    return _MSGSPEC_RECORDS.decode(payload)
+
+
+def _decode_json(payload: bytes) -> Any:
+    return json.loads(payload)
+
+
+_MSGSPEC_RECORDS = msgspec.json.Decoder(List[Dict[str, Any]]) if msgspec is not None else None
+DECODERS: Dict[str, Optional[Callable[[bytes], Any]]] = {
+    "orjson": _decode_orjson if orjson is not None else None,
+    "msgspec": _decode_msgspec if msgspec is not None else None,
+    "json": _decode_json,
+}
+
+
+def available_decoders() -> List[str]:
+    """
+    :return: names of the decoders which can be used, fastest first
+    """
+    return [name for name, decode in DECODERS.items() if decode is not None]
+
+
+def get_decoder(name: str = JSON_DECODER) -> Callable[[bytes], list]:
+    """
+    Decoder turning the raw body of a feed into a list of records
+
+    :param name: one of DECODERS or "auto" for the fastest installed one
+    :return: function decoding bytes, raising DecodeError for invalid JSON or a payload which is not an array
+    """
+    if name == "auto":
+        name = available_decoders()[0]
+    if name not in DECODERS:
+        raise ValueError(f"Unknown JSON decoder {name}, expected auto or one of {', '.join(DECODERS)}")
+    decode = DECODERS[name]
+    if decode is None:
+        raise RuntimeError(f"{name} is not installed, install it with 'pip install {name}' or use another decoder")
+
+    def decode_records(payload: bytes) -> list:
+        try:
+            data = decode(payload)
+        except (ValueError, TypeError) as e:
+            # orjson and msgspec errors subclass ValueError, as does json.JSONDecodeError
+            raise DecodeError(f"Invalid JSON payload: {e}") from e
+        if data is None:
+            return []
+        if not isinstance(data, list):
+            raise DecodeError(f"Payload is not a JSON array but {type(data).__name__}")
+        return data
+
+    decode_records.decoder = name
+    return decode_records
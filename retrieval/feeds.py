@@ -0,0 +1,179 @@
+from typing import Dict, Optional, Sequence
+from retrieval.retry import RetryPolicy
+from retrieval.scheduler import DEFAULT_PRIORITY, DEFAULT_TIMEOUT
+
+# size classes, large feeds are parsed incrementally instead of buffering the whole payload
+SMALL = "small"
+LARGE = "large"
+# parsers of the response body
+BUFFERED = "buffered"
+STREAMING = "streaming"
+PARSERS = {BUFFERED, STREAMING}
+# kinds of feeds, time series are appended incrementally, snapshots are written whole on every run
+TIME_SERIES = "time-series"
+SNAPSHOT = "snapshot"
+# polling interval in seconds of feeds which do not declare their cadence
+DEFAULT_CADENCE = 3600
+
+
+class Feed:
+    """
+    Metadata of a single NOAA feed deciding how it is fetched, parsed and written
+    """
+    def __init__(
+        self,
+        name: str,
+        url: str,
+        schema: Sequence[str] = (),
+        cadence: float = DEFAULT_CADENCE,
+        size: str = SMALL,
+        parser: Optional[str] = None,
+        kind: str = TIME_SERIES,
+        conditional: bool = False,
+        priority: int = DEFAULT_PRIORITY,
+        timeout: Optional[float] = DEFAULT_TIMEOUT,
+        policy: Optional[RetryPolicy] = None,
+        output_format: Optional[str] = None,
+        archive_url: Optional[str] = None
+    ):
+        """
+        :param name: name of the feed, also the prefix of its output file
+        :param url: url of the JSON feed
+        :param schema: expected columns in the order the DB loader reads them, columns of the response
+            are written in this order, unexpected ones after them
+        :param cadence: how often in seconds the feed gets new data, used as the polling interval of the daemon
+        :param size: SMALL or LARGE
+        :param parser: BUFFERED or STREAMING, by default large feeds are streamed and small ones buffered
+        :param kind: TIME_SERIES or SNAPSHOT
+        :param conditional: the feed rarely changes and is requested with validators of the previous run
+        :param priority: feeds with lower values are started first
+        :param timeout: total time in seconds for fetching the feed, None for no timeout
+        :param policy: retry policy of the feed, None for the default one
+        :param output_format: format of the written file, None for the format of the run
+        :param archive_url: url of the same records over a longer window (e.g. the last 7 days), used by backfills
+        """
+        parser = parser or (STREAMING if size == LARGE else BUFFERED)
+        if parser not in PARSERS:
+            raise ValueError(f"Unknown parser {parser}, expected one of {', '.join(sorted(PARSERS))}")
+        if kind not in (TIME_SERIES, SNAPSHOT):
+            raise ValueError(f"Unknown feed kind {kind}, expected {TIME_SERIES} or {SNAPSHOT}")
+        self.name = name
+        self.url = url
+        self.schema = tuple(schema)
+        self.cadence = cadence
+        self.size = size
+        self.parser = parser
+        self.kind = kind
+        self.conditional = conditional
+        self.priority = priority
+        self.timeout = timeout
+        self.policy = policy
+        self.output_format = output_format
+        self.archive_url = archive_url
+
+    @property
+    def streaming(self) -> bool:
+        return self.parser == STREAMING
+
+    @property
+    def incremental(self) -> bool:
+        """
+        Whether only records newer than the watermark are written, a 304 of a conditional feed reuses
+        its whole cached output, so those are always written whole
+        """
+        return self.kind == TIME_SERIES and not self.conditional
+
+    def __repr__(self):
+        return f"Feed({self.name}: {self.kind}, {self.size}, {self.parser})"
+
+
+FEEDS: Dict[str, Feed] = {}
+
+
+def register_feed(feed: Feed) -> Feed:
+    """
+    Add a feed to the registry, replacing a feed of the same name
+    """
+    FEEDS[feed.name] = feed
+    return feed
+
+
+def feed_for(name: str, url: str) -> Feed:
+    """
+    Registered metadata of a feed, feeds missing in the registry or registered with another url get the defaults
+
+    :param name: name of the feed
+    :param url: url of the feed
+    :return:
+    """
+    feed = FEEDS.get(name)
+    if feed is None or feed.url != url:
+        return Feed(name, url)
+    return feed
+
+
+_BASE_URL = "https://services.swpc.noaa.gov/json"
+_XRAY_SCHEMA = (
+    "time_tag", "satellite", "flux", "observed_flux", "electron_correction", "electron_contaminaton", "energy"
+)
+_INTEGRAL_SCHEMA = ("time_tag", "satellite", "flux", "energy")
+
+register_feed(Feed(
+    "boulder_k_index_1m", f"{_BASE_URL}/boulder_k_index_1m.json",
+    schema=("time_tag", "k_index"), cadence=300
+))
+register_feed(Feed(
+    "planetary_k_index_1m", f"{_BASE_URL}/planetary_k_index_1m.json",
+    schema=("time_tag", "kp_index", "estimated_kp", "kp"), cadence=300
+))
+register_feed(Feed(
+    "satellite-longitudes", f"{_BASE_URL}/goes/satellite-longitudes.json",
+    kind=SNAPSHOT, conditional=True
+))
+register_feed(Feed(
+    "magnetometers-1-day", f"{_BASE_URL}/goes/primary/magnetometers-1-day.json",
+    schema=("time_tag", "satellite", "He", "Hp", "Hn", "total", "arcjet_flag"),
+    cadence=900, size=LARGE, priority=1, timeout=240,
+    archive_url=f"{_BASE_URL}/goes/primary/magnetometers-7-day.json"
+))
+for _source in ("primary", "secondary"):
+    for _particle in ("electrons", "protons"):
+        register_feed(Feed(
+            f"{_source}-differential-{_particle}-1-day", f"{_BASE_URL}/goes/{_source}/differential-{_particle}-1-day.json",
+            cadence=900, size=LARGE, priority=1, timeout=240,
+            archive_url=f"{_BASE_URL}/goes/{_source}/differential-{_particle}-7-day.json"
+        ))
+    register_feed(Feed(
+        f"{_source}-integral-electrons-1-day", f"{_BASE_URL}/goes/{_source}/integral-electrons-1-day.json",
+        cadence=900, archive_url=f"{_BASE_URL}/goes/{_source}/integral-electrons-7-day.json"
+    ))
+    register_feed(Feed(
+        f"{_source}-integral-protons-1-day", f"{_BASE_URL}/goes/{_source}/integral-protons-1-day.json",
+        schema=_INTEGRAL_SCHEMA, cadence=900, archive_url=f"{_BASE_URL}/goes/{_source}/integral-protons-7-day.json"
+    ))
+    register_feed(Feed(
+        f"{_source}-xray-1-day", f"{_BASE_URL}/goes/{_source}/xrays-1-day.json",
+        schema=_XRAY_SCHEMA, cadence=900, archive_url=f"{_BASE_URL}/goes/{_source}/xrays-7-day.json"
+    ))
+register_feed(Feed(
+    "observed-solar-cycle-indices", f"{_BASE_URL}/solar-cycle/observed-solar-cycle-indices.json",
+    kind=SNAPSHOT, conditional=True
+))
+register_feed(Feed(
+    "f10-7cm-flux", f"{_BASE_URL}/solar-cycle/f10-7cm-flux.json",
+    kind=SNAPSHOT, conditional=True
+))
+register_feed(Feed(
+    "predicted-solar-cycle", f"{_BASE_URL}/solar-cycle/predicted-solar-cycle.json",
+    kind=SNAPSHOT, conditional=True
+))
+register_feed(Feed("solar_regions", f"{_BASE_URL}/solar_regions.json", kind=SNAPSHOT))
+register_feed(Feed("solar-radio-flux", f"{_BASE_URL}/solar-radio-flux.json", kind=SNAPSHOT))
+register_feed(Feed(
+    "dscovr_mag_1s", f"{_BASE_URL}/dscovr/dscovr_mag_1s.json",
+    schema=(
+        "time_tag", "bt", "bx_gse", "by_gse", "bz_gse", "theta_gse", "phi_gse",
+        "bx_gsm", "by_gsm", "bz_gsm", "theta_gsm", "phi_gsm"
+    ),
+    cadence=60, size=LARGE, priority=0, timeout=300
+))
@@ -1,126 +1,627 @@
 from shutil import make_archive, rmtree
 from pathlib import Path
-from typing import Union
+from os import getenv
+from typing import Union, Optional, Callable, Awaitable, Dict, Sequence
 from datetime import datetime
-import csv
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+import time
 import asyncio
+import contextvars
 import aiohttp
 from retrieval.url_mapping import NAME2URL
+from retrieval.feeds import Feed, feed_for
+from retrieval.stream_json import iter_json_array
+from retrieval.decoding import JSON_DECODER, get_decoder
+from retrieval.validator_cache import ValidatorCache
+from retrieval.watermarks import WatermarkStore, FeedWatermark
+from retrieval.writers import OUTPUT_FORMATS, make_appender
+from retrieval.flatten import FeedSchema, flatten_columns
+from retrieval.archive import DirectorySink, ZipSink, Sink, parallel_zip
+from retrieval.retry import RetryPolicy, FatalError
+from retrieval.scheduler import FetchScheduler, RateLimiter
 from retrieval.logger import Logger
+from retrieval.timing import RunReport, feed_context, span, trace_config
 from retrieval.send2dropbox import send_to_dropbox
 
 SAVE_DIR = Path(__file__).parent / "data"
-RETRY_SLEEP_TIME = 15
 MAX_RETRIES = 3
+RETRY_BASE_DELAY = 2
+RETRY_MAX_DELAY = 15
+# total time for all attempts of a single feed, including the delays between them,
+# shorter than the scheduler timeouts of the feeds (scheduler.DEFAULT_TIMEOUT)
+RETRY_DEADLINE = 180
 SAVE_DIR.mkdir(parents=True, exist_ok=True)
 DROPBOX_DIR = "/inzynierka"
+# suffix of the JSON timing report written next to the archive of a run
+REPORT_SUFFIX = ".report.json"
+# connection pool settings shared by every feed fetched in a single run
+CONNECTOR_LIMIT = 20
+CONNECTOR_LIMIT_PER_HOST = 8
+DNS_CACHE_TTL = 300
+KEEPALIVE_TIMEOUT = 30
+# write feeds straight into the zip archive, "0" writes a directory compressed with make_archive afterwards
+STREAM_ARCHIVE = getenv("RETRIEVAL_STREAM_ARCHIVE", "1") != "0"
+# compression method (deflate, bzip2, lzma or stored) and level of the streamed archive
+ARCHIVE_COMPRESSION = getenv("RETRIEVAL_ARCHIVE_COMPRESSION", "deflate")
+ARCHIVE_COMPRESSLEVEL = int(getenv("RETRIEVAL_ARCHIVE_COMPRESSLEVEL")) if getenv("RETRIEVAL_ARCHIVE_COMPRESSLEVEL") else None
+# threads deflating the data directory in compress_data, 1 compresses it with make_archive
+COMPRESS_WORKERS = int(getenv("RETRIEVAL_COMPRESS_WORKERS", "1"))
+# number of feeds fetched at the same time
+FETCH_CONCURRENCY = 8
+# append and archive only records newer than the last stored time_tag of each feed, "0" writes whole responses
+INCREMENTAL = getenv("RETRIEVAL_INCREMENTAL", "1") != "0"
+# format of the files written for each feed, csv or parquet (requires pyarrow)
+OUTPUT_FORMAT = getenv("RETRIEVAL_OUTPUT_FORMAT", "csv")
+# number of rows written to the output file at once in streaming mode
+CSV_BATCH_SIZE = 5000
+# dedicated executor doing file I/O off the event loop, None writes directly on the event loop
+WRITER_THREADS = 1
+WRITER_EXECUTOR = ThreadPoolExecutor(max_workers=WRITER_THREADS, thread_name_prefix="writer")
+# decodes the raw body of buffered responses, orjson or msgspec when installed
+decode_records = get_decoder(JSON_DECODER)
+RETRY_POLICY = RetryPolicy(
+    max_attempts=MAX_RETRIES,
+    base_delay=RETRY_BASE_DELAY,
+    max_delay=RETRY_MAX_DELAY,
+    deadline=RETRY_DEADLINE
+)
 logger = Logger()
 
-async def retrieve_data(target_name: str, url: str, target_dir: Union[str, Path] = SAVE_DIR):
+
+def create_session(
+    limit: int = CONNECTOR_LIMIT,
+    limit_per_host: int = CONNECTOR_LIMIT_PER_HOST,
+    dns_cache_ttl: int = DNS_CACHE_TTL,
+    keepalive_timeout: int = KEEPALIVE_TIMEOUT
+) -> aiohttp.ClientSession:
+    """
+    Create a pooled client session reused by all feeds, so connections to the same host are kept alive.
+    DNS resolution, connecting and waiting for response headers are timed into the active run report
+
+    :param limit: total number of simultaneous connections
+    :param limit_per_host: number of simultaneous connections to a single host
+    :param dns_cache_ttl: time in seconds for which resolved addresses are cached
+    :param keepalive_timeout: time in seconds for which idle connections are kept open
+    :return:
+    """
+    connector = aiohttp.TCPConnector(
+        limit=limit,
+        limit_per_host=limit_per_host,
+        ttl_dns_cache=dns_cache_ttl,
+        use_dns_cache=True,
+        keepalive_timeout=keepalive_timeout
+    )
+    return aiohttp.ClientSession(connector=connector, trace_configs=[trace_config()])
+
+
+async def run_in_writer(fn: Callable, *args):
+    """
+    Run blocking file I/O on the writer executor, so downloads of other feeds are not stalled
+
+    :param fn: function doing the I/O
+    :param args: arguments of the function
+    :return: result of the function
+    """
+    if WRITER_EXECUTOR is None:
+        return fn(*args)
+    # spans recorded by fn belong to the feed and report of the caller
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(WRITER_EXECUTOR, context.run, fn, *args)
+
+
+def write_batch(
+    appender,
+    schema: FeedSchema,
+    records: list,
+    target_name: str,
+    header: bool = False,
+    watermark: Optional[FeedWatermark] = None
+):
+    """
+    Flatten a batch of records and append it in the column order of the schema. The first batch defines
+    the schema together with the expected columns of the feed, which are written empty when the data lacks them.
+    Unexpected columns first seen in later batches cannot be added to an already written header and are dropped
+
+    :param appender: opened appender of the output file
+    :param schema: column order of the feed, empty before the first batch unless appending to a file with known columns
+    :param records: list of records
+    :param target_name: name of the retrieved feed
+    :param header: write the header with the first batch, i.e. the output file was empty
+    :param watermark: drops records already written by previous runs, None writes all records
+    """
+    if watermark is not None:
+        records = watermark.filter(records, appending=not header)
+        if not records:
+            return
+    with span("flatten") as flattened:
+        columns = flatten_columns(records)
+        flattened.rows = len(records)
+    if not schema.columns:
+        schema.update(columns)
+        missing = schema.missing(columns)
+        if missing:
+            logger.log_warning(
+                f"Expected columns {', '.join(missing)} of {target_name} are missing in the data, writing them empty"
+            )
+        if header:
+            logger.log(f"Writing header for {target_name} to {appender.sink.location(appender.name)}")
+            appender.write_header(schema.columns)
+    else:
+        dropped = schema.unknown(columns)
+        if dropped:
+            logger.log_warning(f"Dropping columns {', '.join(dropped)} of {target_name} missing from the header")
+    with span("write") as written:
+        appender.write_columns(schema.align(columns, len(records)))
+        written.rows = len(records)
+
+
+def close_appender(appender):
+    """
+    Close an appender, formats buffering the whole file (Parquet) write it now
     """
-    Retrieve a data for a specific url
+    with span("write"):
+        appender.close()
+
+
+def write_records(
+    sink: Sink,
+    name: str,
+    target_name: str,
+    data: list,
+    output_format: str = OUTPUT_FORMAT,
+    watermark: Optional[FeedWatermark] = None,
+    schema: Sequence[str] = ()
+):
+    """
+    Append decoded records to an output file
+
+    :param sink: sink the output file is written to
+    :param name: name of the output file
+    :param target_name: name of the retrieved feed
+    :param data: list of records
+    :param output_format: one of writers.OUTPUT_FORMATS
+    :param watermark: drops records already written by previous runs, None writes all records
+    :param schema: expected columns of the feed in their order
+    """
+    appender = make_appender(sink, name, output_format)
+    try:
+        # Write the header only if the file is empty
+        header = appender.open()
+        write_batch(appender, FeedSchema(appender.header or (), expected=schema), data, target_name, header, watermark)
+    finally:
+        close_appender(appender)
+
+
+async def stream_records(
+    response: aiohttp.ClientResponse,
+    sink: Sink,
+    name: str,
+    target_name: str,
+    output_format: str = OUTPUT_FORMAT,
+    batch_size: int = CSV_BATCH_SIZE,
+    watermark: Optional[FeedWatermark] = None,
+    schema: Sequence[str] = ()
+) -> int:
+    """
+    Parse the JSON array from the response body incrementally and append it to an output file in bounded batches.
+    A batch is written on the writer executor while the next one is being parsed
+
+    :param response: response with a JSON array body
+    :param sink: sink the output file is written to
+    :param name: name of the output file
+    :param target_name: name of the retrieved feed
+    :param output_format: one of writers.OUTPUT_FORMATS
+    :param batch_size: number of rows written at once
+    :param watermark: drops records already written by previous runs, None writes all records
+    :param schema: expected columns of the feed in their order
+    :return: number of parsed rows
+    """
+    written = 0
+    batch = []
+    appender = None
+    header = False
+    feed_schema = None
+    pending = None
+    try:
+        async for item in iter_json_array(response.content):
+            if appender is None:
+                appender = make_appender(sink, name, output_format)
+                # Write the header only if the file is empty
+                header = await run_in_writer(appender.open)
+                # a file written earlier fixes the columns
+                feed_schema = FeedSchema(appender.header or (), expected=schema)
+            batch.append(item)
+            if len(batch) >= batch_size:
+                if pending is not None:
+                    await pending
+                pending = asyncio.ensure_future(
+                    run_in_writer(write_batch, appender, feed_schema, batch, target_name, header, watermark)
+                )
+                written += len(batch)
+                batch = []
+        if pending is not None:
+            await pending
+            pending = None
+        if batch:
+            await run_in_writer(write_batch, appender, feed_schema, batch, target_name, header, watermark)
+            written += len(batch)
+    except BaseException:
+        if pending is not None:
+            await asyncio.gather(pending, return_exceptions=True)
+        # drop a partially written payload, so a re-issued request does not duplicate rows
+        if appender is not None:
+            await run_in_writer(appender.rollback)
+        raise
+    finally:
+        if appender is not None:
+            await run_in_writer(close_appender, appender)
+    return written
+
+
+def _commit_watermark(watermark: Optional[FeedWatermark], rows: int):
+    """
+    Advance the mark of a successfully written feed
+
+    :param watermark: watermark of the fetch, None if the feed is not fetched incrementally
+    :param rows: number of records in the response
+    """
+    if watermark is None:
+        return
+    watermark.commit()
+    if watermark.skipped:
+        logger.log(
+            f"Skipped {watermark.skipped}/{rows} records of {watermark.target_name} "
+            f"already stored by previous runs, newest time_tag {watermark.newest}"
+        )
+
+
+async def _fetch_once(
+    target_name: str,
+    url: str,
+    sink: Sink,
+    session: aiohttp.ClientSession,
+    streaming: bool,
+    cache: Optional[ValidatorCache],
+    policy: RetryPolicy,
+    timeout: Optional[float],
+    output_format: str,
+    watermarks: Optional[WatermarkStore] = None,
+    date: Optional[str] = None,
+    schema: Sequence[str] = ()
+):
+    """
+    Issue a single request for a feed and save the response
 
     :param target_name:
     :param url:
-    :param target_dir:
+    :param sink:
+    :param session:
+    :param streaming:
+    :param cache:
+    :param policy: retry policy used to classify unsuccessful responses
+    :param timeout: total time in seconds for the request, None for the session default
+    :param output_format:
+    :param watermarks: high-water marks of the feeds, only records not written by earlier runs are written
+    :param date: date in the name of the output file, today when not given
+    :param schema: expected columns of the feed in their order
     :return:
     """
-    target_dir = Path(target_dir)
-    target_dir.mkdir(parents=True, exist_ok=True)
+    suffix = OUTPUT_FORMATS[output_format].suffix
+    headers = cache.request_headers(target_name, suffix) if cache is not None else {}
+    request_timeout = aiohttp.ClientTimeout(total=timeout) if timeout is not None else None
+    async with session.get(url, headers=headers, timeout=request_timeout) as response:
+        date = date or f"{datetime.today().date()}"
+        name = f"{target_name}_{date}{suffix}"
+        watermark = watermarks.feed(target_name, date) if watermarks is not None else None
+        if response.status == 304 and cache is not None:
+            if not await run_in_writer(cache.restore, target_name, sink, name):
+                raise Exception(f"Not modified but no cached data for {target_name}")
+            logger.log(f"{target_name} not modified, reused cached data in {sink.location(name)}")
+            return
+
+        if not response.ok:
+            error = policy.error_for_status(response.status, response.reason or "", response.headers.get("Retry-After"))
+            logger.log_error(f"Error response from {url}: {error}")
+            raise error
+
+        if streaming:
+            with span("stream") as streamed:
+                rows = await stream_records(
+                    response, sink, name, target_name, output_format, CSV_BATCH_SIZE, watermark, schema
+                )
+                streamed.bytes = response.content.total_bytes
+                streamed.rows = rows
+            if not rows:
+                logger.log_error(f"No data found for the given date range")
+                raise Exception(f"No data found for the given date range")
+            if cache is not None:
+                await run_in_writer(cache.store, target_name, response.headers, sink, name)
+            _commit_watermark(watermark, rows)
+            logger.log(f"Data streamed and saved to {sink.location(name)} ({rows} rows)")
+            return
+
+        with span("download") as downloaded:
+            payload = await response.read()
+            downloaded.bytes = len(payload)
+        with span("decode") as decoded:
+            # decode the bytes directly, skipping the str copy of response.json()
+            data = decode_records(payload)
+            decoded.bytes = len(payload)
+            decoded.rows = len(data)
+
+        if data is None or not data:
+            logger.log_error(f"No data found for the given date range")
+            raise Exception(f"No data found for the given date range")
+
+        # Append the data to the output file
+        await run_in_writer(write_records, sink, name, target_name, data, output_format, watermark, schema)
+
+        if cache is not None:
+            await run_in_writer(cache.store, target_name, response.headers, sink, name)
+        _commit_watermark(watermark, len(data))
+        logger.log(f"Data retrieved and saved to {sink.location(name)}")
+
+
+async def retrieve_data(
+    target_name: str,
+    url: str,
+    target_dir: Union[str, Path, Sink] = SAVE_DIR,
+    session: Optional[aiohttp.ClientSession] = None,
+    streaming: bool = False,
+    cache: Optional[ValidatorCache] = None,
+    policy: RetryPolicy = RETRY_POLICY,
+    output_format: str = OUTPUT_FORMAT,
+    watermarks: Optional[WatermarkStore] = None,
+    date: Optional[str] = None,
+    schema: Sequence[str] = ()
+):
+    """
+    Retrieve a data for a specific url, re-issuing the request according to the retry policy
+
+    :param target_name:
+    :param url:
+    :param target_dir: directory, or a DirectorySink / ZipSink, the output is written to
+    :param session: shared client session, a new one is opened for this request when not given
+    :param streaming: parse the payload incrementally and write it in batches instead of buffering it whole
+    :param cache: validator cache, when given the request is conditional and a 304 reuses the cached output
+    :param policy: retry policy deciding about backoff, retried statuses and the total deadline
+    :param output_format: format of the written file, one of writers.OUTPUT_FORMATS
+    :param watermarks: high-water marks of the feeds, when given only records not written by earlier runs are written
+    :param date: date in the name of the output file, today when not given. The DB loader expects it to match
+        the date of the archive, so callers writing into the directory or archive of a given day pass that day
+    :param schema: expected columns of the feed, columns of the response are written in this order
+    :return:
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format {output_format}, expected one of {', '.join(OUTPUT_FORMATS)}")
+    if session is None:
+        async with aiohttp.ClientSession() as own_session:
+            return await retrieve_data(
+                target_name, url, target_dir, own_session, streaming, cache, policy, output_format, watermarks, date,
+                schema
+            )
+
+    sink = target_dir if isinstance(target_dir, (DirectorySink, ZipSink)) else DirectorySink(target_dir)
     logger.log(f"Retrieving data from URL {url}")
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as response:
-            retries = 0
-            while retries < MAX_RETRIES:
-                try:
-                    if not response.ok:
-                        if response.status == 403:
-                            logger.log_error(f"Forbidden: {response.status}")
-                            raise Exception(f"Forbidden: {response.status}")
-                        elif response.status == 500:
-                            logger.log_error(f"Server error: {response.status}")
-                            raise Exception(f"Server error: {response.status}")
-                        elif response.status == 503:
-                            logger.log_error(f"Service unavailable: {response.status}")
-                            raise Exception(f"Service unavailable: {response.status}")
-
-                    data = await response.json()
-
-                    if data is None or not data:
-                        logger.log_error(f"No data found for the given date range")
-                        raise Exception(f"No data found for the given date range")
-
-                    # Preprocess the data as needed
-                    has_nested = any(isinstance(item, dict) for item in data)
-                    if has_nested:
-                        logger.log_warning(f"Data contains nested structures, flattening the data for {target_name}")
-                        # Flatten the data if it contains nested structures
-                        data = [
-                            {**item, **{k: v for k, v in item.items() if isinstance(v, dict)}}
-                            for item in data
-                        ]
-
-
-                    # Append the data to a CSV file
-                    filename = target_dir / f"{target_name}_{datetime.today().date()}.csv"
-                    with open(filename, mode='a', newline='') as file:
-                        writer = csv.writer(file)
-                        # Write the header only if the file is empty
-                        if file.tell() == 0:
-                            logger.log(f"Writing header for {target_name} to {filename}")
-                            writer.writerow(data[0].keys())
-                        for item in data:
-                            writer.writerow(item.values())
-
-                    logger.log(f"Data retrieved and saved to {filename}")
-                    return
-                except Exception as e:
-                    retries += 1
-                    logger.log_error(f"Error retrieving data from {url}: {e}. Retrying {retries}/3")
-                    logger.log(f"Sleeping for {RETRY_SLEEP_TIME} seconds before retrying")
-                    await asyncio.sleep(RETRY_SLEEP_TIME)
-            else:
-                logger.log_error(f"Failed to retrieve data from {url} after {MAX_RETRIES} retries")
-                raise Exception(f"Failed to retrieve data from {url} after {MAX_RETRIES} retries")
-
-
-def compress_data(target_name: str, target_dir: Union[str, Path] = SAVE_DIR, remove_dir: bool = True):
+    with feed_context(target_name):
+        await _with_retries(
+            lambda timeout: _fetch_once(
+                target_name, url, sink, session, streaming, cache, policy, timeout, output_format, watermarks, date,
+                schema
+            ),
+            url,
+            policy
+        )
+
+
+async def fetch_batches(
+    url: str,
+    session: aiohttp.ClientSession,
+    consume: Callable[[list], Awaitable],
+    discard: Callable[[], Awaitable],
+    policy: RetryPolicy = RETRY_POLICY,
+    limiter: Optional[RateLimiter] = None,
+    batch_size: int = CSV_BATCH_SIZE
+) -> int:
+    """
+    Fetch a JSON feed parsing the body incrementally and hand its records to consume in bounded batches,
+    so the whole payload is never held in memory. The request is re-issued according to the retry policy,
+    discard is awaited after a failed attempt and has to drop the batches consumed by it
+
+    :param url: url of the feed
+    :param session: shared client session
+    :param consume: coroutine function called with every batch of records
+    :param discard: coroutine function dropping everything consumed by the failed attempt
+    :param policy: retry policy deciding about backoff, retried statuses and the total deadline
+    :param limiter: rate limit shared with other requests, every attempt waits for it
+    :param batch_size: number of records in a batch
+    :return: number of parsed records
+    """
+    async def request(timeout: Optional[float]) -> int:
+        if limiter is not None:
+            await limiter.acquire()
+        request_timeout = aiohttp.ClientTimeout(total=timeout) if timeout is not None else None
+        async with session.get(url, timeout=request_timeout) as response:
+            if not response.ok:
+                raise policy.error_for_status(
+                    response.status, response.reason or "", response.headers.get("Retry-After")
+                )
+            rows = 0
+            batch = []
+            try:
+                with span("stream") as streamed:
+                    async for item in iter_json_array(response.content):
+                        batch.append(item)
+                        if len(batch) >= batch_size:
+                            await consume(batch)
+                            rows += len(batch)
+                            batch = []
+                    if batch:
+                        await consume(batch)
+                        rows += len(batch)
+                    streamed.bytes = response.content.total_bytes
+                    streamed.rows = rows
+            except BaseException:
+                await discard()
+                raise
+            return rows
+
+    logger.log(f"Retrieving data from URL {url}")
+    return await _with_retries(request, url, policy)
+
+
+async def _with_retries(request: Callable[[Optional[float]], Awaitable], url: str, policy: RetryPolicy):
+    """
+    Await a request until it succeeds or the retry policy gives up
+
+    :param request: coroutine function issuing the request, called with the time left until the policy deadline
+    :param url: url of the request, used for logging
+    :param policy: retry policy deciding about backoff, retried statuses and the total deadline
+    :return: result of the request
+    """
+    started_at = time.monotonic()
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            return await request(policy.remaining(started_at))
+        except FatalError as e:
+            logger.log_error(f"Failed to retrieve data from {url}: {e}. Not retrying")
+            raise
+        except Exception as e:
+            delay = policy.next_delay(attempt, started_at, getattr(e, "retry_after", None))
+            if delay is None:
+                logger.log_error(f"Failed to retrieve data from {url} after {attempt} retries: {e}")
+                raise Exception(f"Failed to retrieve data from {url} after {attempt} retries") from e
+            logger.log_error(f"Error retrieving data from {url}: {e}. Retrying {attempt}/{policy.max_attempts}")
+            logger.log(f"Sleeping for {delay:.1f} seconds before retrying")
+            await asyncio.sleep(delay)
+
+
+def compress_data(
+    target_name: str,
+    target_dir: Union[str, Path] = SAVE_DIR,
+    remove_dir: bool = True,
+    workers: int = COMPRESS_WORKERS
+):
     """
     Compress the data directory into a zip file
 
     :param target_name:
     :param target_dir:
     :param remove_dir:
+    :param workers: number of threads deflating the files, 1 compresses them one by one with make_archive
     :return:
     """
     target_dir = Path(target_dir)
     target_dir.mkdir(parents=True, exist_ok=True)
     logger.log(f"Compressing data for {target_name}")
-    make_archive(
-        base_name=str(target_dir.parent / target_name),
-        format='zip',
-        root_dir=target_dir.parent,
-        base_dir=target_dir.name
-    )
+    if workers > 1:
+        parallel_zip(target_dir, target_dir.parent / f"{target_name}.zip", workers)
+    else:
+        make_archive(
+            base_name=str(target_dir.parent / target_name),
+            format='zip',
+            root_dir=target_dir.parent,
+            base_dir=target_dir.name
+        )
 
     if remove_dir:
         logger.log(f"Removing directory {target_dir}")
         rmtree(target_dir, ignore_errors=False)
         logger.log(f"Directory {target_dir} removed")
 
-async def retrieve_all_data():
+async def retrieve_all_data(
+    scheduler: Optional[FetchScheduler] = None,
+    output_format: str = OUTPUT_FORMAT,
+    stream_archive: bool = STREAM_ARCHIVE,
+    compression: str = ARCHIVE_COMPRESSION,
+    compresslevel: Optional[int] = ARCHIVE_COMPRESSLEVEL,
+    incremental: bool = INCREMENTAL,
+    feeds: Optional[Dict[str, Feed]] = None
+):
     """
-    Retrieve all data from the URLs in NAME2URL
+    Retrieve all data from the URLs in NAME2URL, the archive is built from the feeds which succeeded.
+    How every feed is fetched, parsed and written is decided by its entry in the feed registry
+
+    :param scheduler: scheduler running the feeds, configured from the feed registry when not given
+    :param output_format: format of the files written for each feed, one of writers.OUTPUT_FORMATS
+    :param stream_archive: write feeds straight into the zip archive instead of a directory compressed afterwards
+    :param compression: compression method of the streamed archive, one of archive.COMPRESSION_METHODS
+    :param compresslevel: compression level of the streamed archive, None for the default of the method
+    :param incremental: write only records newer than the last stored time_tag of time series feeds
+    :param feeds: feeds to retrieve, the registered metadata of the feeds in NAME2URL when not given
     """
-    tasks = []
+    if feeds is None:
+        feeds = {name: feed_for(name, url) for name, url in NAME2URL.items()}
+    if scheduler is None:
+        scheduler = FetchScheduler.from_feeds(feeds, FETCH_CONCURRENCY, logger)
     target_dir = SAVE_DIR / f"{datetime.today().date()}"
-    for target_name, url in NAME2URL.items():
-        tasks.append(retrieve_data(target_name, url, target_dir))
-    await asyncio.gather(*tasks)
-    logger.log(f"All data retrieved and saved to {target_dir}")
-    compress_data(target_dir.name, target_dir)
-    logger.log(f"Data compressed to {target_dir}.zip")
-    send_to_dropbox(target_dir.parent / f"{target_dir.name}.zip", f"{DROPBOX_DIR}/{target_dir.name}.zip", logger)
+    archive_path = target_dir.parent / f"{target_dir.name}.zip"
+    if stream_archive:
+        sink = ZipSink(archive_path, target_dir.name, compression, compresslevel)
+    else:
+        sink = DirectorySink(target_dir)
+    cache = ValidatorCache()
+    watermarks = WatermarkStore() if incremental else None
+    report = RunReport(target_dir.name)
+    with report.activate(target_dir.parent / f"{target_dir.name}{REPORT_SUFFIX}"):
+        try:
+            async with create_session() as session:
+                jobs = {
+                    target_name: partial(
+                        retrieve_data,
+                        target_name,
+                        feed.url,
+                        sink,
+                        session,
+                        streaming=feed.streaming,
+                        cache=cache if feed.conditional else None,
+                        policy=feed.policy or RETRY_POLICY,
+                        output_format=feed.output_format or output_format,
+                        watermarks=watermarks if feed.incremental else None,
+                        date=target_dir.name,
+                        schema=feed.schema
+                    )
+                    for target_name, feed in feeds.items()
+                }
+                results = await scheduler.run(jobs)
+
+            failed = [name for name, result in results.items() if not result.ok]
+            if len(failed) == len(results):
+                logger.log_error("Failed to retrieve any data")
+                raise Exception("Failed to retrieve any data")
+            if failed:
+                logger.log_warning(f"Failed to retrieve {len(failed)}/{len(results)} feeds: {', '.join(failed)}")
+        except BaseException:
+            if stream_archive:
+                sink.abort()
+            elif watermarks is not None:
+                # the written files stay in the directory, the marks have to match them
+                watermarks.save()
+            raise
+
+        if stream_archive:
+            with span("compress") as compressed:
+                sink.close()
+                compressed.bytes = _file_size(archive_path)
+            logger.log(f"All data retrieved and saved to {archive_path}")
+        else:
+            logger.log(f"All data retrieved and saved to {target_dir}")
+            with span("compress") as compressed:
+                compress_data(target_dir.name, target_dir)
+                compressed.bytes = _file_size(archive_path)
+            logger.log(f"Data compressed to {archive_path}")
+        if watermarks is not None:
+            watermarks.save()
+        with span("upload") as uploaded:
+            uploaded.bytes = _file_size(archive_path)
+            send_to_dropbox(archive_path, f"{DROPBOX_DIR}/{target_dir.name}.zip", logger)
+
+
+def _file_size(path: Path) -> int:
+    return path.stat().st_size if path.exists() else 0
 
 
 if __name__ == "__main__":
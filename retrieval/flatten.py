@@ -0,0 +1,93 @@
+from itertools import chain
+from operator import itemgetter
+from typing import Iterable, Sequence
+
+# separator between the keys of a nested object and its parent in a flattened column name
+KEY_SEPARATOR = "."
+
+
+def flatten_columns(records: list) -> dict:
+    """
+    Turn a batch of records into columns, nested objects become dotted columns (e.g. "source.name").
+    Every column is built over the whole batch at once, rows missing a key get None
+
+    :param records: list of decoded JSON objects
+    :return: column name -> list of values, in the order the keys were first seen
+    """
+    keys = dict.fromkeys(chain.from_iterable(records))
+    columns = {}
+    for key in keys:
+        try:
+            values = list(map(itemgetter(key), records))
+        except KeyError:
+            values = [record.get(key) for record in records]
+        if dict not in set(map(type, values)):
+            columns[key] = values
+            continue
+        scalars = [None if isinstance(value, dict) else value for value in values]
+        if any(value is not None for value in scalars):
+            # keep values of rows where the key is not an object instead of dropping them
+            columns[key] = scalars
+        nested = [value if isinstance(value, dict) else {} for value in values]
+        for name, column in flatten_columns(nested).items():
+            columns[f"{key}{KEY_SEPARATOR}{name}"] = column
+    return columns
+
+
+class FeedSchema:
+    """
+    Column order of a feed. Columns seen for the first time are appended after the known ones,
+    so the order does not depend on which keys happen to be present in the first record.
+    The expected columns of the feed are always part of the schema and go first, in the declared order,
+    even when the data does not have them (yet), as the DB loader reads columns by position
+    """
+
+    def __init__(self, columns: Iterable[str] = (), expected: Sequence[str] = ()):
+        """
+        :param columns: known columns in their order
+        :param expected: expected columns of the feed in their order, added with the first update
+        """
+        self.columns = list(columns)
+        self.expected = tuple(expected)
+        self._known = set(self.columns)
+        self._rank = {name: i for i, name in enumerate(self.expected)}
+
+    def update(self, columns: Iterable[str]) -> list:
+        """
+        Append unknown columns to the schema, together with expected columns not in the schema yet
+
+        :param columns: column names of a batch
+        :return: the added column names
+        """
+        added = [name for name in dict.fromkeys(chain(self.expected, columns)) if name not in self._known]
+        # sorting is stable, unexpected columns keep their order after the expected ones
+        added.sort(key=lambda name: self._rank.get(name, len(self._rank)))
+        self.columns.extend(added)
+        self._known.update(added)
+        return added
+
+    def unknown(self, columns: Iterable[str]) -> list:
+        """
+        :param columns: column names of a batch
+        :return: column names missing from the schema
+        """
+        return [name for name in columns if name not in self._known]
+
+    def missing(self, columns: Iterable[str]) -> list:
+        """
+        :param columns: column names of a batch
+        :return: expected columns missing from the batch
+        """
+        present = set(columns)
+        return [name for name in self.expected if name not in present]
+
+    def align(self, columns: dict, size: int) -> list:
+        """
+        Order the columns of a batch by the schema, columns missing in the batch are filled with None
+
+        :param columns: column name -> list of values, as returned by flatten_columns
+        :param size: number of rows in the batch
+        :return: list of columns in the schema order
+        """
+        empty = [None] * size
+        return [columns.get(name, empty) for name in self.columns]
@@ -1,24 +1,41 @@
 from pathlib import Path
-from typing import Union
+from os import getenv
+from queue import SimpleQueue
+from typing import Optional, Union
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 
 LOGGING_PATH = Path(__file__).parent / "logs.log"
+# hand records to a background thread writing the log file and console, "0" writes them in the calling thread
+LOG_QUEUED = getenv("RETRIEVAL_LOG_QUEUED", "1") != "0"
 
 
 class Logger:
-    def __init__(self, logging_path: Union[str, Path] = LOGGING_PATH):
+    def __init__(self, logging_path: Union[str, Path] = LOGGING_PATH, queued: bool = LOG_QUEUED, name: str = __name__):
+        """
+        :param logging_path: path of the rotated log file
+        :param queued: log calls only enqueue records, so the event loop is not blocked by file I/O
+        :param name: name of the underlying logging.Logger, handlers are set up only by its first Logger
+        """
         self.logging_path = Path(logging_path)
+        self.queued = queued
+        self.name = name
+        self.listener: Optional[QueueListener] = None
+        self.queue_handler: Optional[QueueHandler] = None
         self.logger = self.setup_logger()
 
     def setup_logger(self):
         """
         Set up logging configuration
         """
-        logger = logging.getLogger(__name__)
+        logger = logging.getLogger(self.name)
         logger.setLevel(logging.INFO)
         if not logger.handlers:
-            file_handler = RotatingFileHandler(self.logging_path, maxBytes=5 * 1024 * 1024, backupCount=5)
+            # the file is opened by the first record, importing a module creating a Logger does not touch it
+            file_handler = RotatingFileHandler(
+                self.logging_path, maxBytes=5 * 1024 * 1024, backupCount=5, delay=True
+            )
             file_handler.setLevel(logging.INFO)
 
             console_handler = logging.StreamHandler()
@@ -28,13 +45,35 @@ class Logger:
             file_handler.setFormatter(formatter)
             console_handler.setFormatter(formatter)
 
-            logger.addHandler(file_handler)
-            logger.addHandler(console_handler)
+            if self.queued:
+                queue = SimpleQueue()
+                self.listener = QueueListener(queue, file_handler, console_handler, respect_handler_level=True)
+                self.listener.start()
+                # registered after logging itself, so records are written before its handlers get closed
+                atexit.register(self.close)
+                self.queue_handler = QueueHandler(queue)
+                logger.addHandler(self.queue_handler)
+            else:
+                logger.addHandler(file_handler)
+                logger.addHandler(console_handler)
 
         logger.propagate = False
 
         return logger
 
+    def close(self):
+        """
+        Write the queued records and stop the background thread, later records are written in the calling thread
+        """
+        if self.listener is None:
+            return
+        self.logger.removeHandler(self.queue_handler)
+        for handler in self.listener.handlers:
+            self.logger.addHandler(handler)
+        self.listener.stop()
+        self.listener = None
+        self.queue_handler = None
+
     def log(self, message: str):
         """
         Log a message
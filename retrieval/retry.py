@@ -0,0 +1,123 @@
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional, Iterable
+
+# statuses worth another attempt: rate limiting and transient server errors
+RETRYABLE_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+
+
+class RetryableError(Exception):
+    """Exception raised for a failure which may succeed when the request is re-issued"""
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class FatalError(Exception):
+    """Exception raised for a failure which will not succeed on another attempt (e.g. 403 Forbidden)"""
+    pass
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse the Retry-After header given either as a number of seconds or as an HTTP date
+
+    :param value: header value
+    :return: number of seconds to wait or None if missing or invalid
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with jitter bounded by a number of attempts and a total deadline
+    """
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        multiplier: float = 2.0,
+        jitter: float = 0.5,
+        deadline: Optional[float] = None,
+        retryable_statuses: Iterable[int] = RETRYABLE_STATUSES,
+        rng: Optional[random.Random] = None
+    ):
+        """
+        :param max_attempts: maximum number of attempts including the first one
+        :param base_delay: delay in seconds after the first failed attempt
+        :param max_delay: upper bound of a single delay in seconds
+        :param multiplier: growth factor of the delay between consecutive attempts
+        :param jitter: fraction of the delay which is randomized, 0 disables jitter
+        :param deadline: total time in seconds for all attempts and delays, None for no limit
+        :param retryable_statuses: HTTP statuses which are retried, any other error status fails fast
+        :param rng: random number generator used for jitter
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.deadline = deadline
+        self.retryable_statuses = frozenset(retryable_statuses)
+        self.rng = rng or random.Random()
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Delay after the given failed attempt (counted from 1)
+        """
+        delay = min(self.max_delay, self.base_delay * self.multiplier ** (attempt - 1))
+        return delay * (1 - self.jitter * self.rng.random())
+
+    def remaining(self, started_at: float) -> Optional[float]:
+        """
+        Time left until the deadline or None if there is no deadline
+        """
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - (time.monotonic() - started_at))
+
+    def next_delay(self, attempt: int, started_at: float, retry_after: Optional[float] = None) -> Optional[float]:
+        """
+        Decide whether another attempt is allowed and how long to wait before it
+
+        :param attempt: number of the attempt which has just failed (counted from 1)
+        :param started_at: time.monotonic() of the first attempt
+        :param retry_after: delay requested by the server, takes precedence over the backoff
+        :return: delay in seconds or None when no attempt is left
+        """
+        if attempt >= self.max_attempts:
+            return None
+        delay = retry_after if retry_after is not None else self.backoff(attempt)
+        remaining = self.remaining(started_at)
+        if remaining is not None and delay >= remaining:
+            return None
+        return delay
+
+    def error_for_status(self, status: int, reason: str = "", retry_after: Optional[str] = None) -> Exception:
+        """
+        Build the exception describing an unsuccessful HTTP response
+
+        :param status: HTTP status of the response
+        :param reason: HTTP reason phrase
+        :param retry_after: value of the Retry-After header
+        :return: RetryableError for retryable statuses, FatalError otherwise
+        """
+        message = f"HTTP {status} {reason}".strip()
+        if status in self.retryable_statuses or status >= 500:
+            return RetryableError(message, parse_retry_after(retry_after))
+        return FatalError(message)
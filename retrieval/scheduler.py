@@ -0,0 +1,170 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Optional
+from retrieval.logger import Logger
+
+DEFAULT_CONCURRENCY = 8
+# longer than the deadline of fetch_data.RETRY_POLICY (180s), so the retries of a slow feed give up and report
+# their last error before the scheduler cancels them
+DEFAULT_TIMEOUT = 210
+DEFAULT_PRIORITY = 10
+
+
+class FeedResult:
+    """
+    Outcome of a single scheduled feed
+    """
+    def __init__(self, name: str, error: Optional[BaseException] = None, latency: float = 0.0, wait: float = 0.0):
+        self.name = name
+        self.error = error
+        self.latency = latency
+        self.wait = wait
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def __repr__(self):
+        status = "ok" if self.ok else f"failed ({self.error!r})"
+        return f"FeedResult({self.name}: {status}, latency={self.latency:.2f}s, wait={self.wait:.2f}s)"
+
+
+class RateLimiter:
+    """
+    Token bucket shared by all requests of a run, allowing short bursts but no more than rate requests
+    per second on average
+    """
+    def __init__(self, rate: float, burst: int = 1):
+        """
+        :param rate: requests per second
+        :param burst: requests which may be started at once after a pause
+        """
+        if rate <= 0:
+            raise ValueError(f"Rate limit must be positive, got {rate}")
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        """
+        Wait until a request may be started
+        """
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class FetchScheduler:
+    """
+    Run feed jobs with bounded concurrency, per-feed timeouts and priority ordering,
+    collecting a result for every feed instead of failing on the first error
+    """
+    def __init__(
+        self,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        default_timeout: Optional[float] = DEFAULT_TIMEOUT,
+        timeouts: Optional[Dict[str, float]] = None,
+        priorities: Optional[Dict[str, int]] = None,
+        logger: Optional[Logger] = None
+    ):
+        """
+        :param concurrency: maximum number of feeds fetched at the same time
+        :param default_timeout: timeout in seconds of feeds missing in timeouts, None for no timeout
+        :param timeouts: per-feed timeouts in seconds
+        :param priorities: per-feed priorities, feeds with lower values start first
+        :param logger: logger used for the latency report
+        """
+        self.concurrency = concurrency
+        self.default_timeout = default_timeout
+        self.timeouts = timeouts or {}
+        self.priorities = priorities or {}
+        self.logger = logger
+
+    @classmethod
+    def from_feeds(cls, feeds: dict, concurrency: int = DEFAULT_CONCURRENCY, logger: Optional[Logger] = None):
+        """
+        Create a scheduler using timeouts and priorities declared in the feed registry
+
+        :param feeds: mapping of feed name to feeds.Feed
+        :param concurrency: maximum number of feeds fetched at the same time
+        :param logger: logger used for the latency report
+        """
+        return cls(
+            concurrency=concurrency,
+            timeouts={name: feed.timeout for name, feed in feeds.items()},
+            priorities={name: feed.priority for name, feed in feeds.items()},
+            logger=logger
+        )
+
+    def timeout_for(self, name: str) -> Optional[float]:
+        return self.timeouts.get(name, self.default_timeout)
+
+    def order(self, names) -> list:
+        """
+        Order feed names by priority, keeping the original order of feeds with equal priority
+        """
+        return sorted(names, key=lambda name: self.priorities.get(name, DEFAULT_PRIORITY))
+
+    async def _run_job(
+        self,
+        name: str,
+        job: Callable[[], Awaitable],
+        semaphore: asyncio.Semaphore,
+        queued_at: float
+    ) -> FeedResult:
+        async with semaphore:
+            started_at = time.perf_counter()
+            wait = started_at - queued_at
+            timeout = self.timeout_for(name)
+            try:
+                await asyncio.wait_for(job(), timeout)
+            except asyncio.TimeoutError:
+                error = TimeoutError(f"{name} timed out after {timeout}s")
+                return FeedResult(name, error, time.perf_counter() - started_at, wait)
+            except Exception as e:
+                return FeedResult(name, e, time.perf_counter() - started_at, wait)
+            return FeedResult(name, None, time.perf_counter() - started_at, wait)
+
+    async def run(self, jobs: Dict[str, Callable[[], Awaitable]]) -> Dict[str, FeedResult]:
+        """
+        Run all jobs and wait for every one of them to finish
+
+        :param jobs: mapping of feed name to a function creating the coroutine fetching the feed
+        :return: mapping of feed name to its result, in the order in which feeds were started
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        queued_at = time.perf_counter()
+        names = self.order(jobs)
+        # tasks are created in priority order, so they also acquire the semaphore in that order
+        results = await asyncio.gather(
+            *[self._run_job(name, jobs[name], semaphore, queued_at) for name in names],
+            return_exceptions=True
+        )
+        report = {}
+        for name, result in zip(names, results):
+            if isinstance(result, BaseException):
+                result = FeedResult(name, result)
+            report[name] = result
+        if self.logger is not None:
+            self.log_report(report)
+        return report
+
+    def log_report(self, report: Dict[str, FeedResult]):
+        """
+        Log latency of every feed, slowest first
+        """
+        for result in sorted(report.values(), key=lambda r: r.latency, reverse=True):
+            if result.ok:
+                self.logger.log(f"{result.name}: ok in {result.latency:.2f}s (waited {result.wait:.2f}s)")
+            else:
+                self.logger.log_error(
+                    f"{result.name}: failed after {result.latency:.2f}s (waited {result.wait:.2f}s): {result.error}"
+                )
@@ -1,12 +1,15 @@
-from time import sleep
+from hashlib import sha256
+from time import sleep, monotonic
 from pathlib import Path
-from typing import Union
-from os import getenv
+from io import BytesIO
+from typing import BinaryIO, Callable, Optional, Union
+from os import getenv, fstat
 from dotenv import load_dotenv
 import dropbox
-from dropbox.files import WriteMode
-from dropbox.exceptions import AuthError, ApiError
+from dropbox.files import CommitInfo, FileMetadata, UploadSessionCursor, WriteMode
+from dropbox.exceptions import AuthError, ApiError, RateLimitError, InternalServerError
 from retrieval.logger import Logger
+from retrieval.retry import RetryPolicy
 
 load_dotenv()
 
@@ -14,47 +17,255 @@ DROPBOX_APP_SECRET = getenv("DROPBOX_APP_SECRET")
 DROPBOX_APP_KEY = getenv("DROPBOX_APP_KEY")
 DROPBOX_REFRESH_TOKEN = getenv("DROPBOX_REFRESH_TOKEN")
 SEND_RETRY_SLEEP_TIME = 20
+SEND_RETRY_MAX_DELAY = 120
 MAX_RETRIES = 3
+SEND_RETRY_POLICY = RetryPolicy(
+    max_attempts=MAX_RETRIES,
+    base_delay=SEND_RETRY_SLEEP_TIME,
+    max_delay=SEND_RETRY_MAX_DELAY
+)
+# files_upload accepts at most 150 MiB per request, larger archives go through an upload session
+UPLOAD_CHUNK_SIZE = int(getenv("DROPBOX_UPLOAD_CHUNK_SIZE", 8 * 1024 * 1024))
+# block size of the Dropbox content hash, fixed by the API
+CONTENT_HASH_BLOCK_SIZE = 4 * 1024 * 1024
+
+
+class DropboxUploadError(Exception):
+    """Exception raised when a file could not be uploaded to Dropbox within the retry policy"""
+    pass
+
+
+def content_hash(f: BinaryIO) -> str:
+    """
+    Compute the Dropbox content hash of a file from its current position to the end
+
+    The hash is the SHA-256 of the concatenated SHA-256 digests of 4 MiB blocks, see
+    https://www.dropbox.com/developers/reference/content-hash
+
+    :param f: file opened in binary mode
+    :return: hex digest comparable with FileMetadata.content_hash
+    """
+    overall = sha256()
+    while block := f.read(CONTENT_HASH_BLOCK_SIZE):
+        overall.update(sha256(block).digest())
+    return overall.hexdigest()
+
+
+def remote_content_hash(dbx, dropbox_path: str, logger: Logger) -> Optional[str]:
+    """
+    Get the content hash of a file stored in Dropbox
+
+    :param dbx: Dropbox client
+    :param dropbox_path: Path of the file in Dropbox
+    :param logger: Logger instance for logging
+    :return: the content hash or None if the file does not exist or the lookup failed
+    """
+    try:
+        metadata = dbx.files_get_metadata(dropbox_path)
+    except ApiError as e:
+        if not (e.error.is_path() and e.error.get_path().is_not_found()):
+            logger.log_exception(f"Could not read metadata of {dropbox_path}: {e}")
+        return None
+    except (InternalServerError, RateLimitError, AuthError) as e:
+        logger.log_exception(f"Could not read metadata of {dropbox_path}: {e}")
+        return None
+    return metadata.content_hash if isinstance(metadata, FileMetadata) else None
+
+
+def dropbox_file_exists(dropbox_path: str, logger: Logger, policy: RetryPolicy = SEND_RETRY_POLICY) -> bool:
+    """
+    Check whether Dropbox holds a file, e.g. the archive of a day uploaded by an earlier run
+
+    :param dropbox_path: Path of the file in Dropbox
+    :param logger: Logger instance for logging
+    :param policy: retry policy deciding about backoff between attempts and the total deadline
+    :return: True if the file exists
+    :raises AuthError, ApiError, DropboxUploadError: if the lookup fails
+    """
+    dbx = _dropbox_client()
+
+    def lookup() -> bool:
+        try:
+            dbx.files_get_metadata(dropbox_path)
+        except ApiError as e:
+            if e.error.is_path() and e.error.get_path().is_not_found():
+                return False
+            raise
+        return True
+
+    return _with_retries(lookup, dropbox_path, logger, policy)
 
 
 def send_to_dropbox(
     archive_path: Union[str, Path],
     dropbox_path: str,
-    logger: Logger
+    logger: Logger,
+    policy: RetryPolicy = SEND_RETRY_POLICY,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+    skip_unchanged: bool = True
 ):
     """
     Upload a file to Dropbox
 
+    Files up to chunk_size bytes are sent in a single request, larger ones through an upload session
+    one chunk at a time, so that a failure only re-sends the chunk that was in flight. The upload is skipped
+    when Dropbox already holds a file with the same content hash, e.g. when a retried pipeline run produced
+    the same archive again.
+
     :param archive_path: Path to the file to be uploaded
     :param dropbox_path: Path in Dropbox where the file will be uploaded
     :param logger: Logger instance for logging
+    :param policy: retry policy deciding about backoff between attempts and the total deadline
+    :param chunk_size: number of bytes sent per request
+    :param skip_unchanged: compare content hashes and skip uploading a file Dropbox already holds
     """
-    dbx = dropbox.Dropbox(
-        app_secret=DROPBOX_APP_SECRET,
-        app_key=DROPBOX_APP_KEY,
-        oauth2_refresh_token=DROPBOX_REFRESH_TOKEN
-    )
-    retries = 0
+    dbx = _dropbox_client()
 
     with open(archive_path, "rb") as f:
         logger.log(f"Uploading {archive_path} to Dropbox at {dropbox_path}")
-        while retries < MAX_RETRIES:
-            try:
-                dbx.files_upload(f.read(), dropbox_path, mode=WriteMode('overwrite'))
+        content = f.read(chunk_size)
+        single_request = len(content) < chunk_size
 
-                logger.log(f"Successfully uploaded {archive_path} to Dropbox at {dropbox_path}")
+        if skip_unchanged:
+            checked_at = monotonic()
+            if not single_request:
+                f.seek(0)
+            local_hash = content_hash(BytesIO(content) if single_request else f)
+            if local_hash == remote_content_hash(dbx, dropbox_path, logger):
+                size = len(content) if single_request else fstat(f.fileno()).st_size
+                logger.log(
+                    f"Skipped upload of {archive_path}: Dropbox already holds identical {dropbox_path} "
+                    f"({size} bytes not sent, check took {monotonic() - checked_at:.2f} seconds)"
+                )
                 return
-            except ApiError as e:
-                logger.log_exception(f"API error: {e}")
-                retries += 1
-                logger.log(f"Sleeping for {SEND_RETRY_SLEEP_TIME} seconds before retrying")
-                sleep(SEND_RETRY_SLEEP_TIME)
-
-            except AuthError as e:
-                logger.log_exception(f"Authentication error: {e}")
-                retries += 1
-                logger.log(f"Sleeping for {SEND_RETRY_SLEEP_TIME} seconds before retrying")
-                sleep(SEND_RETRY_SLEEP_TIME)
+
+        if single_request:
+            _with_retries(
+                lambda: dbx.files_upload(content, dropbox_path, mode=WriteMode('overwrite')),
+                archive_path, logger, policy
+            )
         else:
-            logger.log_error(f"Failed to upload {archive_path} to Dropbox after {MAX_RETRIES} retries")
-            raise Exception(f"Failed to upload {archive_path} to Dropbox after {MAX_RETRIES} retries")
+            _upload_session(dbx, f, content, archive_path, dropbox_path, logger, policy, chunk_size)
+
+    logger.log(f"Successfully uploaded {archive_path} to Dropbox at {dropbox_path}")
+
+
+def _dropbox_client() -> dropbox.Dropbox:
+    return dropbox.Dropbox(
+        app_secret=DROPBOX_APP_SECRET,
+        app_key=DROPBOX_APP_KEY,
+        oauth2_refresh_token=DROPBOX_REFRESH_TOKEN
+    )
+
+
+def _upload_session(dbx, f, first_chunk: bytes, archive_path, dropbox_path: str, logger: Logger,
+                    policy: RetryPolicy, chunk_size: int):
+    """
+    Upload an open file through a Dropbox upload session
+
+    Every chunk is retried on its own. When Dropbox reports that it already holds a different offset than
+    expected (e.g. an append timed out after it was committed), the upload resumes from that offset.
+
+    :param dbx: Dropbox client
+    :param f: file opened in binary mode
+    :param first_chunk: the first chunk_size bytes of the file, already read
+    :param archive_path: path of the file, used for logging
+    :param dropbox_path: Path in Dropbox where the file will be uploaded
+    :param logger: Logger instance for logging
+    :param policy: retry policy applied to every request of the session
+    :param chunk_size: number of bytes sent per request
+    """
+    size = fstat(f.fileno()).st_size
+    session_id = _with_retries(
+        lambda: dbx.files_upload_session_start(first_chunk).session_id,
+        archive_path, logger, policy
+    )
+    offset = len(first_chunk)
+    logger.log(f"Started upload session for {archive_path} ({size} bytes in chunks of {chunk_size})")
+
+    def send_chunk():
+        nonlocal offset
+        f.seek(offset)
+        chunk = f.read(chunk_size)
+        cursor = UploadSessionCursor(session_id=session_id, offset=offset)
+        last = offset + len(chunk) >= size
+        try:
+            if last:
+                dbx.files_upload_session_finish(
+                    chunk, cursor, CommitInfo(path=dropbox_path, mode=WriteMode('overwrite'))
+                )
+            else:
+                dbx.files_upload_session_append_v2(chunk, cursor)
+        except ApiError as e:
+            committed = _committed_offset(e)
+            if committed is not None:
+                logger.log(f"Dropbox holds {committed} bytes of {archive_path}, resuming from there")
+                offset = committed
+            raise
+        offset += len(chunk)
+        return last
+
+    # the session is committed by the finish request, even if the start request already carried all data
+    finished = False
+    while not finished:
+        finished = _with_retries(send_chunk, archive_path, logger, policy)
+
+
+def _committed_offset(error: ApiError) -> Optional[int]:
+    """
+    Extract the offset Dropbox already holds from an incorrect offset error of an upload session
+
+    :param error: error raised by an append or finish request
+    :return: the correct offset or None if the error is about something else
+    """
+    lookup = error.error
+    if hasattr(lookup, "is_lookup_failed") and lookup.is_lookup_failed():
+        lookup = lookup.get_lookup_failed()
+    if hasattr(lookup, "is_incorrect_offset") and lookup.is_incorrect_offset():
+        return lookup.get_incorrect_offset().correct_offset
+    return None
+
+
+def _with_retries(request: Callable, archive_path, logger: Logger, policy: RetryPolicy):
+    """
+    Call a Dropbox request until it succeeds or the retry policy gives up
+
+    Only rate limiting, server errors and incorrect offsets of an upload session are retried. Authentication
+    errors and any other API error (e.g. insufficient space, a malformed path) will not succeed on another
+    attempt and are re-raised immediately.
+
+    :param request: callable issuing the request
+    :param archive_path: path of the uploaded file, used for logging
+    :param logger: Logger instance for logging
+    :param policy: retry policy deciding about backoff between attempts and the total deadline
+    :return: the result of the request
+    :raises DropboxUploadError: if the request still fails when the retry policy gives up
+    """
+    started_at = monotonic()
+    attempt = 0
+
+    while True:
+        attempt += 1
+        retry_after = None
+        try:
+            return request()
+        except RateLimitError as e:
+            logger.log_exception(f"Rate limited: {e}")
+            retry_after = e.backoff
+        except InternalServerError as e:
+            logger.log_exception(f"Server error: {e}")
+        except ApiError as e:
+            if _committed_offset(e) is None:
+                logger.log_error(f"Failed to upload {archive_path} to Dropbox, API error: {e}")
+                raise
+            logger.log_exception(f"API error: {e}")
+        except AuthError as e:
+            logger.log_error(f"Failed to upload {archive_path} to Dropbox, authentication error: {e}")
+            raise
+
+        delay = policy.next_delay(attempt, started_at, retry_after)
+        if delay is None:
+            logger.log_error(f"Failed to upload {archive_path} to Dropbox after {attempt} retries")
+            raise DropboxUploadError(f"Failed to upload {archive_path} to Dropbox after {attempt} retries")
+        logger.log(f"Sleeping for {delay:.1f} seconds before retrying")
+        sleep(delay)
@@ -0,0 +1,75 @@
+import codecs
+import json
+from typing import Any, AsyncIterator
+
+STREAM_CHUNK_SIZE = 64 * 1024
+_WHITESPACE = " \t\n\r"
+_DELIMITERS = _WHITESPACE + ",]"
+
+
+class JSONStreamError(Exception):
+    """Exception raised when a streamed payload is not a valid JSON array"""
+    pass
+
+
+async def iter_json_array(stream, chunk_size: int = STREAM_CHUNK_SIZE) -> AsyncIterator[Any]:
+    """
+    Incrementally parse a top-level JSON array and yield its items one by one,
+    so only a single chunk and the item being decoded are held in memory
+
+    :param stream: aiohttp StreamReader (or any object exposing iter_chunked)
+    :param chunk_size: number of bytes read from the stream at once
+    :return:
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    started = False
+    finished = False
+
+    async def chunks():
+        async for chunk in stream.iter_chunked(chunk_size):
+            yield text_decoder.decode(chunk)
+        yield text_decoder.decode(b"", final=True)
+
+    async for text in chunks():
+        if finished:
+            if text.strip(_WHITESPACE):
+                raise JSONStreamError("Unexpected data after the end of JSON array")
+            continue
+        buffer += text
+        pos = 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                pos += 1
+            if pos >= len(buffer):
+                break
+            if not started:
+                if buffer[pos] != "[":
+                    raise JSONStreamError("Payload is not a JSON array")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == ",":
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                finished = True
+                if buffer[pos + 1:].strip(_WHITESPACE):
+                    raise JSONStreamError("Unexpected data after the end of JSON array")
+                pos = len(buffer)
+                break
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # the item is not complete yet, wait for the next chunk
+                break
+            if end == len(buffer) or buffer[end] not in _DELIMITERS:
+                # a scalar may continue in the next chunk (e.g. a number split in half)
+                break
+            pos = end
+            yield item
+        buffer = buffer[pos:]
+
+    if not finished:
+        raise JSONStreamError("Unexpected end of JSON array")
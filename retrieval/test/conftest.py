@@ -0,0 +1,117 @@
+import time
+from functools import partial
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from retrieval import fetch_data
+from retrieval.logger import Logger
+from retrieval.validator_cache import ValidatorCache
+from retrieval.watermarks import WatermarkStore
+
+
+class FeedServerStats:
+    """
+    Statistics collected by the local feed server
+    """
+    def __init__(self):
+        self.requests = 0
+        self.not_modified = 0
+        self.peers = set()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def connections(self) -> int:
+        """
+        Number of distinct client connections seen by the server
+        """
+        return len(self.peers)
+
+    @property
+    def wall_time(self) -> float:
+        """
+        Time between the first and the last served request
+        """
+        if self.started_at is None or self.finished_at is None:
+            return 0.0
+        return self.finished_at - self.started_at
+
+    def reset(self):
+        """
+        Reset collected statistics
+        """
+        self.__init__()
+
+
+@pytest.fixture(autouse=True, scope="session")
+def isolated_log(tmp_path_factory):
+    """
+    Write the log of the retrieval modules to a temporary file instead of retrieval/logs.log. The handlers
+    (and the queue listener) set up when fetch_data was imported are replaced by ones writing to tmp_path
+    """
+    shared = fetch_data.logger
+    shared.close()
+    for handler in list(shared.logger.handlers):
+        shared.logger.removeHandler(handler)
+        handler.close()
+    logger = Logger(tmp_path_factory.mktemp("log") / "logs.log", shared.queued, shared.name)
+    yield logger.logging_path
+    logger.close()
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(tmp_path_factory, monkeypatch):
+    """
+    Keep validators, watermarks and run reports saved by retrieve_all_data out of the real cache and data directories
+    """
+    cache_dir = tmp_path_factory.mktemp("cache")
+    monkeypatch.setattr("retrieval.fetch_data.SAVE_DIR", tmp_path_factory.mktemp("data"))
+    monkeypatch.setattr("retrieval.fetch_data.ValidatorCache", partial(ValidatorCache, cache_dir))
+    monkeypatch.setattr("retrieval.fetch_data.WatermarkStore", partial(WatermarkStore, cache_dir))
+    monkeypatch.setattr("retrieval.daemon.ValidatorCache", partial(ValidatorCache, cache_dir))
+    monkeypatch.setattr("retrieval.daemon.WatermarkStore", partial(WatermarkStore, cache_dir))
+    return cache_dir
+
+
+@pytest_asyncio.fixture
+async def feed_server():
+    """
+    Local aiohttp server imitating NOAA JSON feeds, every path returns a small list of records or the one
+    set in server.payloads,
+    answers 304 to requests carrying the current ETag and fails with statuses queued in server.failures
+    """
+    stats = FeedServerStats()
+    payload = [{"time_tag": f"2023-01-01T00:00:{i:02d}", "value": i} for i in range(60)]
+    etag = '"feed-v1"'
+
+    async def handler(request: web.Request):
+        if stats.started_at is None:
+            stats.started_at = time.perf_counter()
+        stats.requests += 1
+        stats.peers.add(request.transport.get_extra_info("peername"))
+        pending = server.failures.get(request.path)
+        if pending:
+            status, headers = pending.pop(0)
+            return web.Response(status=status, headers=headers)
+        if request.headers.get("If-None-Match") == etag:
+            stats.not_modified += 1
+            response = web.Response(status=304, headers={"ETag": etag})
+        else:
+            response = web.json_response(server.payloads.get(request.path, payload), headers={"ETag": etag})
+        stats.finished_at = time.perf_counter()
+        return response
+
+    app = web.Application()
+    app.router.add_get("/{name:.*}", handler)
+    server = TestServer(app)
+    await server.start_server()
+    server.stats = stats
+    # path -> list of (status, headers) returned instead of the payload by the next requests
+    server.failures = {}
+    # path -> records served instead of the default payload
+    server.payloads = {}
+    try:
+        yield server
+    finally:
+        await server.close()
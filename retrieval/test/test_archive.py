@@ -0,0 +1,190 @@
+import zipfile
+import pytest
+from shutil import make_archive
+
+from retrieval import archive
+from retrieval.archive import DirectorySink, ZipSink, parallel_zip
+
+
+class TestDirectorySink:
+    def test_append_and_export(self, tmp_path):
+        sink = DirectorySink(tmp_path / "day")
+        for data in (b"a\n", b"b\n"):
+            with sink.open("feed.csv") as f:
+                f.write(data)
+
+        sink.export("feed.csv", tmp_path / "copy.csv")
+
+        assert (tmp_path / "copy.csv").read_bytes() == b"a\nb\n"
+
+    def test_replace_rewrites_file(self, tmp_path):
+        sink = DirectorySink(tmp_path, replace=True)
+        for data in (b"a\n", b"b\n"):
+            with sink.open("feed.csv") as f:
+                f.write(data)
+
+        assert (tmp_path / "feed.csv").read_bytes() == b"b\n"
+        assert not sink.exists("feed.csv")
+
+    def test_replace_keeps_previous_file_when_nothing_written(self, tmp_path):
+        (tmp_path / "feed.csv").write_bytes(b"a\n")
+        sink = DirectorySink(tmp_path, replace=True)
+
+        f = sink.open("feed.csv")
+        f.write(b"partial")
+        f.truncate(0)
+        f.close()
+
+        assert (tmp_path / "feed.csv").read_bytes() == b"a\n"
+        assert [p.name for p in tmp_path.iterdir()] == ["feed.csv"]
+
+    def test_whole_rewrite_keeps_previous_file_on_error(self, tmp_path):
+        (tmp_path / "feed.parquet").write_bytes(b"previous")
+        sink = DirectorySink(tmp_path)
+
+        with pytest.raises(OSError):
+            with sink.open("feed.parquet", "wb") as f:
+                f.write(b"partial")
+                raise OSError("disk full")
+
+        assert (tmp_path / "feed.parquet").read_bytes() == b"previous"
+        assert [p.name for p in tmp_path.iterdir()] == ["feed.parquet"]
+
+        with sink.open("feed.parquet", "wb") as f:
+            f.write(b"new")
+        assert (tmp_path / "feed.parquet").read_bytes() == b"new"
+
+
+class TestZipSink:
+    def test_members_written_on_close(self, tmp_path):
+        sink = ZipSink(tmp_path / "2024-01-01.zip", "2024-01-01")
+        first = sink.open("a.csv")
+        second = sink.open("b.csv")
+        first.write(b"x" * 10)
+        second.write(b"y" * 10)
+        second.close()
+        first.close()
+        sink.close()
+
+        with zipfile.ZipFile(tmp_path / "2024-01-01.zip") as zf:
+            assert zf.namelist() == ["2024-01-01/b.csv", "2024-01-01/a.csv"]
+            assert zf.read("2024-01-01/a.csv") == b"x" * 10
+        assert not (tmp_path / "2024-01-01.zip.tmp").exists()
+
+    def test_large_member_spills_to_disk(self, tmp_path):
+        sink = ZipSink(tmp_path / "day.zip", "day", spool_max_size=16)
+        with sink.open("a.csv") as member:
+            member.write(b"z" * 1000)
+        sink.close()
+
+        with zipfile.ZipFile(tmp_path / "day.zip") as zf:
+            assert zf.read("day/a.csv") == b"z" * 1000
+
+    def test_truncated_member_is_dropped(self, tmp_path):
+        sink = ZipSink(tmp_path / "day.zip", "day")
+        member = sink.open("a.csv")
+        member.write(b"partial")
+        member.truncate(0)
+        member.close()
+        sink.close()
+
+        with zipfile.ZipFile(tmp_path / "day.zip") as zf:
+            assert zf.namelist() == []
+
+    def test_add_file_and_export(self, tmp_path):
+        (tmp_path / "cached.csv").write_bytes(b"cached")
+        sink = ZipSink(tmp_path / "day.zip", "day", compression="lzma")
+
+        sink.add_file("a.csv", tmp_path / "cached.csv")
+        sink.export("a.csv", tmp_path / "exported.csv")
+        sink.close()
+
+        assert (tmp_path / "exported.csv").read_bytes() == b"cached"
+        with zipfile.ZipFile(tmp_path / "day.zip") as zf:
+            assert zf.getinfo("day/a.csv").compress_type == zipfile.ZIP_LZMA
+
+    def test_abort_removes_archive(self, tmp_path):
+        sink = ZipSink(tmp_path / "day.zip", "day")
+        with sink.open("a.csv") as member:
+            member.write(b"data")
+
+        sink.abort()
+
+        assert list(tmp_path.iterdir()) == []
+
+    def test_unknown_compression(self, tmp_path):
+        with pytest.raises(ValueError, match="Unknown compression"):
+            ZipSink(tmp_path / "day.zip", "day", compression="zstd")
+
+
+class TestParallelZip:
+    @pytest.fixture
+    def data_dir(self, tmp_path):
+        directory = tmp_path / "data" / "2024-05-10"
+        directory.mkdir(parents=True)
+        (directory / "feed_a_2024-05-10.csv").write_bytes(b"time_tag,bt\n" + b"2024-05-10T00:00:00,5.37\n" * 5000)
+        (directory / "feed_b_2024-05-10.csv").write_bytes(bytes(range(256)) * 100)
+        (directory / "empty_2024-05-10.csv").write_bytes(b"")
+        return directory
+
+    def test_same_members_as_make_archive(self, data_dir):
+        make_archive(str(data_dir.parent / "reference"), "zip", root_dir=data_dir.parent, base_dir=data_dir.name)
+
+        parallel_zip(data_dir, data_dir.parent / "parallel.zip", workers=3, chunk_size=4096)
+
+        with zipfile.ZipFile(data_dir.parent / "reference.zip") as reference, \
+                zipfile.ZipFile(data_dir.parent / "parallel.zip") as parallel:
+            assert parallel.testzip() is None
+            assert sorted(parallel.namelist()) == sorted(reference.namelist())
+            for info in parallel.infolist():
+                assert parallel.read(info) == reference.read(info.filename)
+                assert info.CRC == reference.getinfo(info.filename).CRC
+            assert {info.compress_type for info in parallel.infolist() if not info.is_dir()} == {zipfile.ZIP_DEFLATED}
+        assert not (data_dir.parent / "parallel.zip.tmp").exists()
+
+    def test_file_smaller_than_chunk(self, data_dir):
+        parallel_zip(data_dir, data_dir.parent / "day.zip", workers=2)
+
+        with zipfile.ZipFile(data_dir.parent / "day.zip") as zf:
+            assert zf.read("2024-05-10/feed_b_2024-05-10.csv") == bytes(range(256)) * 100
+
+    def test_failure_removes_archive(self, data_dir, monkeypatch):
+        def fail(*args):
+            raise OSError("disk full")
+        monkeypatch.setattr("retrieval.archive._deflate", fail)
+
+        with pytest.raises(OSError, match="disk full"):
+            parallel_zip(data_dir, data_dir.parent / "day.zip", workers=2)
+
+        assert sorted(p.name for p in data_dir.parent.iterdir()) == ["2024-05-10"]
+
+    def test_zip64_members(self, data_dir, monkeypatch):
+        # members above the limit get zip64 headers, the limit is lowered to exercise them with small files
+        monkeypatch.setattr(zipfile, "ZIP64_LIMIT", 1024)
+
+        parallel_zip(data_dir, data_dir.parent / "day.zip", workers=2, chunk_size=4096)
+
+        with zipfile.ZipFile(data_dir.parent / "day.zip") as zf:
+            assert zf.testzip() is None
+            assert zf.read("2024-05-10/feed_b_2024-05-10.csv") == bytes(range(256)) * 100
+
+    def test_unsupported_python_uses_public_api(self, data_dir, monkeypatch):
+        monkeypatch.setattr("retrieval.archive.RAW_MEMBER_VERSIONS", set())
+        monkeypatch.setattr("retrieval.archive._write_deflated", None)
+
+        parallel_zip(data_dir, data_dir.parent / "day.zip", workers=2)
+
+        with zipfile.ZipFile(data_dir.parent / "day.zip") as zf:
+            assert zf.testzip() is None
+            assert zf.read("2024-05-10/feed_b_2024-05-10.csv") == bytes(range(256)) * 100
+            assert {info.compress_type for info in zf.infolist() if not info.is_dir()} == {zipfile.ZIP_DEFLATED}
+
+    def test_corrupt_archive_not_moved_into_place(self, data_dir, monkeypatch):
+        deflate = archive._deflate
+        # data not matching the CRC of the member, as a changed zipfile layout could produce
+        monkeypatch.setattr("retrieval.archive._deflate", lambda data, level, last: deflate(data[::-1], level, last))
+
+        with pytest.raises(zipfile.BadZipFile, match="does not match its CRC"):
+            parallel_zip(data_dir, data_dir.parent / "day.zip", workers=2)
+
+        assert sorted(p.name for p in data_dir.parent.iterdir()) == ["2024-05-10"]
@@ -0,0 +1,112 @@
+import zipfile
+from datetime import date
+import pytest
+from unittest.mock import patch
+
+from retrieval.backfill import backfill, date_range, split_by_day
+from retrieval.feeds import Feed
+from retrieval.retry import RetryPolicy
+
+
+def records(day, hours):
+    return [{"time_tag": f"{day}T{hour:02d}:00:00Z", "flux": hour} for hour in hours]
+
+
+class TestSplitByDay:
+    def test_date_range(self):
+        assert date_range(date(2023, 1, 30), date(2023, 2, 1)) == [date(2023, 1, 30), date(2023, 1, 31), date(2023, 2, 1)]
+        with pytest.raises(ValueError, match="before start date"):
+            date_range(date(2023, 2, 1), date(2023, 1, 30))
+
+    def test_records_outside_days_dropped(self):
+        data = records("2023-01-01", [22, 23]) + records("2023-01-02", [0]) + [{"flux": 1}]
+
+        assert split_by_day(data, ["2023-01-02", "2023-01-03"]) == {"2023-01-02": records("2023-01-02", [0])}
+
+
+class TestBackfill:
+    @pytest.fixture
+    def feeds(self, feed_server):
+        feed_server.payloads["/xrays-7-day.json"] = records("2023-01-01", [12, 23]) + records("2023-01-02", [0, 1])
+        feed_server.payloads["/protons-7-day.json"] = records("2023-01-02", [5])
+        return {
+            "xray": Feed("xray", "unused", archive_url=str(feed_server.make_url("/xrays-7-day.json"))),
+            "protons": Feed("protons", "unused", archive_url=str(feed_server.make_url("/protons-7-day.json"))),
+            "dscovr": Feed("dscovr", "unused"),
+        }
+
+    @pytest.mark.asyncio
+    async def test_days_written_in_daily_layout(self, feeds, tmp_path):
+        with patch("retrieval.backfill.send_to_dropbox") as mock_send_to_dropbox, \
+                patch("retrieval.backfill.dropbox_file_exists", return_value=False):
+            archives = await backfill(date(2023, 1, 1), date(2023, 1, 3), feeds, save_dir=tmp_path, rate=100)
+
+        assert list(archives) == ["2023-01-01", "2023-01-02"]
+        with zipfile.ZipFile(archives["2023-01-02"]) as zf:
+            assert sorted(zf.namelist()) == ["2023-01-02/protons_2023-01-02.csv", "2023-01-02/xray_2023-01-02.csv"]
+            assert zf.read("2023-01-02/xray_2023-01-02.csv").decode().splitlines() == [
+                "time_tag,flux", "2023-01-02T00:00:00Z,0", "2023-01-02T01:00:00Z,1"
+            ]
+        with zipfile.ZipFile(archives["2023-01-01"]) as zf:
+            assert zf.namelist() == ["2023-01-01/xray_2023-01-01.csv"]
+        # the day not covered by the archival feeds is left out
+        assert not (tmp_path / "2023-01-03.zip").exists()
+        uploaded = sorted(call.args[1] for call in mock_send_to_dropbox.call_args_list)
+        assert uploaded == ["/inzynierka/2023-01-01.zip", "/inzynierka/2023-01-02.zip"]
+
+    @pytest.mark.asyncio
+    async def test_existing_archives_skipped(self, feeds, feed_server, tmp_path):
+        (tmp_path / "2023-01-01.zip").write_bytes(b"from the daily run")
+
+        archives = await backfill(date(2023, 1, 1), date(2023, 1, 2), feeds, save_dir=tmp_path, rate=100, upload=False)
+
+        assert list(archives) == ["2023-01-02"]
+        assert (tmp_path / "2023-01-01.zip").read_bytes() == b"from the daily run"
+
+    @pytest.mark.asyncio
+    async def test_archives_in_dropbox_skipped(self, feeds, tmp_path):
+        with patch("retrieval.backfill.send_to_dropbox") as mock_send_to_dropbox, \
+                patch("retrieval.backfill.dropbox_file_exists", side_effect=lambda path, logger: "01-01" in path):
+            archives = await backfill(date(2023, 1, 1), date(2023, 1, 2), feeds, save_dir=tmp_path, rate=100)
+
+        assert list(archives) == ["2023-01-02"]
+        assert not (tmp_path / "2023-01-01.zip").exists()
+        assert [call.args[1] for call in mock_send_to_dropbox.call_args_list] == ["/inzynierka/2023-01-02.zip"]
+
+    @pytest.mark.asyncio
+    async def test_overwrite_does_not_check_dropbox(self, feeds, tmp_path):
+        with patch("retrieval.backfill.send_to_dropbox") as mock_send_to_dropbox, \
+                patch("retrieval.backfill.dropbox_file_exists") as mock_exists:
+            archives = await backfill(
+                date(2023, 1, 1), date(2023, 1, 2), feeds, save_dir=tmp_path, rate=100, overwrite=True
+            )
+
+        assert list(archives) == ["2023-01-01", "2023-01-02"]
+        mock_exists.assert_not_called()
+        assert mock_send_to_dropbox.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_failed_request_retried(self, feeds, feed_server, tmp_path):
+        feed_server.failures["/xrays-7-day.json"] = [(503, {})]
+        feeds["xray"].policy = RetryPolicy(max_attempts=2, base_delay=0.01)
+
+        archives = await backfill(date(2023, 1, 1), date(2023, 1, 2), feeds, save_dir=tmp_path, rate=100, upload=False)
+
+        with zipfile.ZipFile(archives["2023-01-01"]) as zf:
+            assert zf.read("2023-01-01/xray_2023-01-01.csv").decode().splitlines() == [
+                "time_tag,flux", "2023-01-01T12:00:00Z,12", "2023-01-01T23:00:00Z,23"
+            ]
+
+    @pytest.mark.asyncio
+    async def test_failed_feed_left_out(self, feeds, feed_server, tmp_path):
+        feed_server.failures["/protons-7-day.json"] = [(404, {})]
+
+        archives = await backfill(date(2023, 1, 2), date(2023, 1, 2), feeds, save_dir=tmp_path, rate=100, upload=False)
+
+        with zipfile.ZipFile(archives["2023-01-02"]) as zf:
+            assert zf.namelist() == ["2023-01-02/xray_2023-01-02.csv"]
+
+    @pytest.mark.asyncio
+    async def test_no_archival_feeds(self, tmp_path):
+        with pytest.raises(ValueError, match="archival endpoint"):
+            await backfill(date(2023, 1, 1), date(2023, 1, 1), {"dscovr": Feed("dscovr", "url")}, save_dir=tmp_path)
@@ -0,0 +1,128 @@
+import asyncio
+import zipfile
+from datetime import datetime
+import pytest
+from unittest.mock import patch
+
+from retrieval.daemon import PollingDaemon
+from retrieval.feeds import Feed, SNAPSHOT
+from retrieval.fetch_data import create_session
+
+
+def records(start, end):
+    return [{"time_tag": f"2023-01-01T00:00:{i:02d}", "value": i} for i in range(start, end)]
+
+
+class Clock:
+    def __init__(self, now: str):
+        self.now = datetime.fromisoformat(now)
+
+    def __call__(self):
+        return self.now
+
+
+class TestPollingDaemon:
+    @pytest.mark.asyncio
+    async def test_polls_append_only_new_records(self, feed_server, tmp_path):
+        url = str(feed_server.make_url("/feed.json"))
+        daemon = PollingDaemon({"feed": url}, save_dir=tmp_path, clock=Clock("2023-01-01T12:00:00"))
+
+        async with create_session() as session:
+            feed_server.payloads["/feed.json"] = records(0, 30)
+            assert await daemon.poll(session, "feed", url, "2023-01-01")
+            feed_server.payloads["/feed.json"] = records(10, 60)
+            assert await daemon.poll(session, "feed", url, "2023-01-01")
+
+        lines = (tmp_path / "2023-01-01" / "feed_2023-01-01.csv").read_text().splitlines()
+        assert lines[1:] == [f"2023-01-01T00:00:{i:02d},{i}" for i in range(60)]
+
+    @pytest.mark.asyncio
+    async def test_snapshot_polled_twice_is_not_duplicated(self, feed_server, tmp_path):
+        url = str(feed_server.make_url("/solar_regions.json"))
+        daemon = PollingDaemon({"solar_regions": url}, save_dir=tmp_path)
+        daemon.feeds["solar_regions"] = Feed("solar_regions", url, kind=SNAPSHOT)
+        feed_server.payloads["/solar_regions.json"] = [{"region": 1}, {"region": 2}]
+
+        async with create_session() as session:
+            assert await daemon.poll(session, "solar_regions", url, "2023-01-01")
+            assert await daemon.poll(session, "solar_regions", url, "2023-01-01")
+
+        lines = (tmp_path / "2023-01-01" / "solar_regions_2023-01-01.csv").read_text().splitlines()
+        assert lines == ["region", "1", "2"]
+
+    @pytest.mark.asyncio
+    async def test_parquet_polls_are_merged(self, feed_server, tmp_path):
+        pq = pytest.importorskip("pyarrow.parquet")
+        url = str(feed_server.make_url("/feed.json"))
+        daemon = PollingDaemon({"feed": url}, save_dir=tmp_path, output_format="parquet")
+
+        async with create_session() as session:
+            feed_server.payloads["/feed.json"] = records(0, 30)
+            assert await daemon.poll(session, "feed", url, "2023-01-01")
+            feed_server.payloads["/feed.json"] = records(40, 60)
+            assert await daemon.poll(session, "feed", url, "2023-01-01")
+
+        table = pq.read_table(tmp_path / "2023-01-01" / "feed_2023-01-01.parquet")
+        assert table.column("value").to_pylist() == list(range(30)) + list(range(40, 60))
+
+    @pytest.mark.asyncio
+    async def test_failed_poll_does_not_stop_daemon(self, feed_server, tmp_path):
+        url = str(feed_server.make_url("/feed.json"))
+        feed_server.failures["/feed.json"] = [(404, {})]
+        daemon = PollingDaemon({"feed": url}, save_dir=tmp_path)
+
+        async with create_session() as session:
+            assert not await daemon.poll(session, "feed", url, "2023-01-01")
+
+    @pytest.mark.asyncio
+    async def test_feeds_polled_at_their_interval(self, feed_server, tmp_path):
+        name2url = {"fast": str(feed_server.make_url("/fast.json")), "slow": str(feed_server.make_url("/slow.json"))}
+        daemon = PollingDaemon(name2url, intervals={"fast": 0.05}, default_interval=60, save_dir=tmp_path)
+
+        with patch("retrieval.daemon.send_to_dropbox"):
+            run = asyncio.ensure_future(daemon.run())
+            await asyncio.sleep(0.3)
+            run.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await run
+
+        assert feed_server.stats.requests >= 4
+        assert feed_server.stats.requests <= 9
+
+    @pytest.mark.asyncio
+    @patch("retrieval.daemon.send_to_dropbox")
+    async def test_roll_over_waits_for_polls_and_uploads(self, mock_send_to_dropbox, feed_server, tmp_path):
+        url = str(feed_server.make_url("/feed.json"))
+        daemon = PollingDaemon({"feed": url}, save_dir=tmp_path)
+
+        async with create_session() as session:
+            poll = asyncio.ensure_future(daemon.poll(session, "feed", url, "2023-01-01"))
+            daemon.in_flight["2023-01-01"].add(poll)
+            await daemon.roll_over("2023-01-01")
+
+        assert poll.done()
+        assert not (tmp_path / "2023-01-01").exists()
+        with zipfile.ZipFile(tmp_path / "2023-01-01.zip") as zf:
+            assert [name for name in zf.namelist() if name.endswith(".csv")]
+        mock_send_to_dropbox.assert_called_once()
+        assert mock_send_to_dropbox.call_args[0][1] == "/inzynierka/2023-01-01.zip"
+
+    @pytest.mark.asyncio
+    @patch("retrieval.daemon.send_to_dropbox")
+    async def test_empty_day_is_not_uploaded(self, mock_send_to_dropbox, tmp_path):
+        await PollingDaemon({}, save_dir=tmp_path).roll_over("2023-01-01")
+
+        mock_send_to_dropbox.assert_not_called()
+
+    @pytest.mark.asyncio
+    @patch("retrieval.daemon.send_to_dropbox")
+    async def test_previous_days_rolled_over_on_start(self, mock_send_to_dropbox, tmp_path):
+        for day in ("2023-01-01", "2023-01-02", "not-a-day"):
+            (tmp_path / day).mkdir()
+            (tmp_path / day / "feed.csv").write_text("a\n1\n")
+        daemon = PollingDaemon({}, save_dir=tmp_path, clock=Clock("2023-01-02T08:00:00"))
+
+        await daemon.roll_over_previous_days()
+
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["2023-01-01.zip", "2023-01-02", "not-a-day"]
+        mock_send_to_dropbox.assert_called_once()
@@ -0,0 +1,39 @@
+import pytest
+
+from retrieval.decoding import DECODERS, DecodeError, available_decoders, get_decoder
+
+PAYLOAD = b'[{"time_tag": "2024-05-10T00:00:00Z", "flux": 1.5e-08, "source": {"satellite": 18}}]'
+
+
+class TestGetDecoder:
+    @pytest.mark.parametrize("name", available_decoders())
+    def test_decodes_records(self, name):
+        decode = get_decoder(name)
+
+        assert decode(PAYLOAD) == [{"time_tag": "2024-05-10T00:00:00Z", "flux": 1.5e-08, "source": {"satellite": 18}}]
+        assert decode(b"[]") == []
+
+    @pytest.mark.parametrize("name", available_decoders())
+    def test_invalid_payload(self, name):
+        decode = get_decoder(name)
+
+        with pytest.raises(DecodeError, match="Invalid JSON"):
+            decode(b'[{"time_tag": ')
+
+    def test_not_an_array(self):
+        with pytest.raises(DecodeError, match="not a JSON array"):
+            get_decoder("json")(b'{"error": "maintenance"}')
+
+    def test_auto_picks_fastest_installed(self):
+        assert get_decoder("auto").decoder == available_decoders()[0]
+        assert available_decoders()[-1] == "json"
+
+    def test_unknown_decoder(self):
+        with pytest.raises(ValueError, match="Unknown JSON decoder"):
+            get_decoder("simplejson")
+
+    def test_missing_decoder(self, monkeypatch):
+        monkeypatch.setitem(DECODERS, "msgspec", None)
+
+        with pytest.raises(RuntimeError, match="msgspec is not installed"):
+            get_decoder("msgspec")
@@ -0,0 +1,60 @@
+import pytest
+
+from retrieval import url_mapping, fetch_data
+from retrieval.feeds import (
+    Feed, FEEDS, register_feed, feed_for, LARGE, SNAPSHOT, STREAMING, BUFFERED, DEFAULT_CADENCE
+)
+
+
+class TestFeed:
+    def test_defaults(self):
+        feed = Feed("feed", "url")
+
+        assert feed.parser == BUFFERED
+        assert not feed.streaming
+        assert feed.incremental
+        assert feed.cadence == DEFAULT_CADENCE
+
+    def test_large_feeds_are_streamed(self):
+        assert Feed("feed", "url", size=LARGE).streaming
+        assert not Feed("feed", "url", size=LARGE, parser=BUFFERED).streaming
+
+    def test_snapshots_and_conditional_feeds_are_written_whole(self):
+        assert not Feed("feed", "url", kind=SNAPSHOT).incremental
+        assert not Feed("feed", "url", conditional=True).incremental
+
+    def test_unknown_parser(self):
+        with pytest.raises(ValueError, match="Unknown parser"):
+            Feed("feed", "url", parser="xml")
+
+
+class TestRegistry:
+    def test_url_mapping_views(self):
+        assert url_mapping.NAME2URL == {name: feed.url for name, feed in FEEDS.items()}
+        assert len(url_mapping.NAME2URL) == 20
+        assert "dscovr_mag_1s" in url_mapping.STREAMING_FEEDS
+        assert "f10-7cm-flux" in url_mapping.CONDITIONAL_FEEDS
+        assert url_mapping.FEED_PRIORITIES["dscovr_mag_1s"] == 0
+        assert url_mapping.FEED_TIMEOUTS["magnetometers-1-day"] == 240
+
+    def test_timeouts_outlast_retry_deadlines(self):
+        # the scheduler would otherwise cancel the retries of a slow feed before the policy gives up
+        for name, feed in FEEDS.items():
+            policy = feed.policy or fetch_data.RETRY_POLICY
+            assert feed.timeout is None or feed.timeout > policy.deadline, name
+
+    def test_feed_for(self):
+        dscovr = FEEDS["dscovr_mag_1s"]
+
+        assert feed_for("dscovr_mag_1s", dscovr.url) is dscovr
+        # a registered name pointing elsewhere does not inherit the metadata
+        assert not feed_for("dscovr_mag_1s", "http://localhost/feed.json").streaming
+        assert feed_for("unknown", "url").name == "unknown"
+
+    def test_register_feed(self, monkeypatch):
+        monkeypatch.setattr("retrieval.feeds.FEEDS", dict(FEEDS))
+        feed = Feed("custom", "url", parser=STREAMING)
+
+        register_feed(feed)
+
+        assert feed_for("custom", "url") is feed
@@ -1,8 +1,23 @@
+import asyncio
+import json
+import threading
+import zipfile
+import time
 import pytest
 from unittest.mock import patch, MagicMock, mock_open, AsyncMock
 from pathlib import Path
+from datetime import datetime
 
-from retrieval.fetch_data import retrieve_data, compress_data, retrieve_all_data
+from retrieval.fetch_data import (
+    retrieve_data, compress_data, retrieve_all_data, create_session, fetch_batches, CONNECTOR_LIMIT_PER_HOST,
+    REPORT_SUFFIX
+)
+from retrieval.retry import RetryPolicy, FatalError
+from retrieval.writers import CsvAppender
+from retrieval.archive import COMPRESSION_METHODS, ZipSink
+from retrieval.watermarks import WatermarkStore
+from retrieval.feeds import Feed, LARGE, SMALL
+from retrieval.scheduler import FetchScheduler
 
 
 class TestFetchData:
@@ -11,7 +26,7 @@ class TestFetchData:
     async def test_retrieve_data_success(self, mock_session):
         mock_response = AsyncMock()
         mock_response.ok = True
-        mock_response.json = AsyncMock(return_value=[{"key1": "value1", "key2": "value2"}])
+        mock_response.read = AsyncMock(return_value=b'[{"key1": "value1", "key2": "value2"}]')
 
         mock_context = AsyncMock()
         mock_context.__aenter__.return_value = mock_response
@@ -30,7 +45,7 @@ class TestFetchData:
             await retrieve_data("test", "http://example.com", target_dir)
 
         m.assert_called_once()
-        mock_response.json.assert_called_once()
+        mock_response.read.assert_called_once()
 
     @pytest.mark.asyncio
     @patch("retrieval.fetch_data.aiohttp.ClientSession")
@@ -38,6 +53,8 @@ class TestFetchData:
         mock_response = AsyncMock()
         mock_response.ok = False
         mock_response.status = 403
+        mock_response.reason = "Forbidden"
+        mock_response.headers = {}
 
         mock_context = AsyncMock()
         mock_context.__aenter__.return_value = mock_response
@@ -50,16 +67,19 @@ class TestFetchData:
         mock_session.return_value = mock_cm
 
         with patch("retrieval.fetch_data.Path.mkdir"), \
-                patch("retrieval.fetch_data.asyncio.sleep", return_value=None), \
-                pytest.raises(Exception, match="Failed to retrieve data from http://example.com after 3 retries"):
+                patch("retrieval.fetch_data.asyncio.sleep", return_value=None) as mock_sleep, \
+                pytest.raises(FatalError, match="HTTP 403 Forbidden"):
             await retrieve_data("test", "http://example.com")
 
+        session_instance.get.assert_called_once()
+        mock_sleep.assert_not_called()
+
     @pytest.mark.asyncio
     @patch("retrieval.fetch_data.aiohttp.ClientSession")
     async def test_retrieve_data_empty_response(self, mock_session):
         mock_response = AsyncMock()
         mock_response.ok = True
-        mock_response.json = AsyncMock(return_value=[])
+        mock_response.read = AsyncMock(return_value=b"[]")
 
         mock_context = AsyncMock()
         mock_context.__aenter__.return_value = mock_response
@@ -81,9 +101,7 @@ class TestFetchData:
     async def test_retrieve_data_nested_data(self, mock_session):
         mock_response = AsyncMock()
         mock_response.ok = True
-        mock_response.json = AsyncMock(return_value=[
-            {"key1": "value1", "nested": {"key2": "value2"}}
-        ])
+        mock_response.read = AsyncMock(return_value=b'[{"key1": "value1", "nested": {"key2": "value2"}}]')
 
         mock_context = AsyncMock()
         mock_context.__aenter__.return_value = mock_response
@@ -102,7 +120,7 @@ class TestFetchData:
             await retrieve_data("test", "http://example.com", target_dir)
 
         m.assert_called_once()
-        mock_response.json.assert_called_once()
+        mock_response.read.assert_called_once()
 
     @patch("retrieval.fetch_data.make_archive")
     @patch("retrieval.fetch_data.rmtree")
@@ -114,32 +132,430 @@ class TestFetchData:
         mock_make_archive.assert_called_once()
         mock_rmtree.assert_called_once()
 
+    def test_compress_data_parallel(self, tmp_path):
+        target_dir = tmp_path / "2024-05-10"
+        target_dir.mkdir()
+        (target_dir / "feed_2024-05-10.csv").write_text("time_tag,bt\n2024-05-10T00:00:00,5.37\n")
+
+        with patch("retrieval.fetch_data.make_archive") as mock_make_archive:
+            compress_data("2024-05-10", target_dir, workers=2)
+
+        mock_make_archive.assert_not_called()
+        assert not target_dir.exists()
+        with zipfile.ZipFile(tmp_path / "2024-05-10.zip") as zf:
+            assert zf.read("2024-05-10/feed_2024-05-10.csv") == b"time_tag,bt\n2024-05-10T00:00:00,5.37\n"
+
     @patch("retrieval.fetch_data.compress_data")
     @patch("retrieval.fetch_data.send_to_dropbox")
     @patch("retrieval.fetch_data.retrieve_data")
     @patch("retrieval.fetch_data.NAME2URL", {"test1": "url1", "test2": "url2"})
     @pytest.mark.asyncio
-    async def test_retrieve_all_data(self, mock_retrieve_data, mock_send_to_dropbox, mock_compress_data):
+    async def test_retrieve_all_data(self, mock_retrieve_data, mock_send_to_dropbox, mock_compress_data, tmp_path):
         mock_retrieve_data.return_value = None
 
-        with patch("retrieval.fetch_data.datetime") as mock_datetime:
+        with patch("retrieval.fetch_data.datetime") as mock_datetime, \
+                patch("retrieval.fetch_data.SAVE_DIR", tmp_path):
             mock_datetime.today.return_value.date.return_value = "2023-01-01"
-            await retrieve_all_data()
+            await retrieve_all_data(stream_archive=False)
 
         assert mock_retrieve_data.call_count == 2
         mock_compress_data.assert_called_once()
         mock_send_to_dropbox.assert_called_once()
 
+    @patch("retrieval.fetch_data.compress_data")
+    @patch("retrieval.fetch_data.send_to_dropbox")
+    @patch("retrieval.fetch_data.NAME2URL", {"test1": "url1"})
     @pytest.mark.asyncio
-    @patch("retrieval.fetch_data.asyncio.gather")
+    async def test_retrieve_all_data_exception(self, mock_send_to_dropbox, mock_compress_data, tmp_path):
+        scheduler = MagicMock(spec=FetchScheduler)
+        scheduler.run = AsyncMock(side_effect=Exception("Test error"))
+
+        with patch("retrieval.fetch_data.SAVE_DIR", tmp_path), pytest.raises(Exception, match="Test error"):
+            await retrieve_all_data(scheduler=scheduler)
+
+        scheduler.run.assert_awaited_once()
+        mock_compress_data.assert_not_called()
+        mock_send_to_dropbox.assert_not_called()
+        # the streamed archive of the failed run is removed
+        assert not list(tmp_path.glob("*.zip"))
+
+
+class TestConnectionPooling:
+    @pytest.mark.asyncio
+    async def test_create_session_connector_settings(self):
+        session = create_session(limit=10, limit_per_host=4, dns_cache_ttl=60, keepalive_timeout=15)
+        try:
+            assert session.connector.limit == 10
+            assert session.connector.limit_per_host == 4
+            assert session.connector.use_dns_cache
+        finally:
+            await session.close()
+
+    @pytest.mark.asyncio
+    async def test_pooled_session_reuses_connections(self, feed_server, tmp_path):
+        names = {f"feed_{i}": str(feed_server.make_url(f"/feed_{i}.json")) for i in range(20)}
+
+        # before: every feed opens its own session
+        start = time.perf_counter()
+        await asyncio.gather(*[
+            retrieve_data(name, url, tmp_path / "unpooled") for name, url in names.items()
+        ])
+        unpooled_time = time.perf_counter() - start
+        unpooled_connections = feed_server.stats.connections
+        feed_server.stats.reset()
+
+        # after: retrieve_all_data shares a single pooled session
+        start = time.perf_counter()
+        with patch("retrieval.fetch_data.NAME2URL", names), \
+                patch("retrieval.fetch_data.SAVE_DIR", tmp_path / "pooled"), \
+                patch("retrieval.fetch_data.compress_data"), \
+                patch("retrieval.fetch_data.send_to_dropbox"):
+            await retrieve_all_data()
+        pooled_time = time.perf_counter() - start
+        pooled_connections = feed_server.stats.connections
+
+        assert feed_server.stats.requests == len(names)
+        assert unpooled_connections == len(names)
+        assert pooled_connections <= CONNECTOR_LIMIT_PER_HOST, (
+            f"unpooled: {unpooled_time:.3f}s / {unpooled_connections} connections, "
+            f"pooled: {pooled_time:.3f}s / {pooled_connections} connections"
+        )
+        with zipfile.ZipFile(next((tmp_path / "pooled").glob("*.zip"))) as zf:
+            assert len(zf.namelist()) == len(names)
+
+
+class TestStreaming:
+    @pytest.mark.asyncio
+    async def test_streaming_matches_buffered_output(self, feed_server, tmp_path):
+        url = str(feed_server.make_url("/dscovr_mag_1s.json"))
+
+        await retrieve_data("feed", url, tmp_path / "buffered")
+        with patch("retrieval.fetch_data.CSV_BATCH_SIZE", 7):
+            await retrieve_data("feed", url, tmp_path / "streamed", streaming=True)
+
+        buffered = next((tmp_path / "buffered").glob("*.csv")).read_text()
+        streamed = next((tmp_path / "streamed").glob("*.csv")).read_text()
+        assert streamed == buffered
+        assert len(streamed.splitlines()) == 61
+
+
+    @pytest.mark.asyncio
+    async def test_fetch_batches_discards_failed_attempt(self, feed_server):
+        feed_server.payloads["/feed.json"] = [{"value": i} for i in range(5)]
+        batches = []
+        discarded = []
+
+        async def consume(batch):
+            batches.append([record["value"] for record in batch])
+            if len(batches) == 2 and not discarded:
+                raise RuntimeError("disk full")
+
+        async def discard():
+            discarded.append(list(batches))
+            batches.clear()
+
+        async with create_session() as session:
+            rows = await fetch_batches(
+                str(feed_server.make_url("/feed.json")), session, consume, discard,
+                RetryPolicy(max_attempts=2, base_delay=0.01), batch_size=2
+            )
+
+        assert rows == 5
+        assert discarded == [[[0, 1], [2, 3]]]
+        assert batches == [[0, 1], [2, 3], [4]]
+
+class TestSchemaInference:
+    RECORDS = [
+        {"time_tag": "2023-01-01T00:00:00", "value": 1},
+        {"value": 2, "time_tag": "2023-01-01T00:01:00", "source": {"name": "goes", "id": 16}},
+        {"time_tag": "2023-01-01T00:02:00", "flag": True},
+    ]
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("streaming", [False, True])
+    async def test_columns_aligned_across_records(self, feed_server, tmp_path, streaming):
+        feed_server.payloads["/feed.json"] = self.RECORDS
+
+        await retrieve_data("feed", str(feed_server.make_url("/feed.json")), tmp_path, streaming=streaming)
+
+        assert next(tmp_path.glob("*.csv")).read_text().splitlines() == [
+            "time_tag,value,source.name,source.id,flag",
+            "2023-01-01T00:00:00,1,,,",
+            "2023-01-01T00:01:00,2,goes,16,",
+            "2023-01-01T00:02:00,,,,True",
+        ]
+
+    @pytest.mark.asyncio
+    async def test_first_batch_defines_streamed_header(self, feed_server, tmp_path):
+        feed_server.payloads["/feed.json"] = self.RECORDS
+
+        with patch("retrieval.fetch_data.CSV_BATCH_SIZE", 2):
+            await retrieve_data("feed", str(feed_server.make_url("/feed.json")), tmp_path, streaming=True)
+
+        assert next(tmp_path.glob("*.csv")).read_text().splitlines() == [
+            "time_tag,value,source.name,source.id",
+            "2023-01-01T00:00:00,1,,",
+            "2023-01-01T00:01:00,2,goes,16",
+            "2023-01-01T00:02:00,,,",
+        ]
+
+
+    @pytest.mark.asyncio
+    async def test_expected_columns_missing_from_first_batch_are_written_empty(self, feed_server, tmp_path):
+        feed_server.payloads["/feed.json"] = [
+            {"time_tag": "2023-01-01T00:00:00"},
+            {"time_tag": "2023-01-01T00:01:00", "value": 2},
+        ]
+
+        with patch("retrieval.fetch_data.CSV_BATCH_SIZE", 1):
+            await retrieve_data(
+                "feed", str(feed_server.make_url("/feed.json")), tmp_path, streaming=True,
+                schema=("time_tag", "flag", "value")
+            )
+
+        assert next(tmp_path.glob("*.csv")).read_text().splitlines() == [
+            "time_tag,flag,value",
+            "2023-01-01T00:00:00,,",
+            "2023-01-01T00:01:00,,2",
+        ]
+
+class TestIncremental:
+    @staticmethod
+    def records(start, end):
+        return [{"time_tag": f"2023-01-01T00:00:{i:02d}", "value": i} for i in range(start, end)]
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("streaming", [False, True])
+    async def test_rerun_appends_only_new_records(self, feed_server, tmp_path, streaming):
+        url = str(feed_server.make_url("/feed.json"))
+        watermarks = WatermarkStore(tmp_path / "cache")
+
+        feed_server.payloads["/feed.json"] = self.records(0, 40)
+        await retrieve_data("feed", url, tmp_path / "out", streaming=streaming, watermarks=watermarks)
+        feed_server.payloads["/feed.json"] = self.records(20, 60)
+        await retrieve_data("feed", url, tmp_path / "out", streaming=streaming, watermarks=watermarks)
+
+        lines = next((tmp_path / "out").glob("*.csv")).read_text().splitlines()
+        assert lines[1:] == [f"2023-01-01T00:00:{i:02d},{i}" for i in range(60)]
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("streaming", [False, True])
+    async def test_records_of_the_last_time_tag_published_later(self, feed_server, tmp_path, streaming):
+        url = str(feed_server.make_url("/feed.json"))
+        watermarks = WatermarkStore(tmp_path / "cache")
+        records = [
+            {"time_tag": f"2023-01-01T00:00:{i:02d}", "satellite": satellite}
+            for i in range(3) for satellite in (16, 18)
+        ]
+
+        feed_server.payloads["/feed.json"] = records[:-1]
+        await retrieve_data("feed", url, tmp_path / "out", streaming=streaming, watermarks=watermarks)
+        feed_server.payloads["/feed.json"] = records
+        await retrieve_data("feed", url, tmp_path / "out", streaming=streaming, watermarks=watermarks)
+
+        lines = next((tmp_path / "out").glob("*.csv")).read_text().splitlines()
+        assert lines[1:] == [f"{record['time_tag']},{record['satellite']}" for record in records]
+
+    @pytest.mark.asyncio
+    async def test_new_output_gets_records_since_previous_date(self, feed_server, tmp_path):
+        url = str(feed_server.make_url("/feed.json"))
+        watermarks = WatermarkStore(tmp_path / "cache")
+        watermarks.advance("feed", "2000-01-01", "2023-01-01T00:00:29")
+
+        await retrieve_data("feed", url, tmp_path / "first", watermarks=watermarks)
+        # a rerun into a fresh output of the same date, e.g. a rebuilt zip archive, gets the same records
+        await retrieve_data("feed", url, tmp_path / "rerun", watermarks=watermarks)
+
+        for directory in ("first", "rerun"):
+            lines = next((tmp_path / directory).glob("*.csv")).read_text().splitlines()
+            assert lines[1:] == [f"2023-01-01T00:00:{i:02d},{i}" for i in range(30, 60)]
+
+    @pytest.mark.asyncio
+    async def test_nothing_new(self, feed_server, tmp_path):
+        url = str(feed_server.make_url("/feed.json"))
+        watermarks = WatermarkStore(tmp_path / "cache")
+        watermarks.advance("feed", "2000-01-01", "2023-01-01T00:00:59")
+        sink = ZipSink(tmp_path / "day.zip", "day")
+
+        await retrieve_data("feed", url, sink, watermarks=watermarks)
+        sink.close()
+
+        with zipfile.ZipFile(tmp_path / "day.zip") as zf:
+            assert zf.namelist() == []
+
+
+class TestRetries:
+    @pytest.mark.asyncio
+    async def test_retry_reissues_request(self, feed_server, tmp_path):
+        feed_server.failures["/feed.json"] = [(503, {}), (500, {})]
+        policy = RetryPolicy(max_attempts=3, base_delay=0.01)
+
+        await retrieve_data("feed", str(feed_server.make_url("/feed.json")), tmp_path, policy=policy)
+
+        assert feed_server.stats.requests == 3
+        assert len(next(tmp_path.glob("*.csv")).read_text().splitlines()) == 61
+
+    @pytest.mark.asyncio
+    async def test_retry_honors_retry_after(self, feed_server, tmp_path):
+        feed_server.failures["/feed.json"] = [(429, {"Retry-After": "7"})]
+        policy = RetryPolicy(max_attempts=3, base_delay=0.01)
+
+        with patch("retrieval.fetch_data.asyncio.sleep", new_callable=AsyncMock) as mock_sleep:
+            await retrieve_data("feed", str(feed_server.make_url("/feed.json")), tmp_path, policy=policy)
+
+        mock_sleep.assert_awaited_once_with(7.0)
+
+    @pytest.mark.asyncio
+    async def test_forbidden_fails_fast(self, feed_server, tmp_path):
+        feed_server.failures["/feed.json"] = [(403, {})] * 3
+        policy = RetryPolicy(max_attempts=3, base_delay=0.01)
+
+        with pytest.raises(FatalError):
+            await retrieve_data("feed", str(feed_server.make_url("/feed.json")), tmp_path, policy=policy)
+
+        assert feed_server.stats.requests == 1
+
+    @pytest.mark.asyncio
+    async def test_retry_stops_at_deadline(self, feed_server, tmp_path):
+        feed_server.failures["/feed.json"] = [(503, {"Retry-After": "60"})]
+        policy = RetryPolicy(max_attempts=5, base_delay=0.01, deadline=30)
+
+        with pytest.raises(Exception, match="after 1 retries"):
+            await retrieve_data("feed", str(feed_server.make_url("/feed.json")), tmp_path, policy=policy)
+
+        assert feed_server.stats.requests == 1
+
+
+class TestPartialSuccess:
+    @patch("retrieval.fetch_data.compress_data")
+    @patch("retrieval.fetch_data.send_to_dropbox")
+    @patch("retrieval.fetch_data.retrieve_data")
+    @patch("retrieval.fetch_data.NAME2URL", {"test1": "url1", "test2": "url2"})
+    @pytest.mark.asyncio
+    async def test_archive_built_from_succeeded_feeds(
+        self, mock_retrieve_data, mock_send_to_dropbox, mock_compress_data, tmp_path
+    ):
+        mock_retrieve_data.side_effect = [None, Exception("Test error")]
+
+        with patch("retrieval.fetch_data.SAVE_DIR", tmp_path):
+            await retrieve_all_data()
+
+        assert mock_retrieve_data.call_count == 2
+        mock_compress_data.assert_not_called()
+        mock_send_to_dropbox.assert_called_once()
+        assert mock_send_to_dropbox.call_args[0][0].exists()
+
     @patch("retrieval.fetch_data.compress_data")
     @patch("retrieval.fetch_data.send_to_dropbox")
+    @patch("retrieval.fetch_data.retrieve_data")
+    @patch("retrieval.fetch_data.NAME2URL", {"test1": "url1", "test2": "url2"})
     @pytest.mark.asyncio
-    async def test_retrieve_all_data_exception(self, mock_send_to_dropbox, mock_compress_data, mock_gather):
-        mock_gather.side_effect = Exception("Test error")
+    async def test_all_feeds_failed(self, mock_retrieve_data, mock_send_to_dropbox, mock_compress_data, tmp_path):
+        mock_retrieve_data.side_effect = Exception("Test error")
 
-        with pytest.raises(Exception, match="Test error"):
+        with patch("retrieval.fetch_data.SAVE_DIR", tmp_path), \
+                pytest.raises(Exception, match="Failed to retrieve any data"):
             await retrieve_all_data()
 
+        # only the run report is left
+        assert [p.name for p in tmp_path.iterdir()] == [f"{datetime.today().date()}{REPORT_SUFFIX}"]
+
         mock_compress_data.assert_not_called()
         mock_send_to_dropbox.assert_not_called()
+
+
+class TestOffLoopWrites:
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("streaming", [False, True])
+    async def test_rows_written_on_writer_thread(self, feed_server, tmp_path, streaming):
+        threads = set()
+        original = CsvAppender.write_columns
+
+        def recording_write_columns(self, columns):
+            threads.add(threading.current_thread().name)
+            return original(self, columns)
+
+        with patch.object(CsvAppender, "write_columns", recording_write_columns):
+            await retrieve_data("feed", str(feed_server.make_url("/feed.json")), tmp_path, streaming=streaming)
+
+        assert len(threads) == 1
+        assert threads.pop().startswith("writer")
+        assert threading.main_thread().name not in threads
+
+    @pytest.mark.asyncio
+    async def test_writes_inline_without_executor(self, feed_server, tmp_path):
+        with patch("retrieval.fetch_data.WRITER_EXECUTOR", None):
+            await retrieve_data("feed", str(feed_server.make_url("/feed.json")), tmp_path, streaming=True)
+
+        assert len(next(tmp_path.glob("*.csv")).read_text().splitlines()) == 61
+
+
+class TestOutputFormat:
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("streaming", [False, True])
+    async def test_parquet_output(self, feed_server, tmp_path, streaming):
+        pq = pytest.importorskip("pyarrow.parquet")
+
+        await retrieve_data(
+            "feed", str(feed_server.make_url("/feed.json")), tmp_path, streaming=streaming, output_format="parquet"
+        )
+
+        table = pq.read_table(next(tmp_path.glob("feed_*.parquet")))
+        assert table.num_rows == 60
+        assert table.column_names == ["time_tag", "value"]
+        assert str(table.schema.field("value").type) == "int64"
+
+    @pytest.mark.asyncio
+    async def test_unknown_output_format(self, tmp_path):
+        with pytest.raises(ValueError, match="Unknown output format"):
+            await retrieve_data("feed", "http://example.com", tmp_path, output_format="xml")
+
+
+class TestStreamedArchive:
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("compression", ["deflate", "bzip2", "lzma"])
+    async def test_feeds_streamed_into_archive(self, feed_server, tmp_path, compression):
+        feeds = {
+            f"feed_{i}": Feed(f"feed_{i}", str(feed_server.make_url(f"/feed_{i}.json")), size=LARGE if i == 0 else SMALL)
+            for i in range(3)
+        }
+
+        with patch("retrieval.fetch_data.SAVE_DIR", tmp_path), \
+                patch("retrieval.fetch_data.compress_data") as mock_compress_data, \
+                patch("retrieval.fetch_data.send_to_dropbox") as mock_send_to_dropbox:
+            await retrieve_all_data(compression=compression, compresslevel=5, feeds=feeds)
+
+        archive = mock_send_to_dropbox.call_args[0][0]
+        day = archive.stem
+        mock_compress_data.assert_not_called()
+        assert sorted(p.name for p in tmp_path.iterdir()) == [f"{day}{REPORT_SUFFIX}", archive.name]
+        with zipfile.ZipFile(archive) as zf:
+            assert sorted(zf.namelist()) == [f"{day}/feed_{i}_{day}.csv" for i in range(3)]
+            assert {info.compress_type for info in zf.infolist()} == {COMPRESSION_METHODS[compression]}
+            assert len(zf.read(f"{day}/feed_0_{day}.csv").decode().splitlines()) == 61
+
+
+class TestRunReport:
+    @pytest.mark.asyncio
+    async def test_stages_reported_per_feed(self, feed_server, tmp_path):
+        feeds = {
+            "large": Feed("large", str(feed_server.make_url("/large.json")), size=LARGE),
+            "small": Feed("small", str(feed_server.make_url("/small.json"))),
+        }
+
+        with patch("retrieval.fetch_data.SAVE_DIR", tmp_path), \
+                patch("retrieval.fetch_data.send_to_dropbox"):
+            await retrieve_all_data(feeds=feeds)
+
+        report = json.loads((tmp_path / f"{datetime.today().date()}{REPORT_SUFFIX}").read_text())
+        stages = report["feeds"]
+        # pooled connections may be reused, the server is addressed by IP so nothing is resolved
+        assert list(stages["large"])[-4:] == ["request", "stream", "flatten", "write"]
+        assert list(stages["small"])[-5:] == ["request", "download", "decode", "flatten", "write"]
+        assert "connect" in report["totals"]
+        assert stages["small"]["decode"]["rows"] == stages["small"]["write"]["rows"] == 60
+        assert stages["small"]["download"]["bytes"] > 0
+        assert stages["large"]["stream"]["bytes"] > 0
+        assert list(stages["run"]) == ["compress", "upload"]
+        assert stages["run"]["upload"]["bytes"] == (tmp_path / f"{report['run']}.zip").stat().st_size
+        assert report["totals"]["flatten"]["rows"] == 120
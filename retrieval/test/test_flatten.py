@@ -0,0 +1,67 @@
+from retrieval.flatten import FeedSchema, flatten_columns
+
+
+class TestFlattenColumns:
+    def test_flat_records(self):
+        columns = flatten_columns([{"a": 1, "b": 2}, {"b": 3, "a": 4}])
+
+        assert columns == {"a": [1, 4], "b": [2, 3]}
+
+    def test_missing_and_extra_keys(self):
+        columns = flatten_columns([{"a": 1}, {"a": 2, "b": 3}, {"b": 4}])
+
+        assert columns == {"a": [1, 2, None], "b": [None, 3, 4]}
+
+    def test_nested_objects_become_dotted_columns(self):
+        columns = flatten_columns([
+            {"time": 1, "source": {"name": "goes", "pos": {"lat": 0.5}}},
+            {"time": 2, "source": {"name": "dscovr"}},
+            {"time": 3},
+        ])
+
+        assert columns == {
+            "time": [1, 2, 3],
+            "source.name": ["goes", "dscovr", None],
+            "source.pos.lat": [0.5, None, None],
+        }
+
+    def test_scalars_next_to_objects_are_kept(self):
+        columns = flatten_columns([{"a": {"b": 1}}, {"a": 5}])
+
+        assert columns == {"a": [None, 5], "a.b": [1, None]}
+
+    def test_lists_are_left_as_values(self):
+        assert flatten_columns([{"a": [1, 2]}]) == {"a": [[1, 2]]}
+
+
+class TestFeedSchema:
+    def test_update_appends_new_columns(self):
+        schema = FeedSchema(["a", "b"])
+
+        assert schema.update(["c", "a", "d"]) == ["c", "d"]
+        assert schema.columns == ["a", "b", "c", "d"]
+
+    def test_unknown(self):
+        assert FeedSchema(["a"]).unknown(["a", "b"]) == ["b"]
+
+    def test_align_fills_missing_columns(self):
+        schema = FeedSchema(["a", "b", "c"])
+
+        assert schema.align({"c": [1, 2], "a": [3, 4]}, 2) == [[3, 4], [None, None], [1, 2]]
+
+    def test_expected_columns_go_first(self):
+        schema = FeedSchema(expected=["time_tag", "flux", "energy"])
+
+        schema.update(["energy", "extra", "flux", "time_tag"])
+
+        assert schema.columns == ["time_tag", "flux", "energy", "extra"]
+        assert schema.missing(["energy", "extra", "flux", "time_tag"]) == []
+
+    def test_missing_expected_columns_are_kept(self):
+        schema = FeedSchema(expected=["time_tag", "flux"])
+
+        schema.update(["value", "time_tag"])
+
+        assert schema.columns == ["time_tag", "flux", "value"]
+        assert schema.missing(["value", "time_tag"]) == ["flux"]
+        assert schema.align({"value": [1], "time_tag": ["t"]}, 1) == [["t"], [None], [1]]
@@ -1,9 +1,11 @@
 import pytest
 from unittest.mock import patch, MagicMock, mock_open
 from pathlib import Path
-from dropbox.exceptions import ApiError, AuthError
+from dropbox.exceptions import ApiError, AuthError, InternalServerError
 
-from retrieval.send2dropbox import send_to_dropbox, MAX_RETRIES, SEND_RETRY_SLEEP_TIME
+from retrieval.send2dropbox import send_to_dropbox, DropboxUploadError, MAX_RETRIES, SEND_RETRY_SLEEP_TIME
+from retrieval.logger import Logger
+from logging.handlers import QueueHandler
 
 
 class TestSendToDropbox:
@@ -26,7 +28,7 @@ class TestSendToDropbox:
 
     @patch('retrieval.send2dropbox.dropbox.Dropbox')
     @patch('retrieval.send2dropbox.sleep')
-    def test_send_to_dropbox_api_error_with_retry_success(self, mock_sleep, mock_dropbox_class):
+    def test_send_to_dropbox_api_error_is_not_retried(self, mock_sleep, mock_dropbox_class):
         mock_dbx = MagicMock()
         api_error = ApiError(
             error={"error_summary": "Test API error"},
@@ -41,15 +43,16 @@ class TestSendToDropbox:
         dropbox_path = "/backup/test_file.zip"
 
         with patch('builtins.open', mock_open(read_data=b'file_content')):
-            send_to_dropbox(file_path, dropbox_path, mock_logger)
+            with pytest.raises(ApiError):
+                send_to_dropbox(file_path, dropbox_path, mock_logger)
 
-        assert mock_dbx.files_upload.call_count == 2
-        mock_sleep.assert_called_once_with(SEND_RETRY_SLEEP_TIME)
-        mock_logger.log_exception.assert_called_once()
+        mock_dbx.files_upload.assert_called_once()
+        mock_sleep.assert_not_called()
+        assert mock_logger.log_error.called
 
     @patch('retrieval.send2dropbox.dropbox.Dropbox')
     @patch('retrieval.send2dropbox.sleep')
-    def test_send_to_dropbox_auth_error_with_retry_success(self, mock_sleep, mock_dropbox_class):
+    def test_send_to_dropbox_auth_error_is_not_retried(self, mock_sleep, mock_dropbox_class):
         mock_dbx = MagicMock()
         auth_error = AuthError(
             error="Test Auth error",
@@ -62,34 +65,47 @@ class TestSendToDropbox:
         dropbox_path = "/backup/test_file.zip"
 
         with patch('builtins.open', mock_open(read_data=b'file_content')):
-            send_to_dropbox(file_path, dropbox_path, mock_logger)
+            with pytest.raises(AuthError):
+                send_to_dropbox(file_path, dropbox_path, mock_logger)
+
+        mock_dbx.files_upload.assert_called_once()
+        mock_sleep.assert_not_called()
+        assert mock_logger.log_error.called
+
+    @patch('retrieval.send2dropbox.dropbox.Dropbox')
+    @patch('retrieval.send2dropbox.sleep')
+    def test_send_to_dropbox_server_error_with_retry_success(self, mock_sleep, mock_dropbox_class):
+        mock_dbx = MagicMock()
+        server_error = InternalServerError("test_request_id", 500, "Test server error")
+        mock_dbx.files_upload.side_effect = [server_error, None]
+        mock_dropbox_class.return_value = mock_dbx
+        mock_logger = MagicMock()
+
+        with patch('builtins.open', mock_open(read_data=b'file_content')):
+            send_to_dropbox("test_file.zip", "/backup/test_file.zip", mock_logger)
 
         assert mock_dbx.files_upload.call_count == 2
-        mock_sleep.assert_called_once_with(SEND_RETRY_SLEEP_TIME)
+        mock_sleep.assert_called_once()
+        assert SEND_RETRY_SLEEP_TIME / 2 <= mock_sleep.call_args[0][0] <= SEND_RETRY_SLEEP_TIME
         mock_logger.log_exception.assert_called_once()
 
     @patch('retrieval.send2dropbox.dropbox.Dropbox')
     @patch('retrieval.send2dropbox.sleep')
     def test_send_to_dropbox_max_retries_exceeded(self, mock_sleep, mock_dropbox_class):
         mock_dbx = MagicMock()
-        api_error = ApiError(
-            error={"error_summary": "Test API error"},
-            user_message_text="Test user message",
-            user_message_locale="en",
-            request_id="test_request_id"
-        )
-        mock_dbx.files_upload.side_effect = [api_error] * MAX_RETRIES
+        server_error = InternalServerError("test_request_id", 500, "Test server error")
+        mock_dbx.files_upload.side_effect = [server_error] * MAX_RETRIES
         mock_dropbox_class.return_value = mock_dbx
         mock_logger = MagicMock()
         file_path = "test_file.zip"
         dropbox_path = "/backup/test_file.zip"
 
         with patch('builtins.open', mock_open(read_data=b'file_content')):
-            with pytest.raises(Exception, match=f"Failed to upload {file_path} to Dropbox after {MAX_RETRIES} retries"):
+            with pytest.raises(DropboxUploadError, match=f"Failed to upload {file_path} to Dropbox after {MAX_RETRIES} retries"):
                 send_to_dropbox(file_path, dropbox_path, mock_logger)
 
         assert mock_dbx.files_upload.call_count == MAX_RETRIES
-        assert mock_sleep.call_count == MAX_RETRIES
+        assert mock_sleep.call_count == MAX_RETRIES - 1
         assert mock_logger.log_error.called
 
     @patch('retrieval.send2dropbox.dropbox.Dropbox')
@@ -107,4 +123,28 @@ class TestSendToDropbox:
         m.assert_called_once_with(file_path, 'rb')
         mock_dbx.files_upload.assert_called_once()
         args, kwargs = mock_dbx.files_upload.call_args
-        assert args[0] == file_content
\ No newline at end of file
+        assert args[0] == file_content
+
+class TestLogger:
+    @pytest.mark.parametrize("queued", [True, False])
+    def test_writes_log_file(self, tmp_path, queued):
+        logger = Logger(tmp_path / "logs.log", queued=queued, name=f"test-{queued}")
+
+        logger.log("fetched feed")
+        logger.log_error("feed failed")
+        logger.close()
+
+        lines = (tmp_path / "logs.log").read_text().splitlines()
+        assert [line.split(" - ", 2)[2] for line in lines] == ["INFO - fetched feed", "ERROR - feed failed"]
+
+    def test_queued_records_are_written_by_listener(self, tmp_path):
+        logger = Logger(tmp_path / "logs.log", queued=True, name="test-listener")
+
+        assert [type(handler) for handler in logger.logger.handlers] == [QueueHandler]
+        logger.close()
+        logger.log("after close")
+
+        assert logger.listener is None
+        assert "after close" in (tmp_path / "logs.log").read_text()
+        for handler in logger.logger.handlers:
+            handler.close()
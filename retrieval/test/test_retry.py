@@ -0,0 +1,64 @@
+import random
+import time
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+
+from retrieval.retry import RetryPolicy, RetryableError, FatalError, parse_retry_after
+
+
+class TestParseRetryAfter:
+    def test_seconds(self):
+        assert parse_retry_after("120") == 120.0
+
+    def test_http_date(self):
+        value = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+
+        assert 25 <= parse_retry_after(value) <= 30
+
+    def test_invalid(self):
+        assert parse_retry_after(None) is None
+        assert parse_retry_after("soon") is None
+
+
+class TestRetryPolicy:
+    def test_backoff_grows_exponentially_without_jitter(self):
+        policy = RetryPolicy(base_delay=1, multiplier=2, max_delay=5, jitter=0)
+
+        assert [policy.backoff(a) for a in range(1, 5)] == [1, 2, 4, 5]
+
+    def test_backoff_jitter_bounds(self):
+        policy = RetryPolicy(base_delay=4, jitter=0.5, rng=random.Random(0))
+
+        delays = [policy.backoff(1) for _ in range(100)]
+
+        assert all(2 <= d <= 4 for d in delays)
+        assert len(set(delays)) > 1
+
+    def test_next_delay_respects_max_attempts(self):
+        policy = RetryPolicy(max_attempts=3, jitter=0)
+        started = time.monotonic()
+
+        assert policy.next_delay(1, started) == 1
+        assert policy.next_delay(2, started) == 2
+        assert policy.next_delay(3, started) is None
+
+    def test_next_delay_prefers_retry_after(self):
+        policy = RetryPolicy(jitter=0)
+
+        assert policy.next_delay(1, time.monotonic(), retry_after=9) == 9
+
+    def test_next_delay_respects_deadline(self):
+        policy = RetryPolicy(max_attempts=10, base_delay=5, jitter=0, deadline=10)
+
+        assert policy.next_delay(1, time.monotonic()) == 5
+        assert policy.next_delay(1, time.monotonic() - 6) is None
+
+    def test_error_for_status(self):
+        policy = RetryPolicy()
+
+        retryable = policy.error_for_status(429, "Too Many Requests", "3")
+        assert isinstance(retryable, RetryableError)
+        assert retryable.retry_after == 3.0
+        assert isinstance(policy.error_for_status(502), RetryableError)
+        assert isinstance(policy.error_for_status(403, "Forbidden"), FatalError)
+        assert isinstance(policy.error_for_status(404), FatalError)
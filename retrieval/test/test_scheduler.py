@@ -0,0 +1,105 @@
+import asyncio
+import time
+import pytest
+from unittest.mock import MagicMock
+
+from retrieval.scheduler import FetchScheduler, RateLimiter, DEFAULT_TIMEOUT
+from retrieval.feeds import Feed, LARGE
+
+
+def make_job(started: list, name: str, delay: float = 0.0, error: Exception = None):
+    async def job():
+        started.append(name)
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+    return job
+
+
+class TestFetchScheduler:
+    @pytest.mark.asyncio
+    async def test_priority_order(self):
+        started = []
+        scheduler = FetchScheduler(concurrency=1, priorities={"big": 0, "medium": 1})
+        jobs = {name: make_job(started, name) for name in ("small", "medium", "big", "tiny")}
+
+        results = await scheduler.run(jobs)
+
+        assert started == ["big", "medium", "small", "tiny"]
+        assert list(results) == started
+        assert all(r.ok for r in results.values())
+
+    @pytest.mark.asyncio
+    async def test_concurrency_is_bounded(self):
+        running = 0
+        peak = 0
+
+        async def job():
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+        await FetchScheduler(concurrency=3).run({f"feed_{i}": job for i in range(10)})
+
+        assert peak == 3
+
+    @pytest.mark.asyncio
+    async def test_timeout_and_partial_success(self):
+        started = []
+        scheduler = FetchScheduler(concurrency=4, default_timeout=1, timeouts={"hung": 0.05})
+        jobs = {
+            "hung": make_job(started, "hung", delay=10),
+            "broken": make_job(started, "broken", error=ValueError("bad payload")),
+            "fine": make_job(started, "fine"),
+        }
+
+        results = await scheduler.run(jobs)
+
+        assert isinstance(results["hung"].error, TimeoutError)
+        assert 0.05 <= results["hung"].latency < 1
+        assert isinstance(results["broken"].error, ValueError)
+        assert results["fine"].ok
+
+    @pytest.mark.asyncio
+    async def test_latency_report_is_logged(self):
+        logger = MagicMock()
+        started = []
+        jobs = {"fine": make_job(started, "fine"), "broken": make_job(started, "broken", error=ValueError("x"))}
+
+        await FetchScheduler(logger=logger).run(jobs)
+
+        logger.log.assert_called_once()
+        assert logger.log.call_args[0][0].startswith("fine: ok in")
+        logger.log_error.assert_called_once()
+
+    def test_from_feeds(self):
+        feeds = {
+            "big": Feed("big", "url", size=LARGE, priority=0, timeout=300),
+            "small": Feed("small", "url"),
+        }
+
+        scheduler = FetchScheduler.from_feeds(feeds, concurrency=2)
+
+        assert scheduler.concurrency == 2
+        assert scheduler.order(["small", "big"]) == ["big", "small"]
+        assert scheduler.timeout_for("big") == 300
+        assert scheduler.timeout_for("small") == DEFAULT_TIMEOUT
+
+
+class TestRateLimiter:
+    @pytest.mark.asyncio
+    async def test_requests_spaced_by_rate(self):
+        limiter = RateLimiter(rate=50, burst=2)
+
+        started = time.perf_counter()
+        for _ in range(6):
+            await limiter.acquire()
+
+        # the burst goes at once, the other 4 requests wait 1/50 s each
+        assert time.perf_counter() - started >= 0.075
+
+    def test_rate_must_be_positive(self):
+        with pytest.raises(ValueError, match="must be positive"):
+            RateLimiter(rate=0)
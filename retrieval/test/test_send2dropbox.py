@@ -1,9 +1,15 @@
 import pytest
+from io import BytesIO
 from unittest.mock import patch, MagicMock, mock_open
 from pathlib import Path
-from dropbox.exceptions import ApiError, AuthError
+from dropbox.exceptions import ApiError, AuthError, RateLimitError, InternalServerError
+from dropbox.files import (
+    FileMetadata, GetMetadataError, LookupError as PathLookupError, UploadSessionAppendError, UploadSessionFinishError, UploadSessionLookupError, UploadSessionOffsetError
+)
 
-from retrieval.send2dropbox import send_to_dropbox, MAX_RETRIES, SEND_RETRY_SLEEP_TIME
+from retrieval.send2dropbox import (
+    send_to_dropbox, content_hash, dropbox_file_exists, DropboxUploadError, MAX_RETRIES, SEND_RETRY_SLEEP_TIME
+)
 
 
 class TestSendToDropbox:
@@ -26,7 +32,26 @@ class TestSendToDropbox:
 
     @patch('retrieval.send2dropbox.dropbox.Dropbox')
     @patch('retrieval.send2dropbox.sleep')
-    def test_send_to_dropbox_api_error_with_retry_success(self, mock_sleep, mock_dropbox_class):
+    def test_send_to_dropbox_server_error_with_retry_success(self, mock_sleep, mock_dropbox_class):
+        mock_dbx = MagicMock()
+        server_error = InternalServerError("test_request_id", 500, "Test server error")
+        mock_dbx.files_upload.side_effect = [server_error, None]
+        mock_dropbox_class.return_value = mock_dbx
+        mock_logger = MagicMock()
+        file_path = Path("test_file.zip")
+        dropbox_path = "/backup/test_file.zip"
+
+        with patch('builtins.open', mock_open(read_data=b'file_content')):
+            send_to_dropbox(file_path, dropbox_path, mock_logger)
+
+        assert mock_dbx.files_upload.call_count == 2
+        mock_sleep.assert_called_once()
+        assert SEND_RETRY_SLEEP_TIME / 2 <= mock_sleep.call_args[0][0] <= SEND_RETRY_SLEEP_TIME
+        mock_logger.log_exception.assert_called_once()
+
+    @patch('retrieval.send2dropbox.dropbox.Dropbox')
+    @patch('retrieval.send2dropbox.sleep')
+    def test_send_to_dropbox_api_error_is_not_retried(self, mock_sleep, mock_dropbox_class):
         mock_dbx = MagicMock()
         api_error = ApiError(
             error={"error_summary": "Test API error"},
@@ -37,19 +62,18 @@ class TestSendToDropbox:
         mock_dbx.files_upload.side_effect = [api_error, None]
         mock_dropbox_class.return_value = mock_dbx
         mock_logger = MagicMock()
-        file_path = Path("test_file.zip")
-        dropbox_path = "/backup/test_file.zip"
 
         with patch('builtins.open', mock_open(read_data=b'file_content')):
-            send_to_dropbox(file_path, dropbox_path, mock_logger)
+            with pytest.raises(ApiError):
+                send_to_dropbox("test_file.zip", "/backup/test_file.zip", mock_logger)
 
-        assert mock_dbx.files_upload.call_count == 2
-        mock_sleep.assert_called_once_with(SEND_RETRY_SLEEP_TIME)
-        mock_logger.log_exception.assert_called_once()
+        mock_dbx.files_upload.assert_called_once()
+        mock_sleep.assert_not_called()
+        assert mock_logger.log_error.called
 
     @patch('retrieval.send2dropbox.dropbox.Dropbox')
     @patch('retrieval.send2dropbox.sleep')
-    def test_send_to_dropbox_auth_error_with_retry_success(self, mock_sleep, mock_dropbox_class):
+    def test_send_to_dropbox_auth_error_is_not_retried(self, mock_sleep, mock_dropbox_class):
         mock_dbx = MagicMock()
         auth_error = AuthError(
             error="Test Auth error",
@@ -58,38 +82,32 @@ class TestSendToDropbox:
         mock_dbx.files_upload.side_effect = [auth_error, None]
         mock_dropbox_class.return_value = mock_dbx
         mock_logger = MagicMock()
-        file_path = "test_file.zip"
-        dropbox_path = "/backup/test_file.zip"
 
         with patch('builtins.open', mock_open(read_data=b'file_content')):
-            send_to_dropbox(file_path, dropbox_path, mock_logger)
+            with pytest.raises(AuthError):
+                send_to_dropbox("test_file.zip", "/backup/test_file.zip", mock_logger)
 
-        assert mock_dbx.files_upload.call_count == 2
-        mock_sleep.assert_called_once_with(SEND_RETRY_SLEEP_TIME)
-        mock_logger.log_exception.assert_called_once()
+        mock_dbx.files_upload.assert_called_once()
+        mock_sleep.assert_not_called()
+        assert mock_logger.log_error.called
 
     @patch('retrieval.send2dropbox.dropbox.Dropbox')
     @patch('retrieval.send2dropbox.sleep')
     def test_send_to_dropbox_max_retries_exceeded(self, mock_sleep, mock_dropbox_class):
         mock_dbx = MagicMock()
-        api_error = ApiError(
-            error={"error_summary": "Test API error"},
-            user_message_text="Test user message",
-            user_message_locale="en",
-            request_id="test_request_id"
-        )
-        mock_dbx.files_upload.side_effect = [api_error] * MAX_RETRIES
+        server_error = InternalServerError("test_request_id", 500, "Test server error")
+        mock_dbx.files_upload.side_effect = [server_error] * MAX_RETRIES
         mock_dropbox_class.return_value = mock_dbx
         mock_logger = MagicMock()
         file_path = "test_file.zip"
         dropbox_path = "/backup/test_file.zip"
 
         with patch('builtins.open', mock_open(read_data=b'file_content')):
-            with pytest.raises(Exception, match=f"Failed to upload {file_path} to Dropbox after {MAX_RETRIES} retries"):
+            with pytest.raises(DropboxUploadError, match=f"Failed to upload {file_path} to Dropbox after {MAX_RETRIES} retries"):
                 send_to_dropbox(file_path, dropbox_path, mock_logger)
 
         assert mock_dbx.files_upload.call_count == MAX_RETRIES
-        assert mock_sleep.call_count == MAX_RETRIES
+        assert mock_sleep.call_count == MAX_RETRIES - 1
         assert mock_logger.log_error.called
 
     @patch('retrieval.send2dropbox.dropbox.Dropbox')
@@ -108,3 +126,227 @@ class TestSendToDropbox:
         mock_dbx.files_upload.assert_called_once()
         args, kwargs = mock_dbx.files_upload.call_args
         assert args[0] == file_content
+
+    @patch('retrieval.send2dropbox.dropbox.Dropbox')
+    @patch('retrieval.send2dropbox.sleep')
+    def test_send_to_dropbox_rate_limit_honors_backoff(self, mock_sleep, mock_dropbox_class):
+        mock_dbx = MagicMock()
+        mock_dbx.files_upload.side_effect = [
+            RateLimitError(request_id="test_request_id", error=None, backoff=42),
+            None
+        ]
+        mock_dropbox_class.return_value = mock_dbx
+        mock_logger = MagicMock()
+
+        with patch('builtins.open', mock_open(read_data=b'file_content')):
+            send_to_dropbox("test_file.zip", "/backup/test_file.zip", mock_logger)
+
+        assert mock_dbx.files_upload.call_count == 2
+        mock_sleep.assert_called_once_with(42)
+
+    @patch('retrieval.send2dropbox.dropbox.Dropbox')
+    @patch('retrieval.send2dropbox.sleep')
+    def test_send_to_dropbox_retry_resends_whole_file(self, mock_sleep, mock_dropbox_class):
+        mock_dbx = MagicMock()
+        server_error = InternalServerError("test_request_id", 500, "Test server error")
+        mock_dbx.files_upload.side_effect = [server_error, None]
+        mock_dropbox_class.return_value = mock_dbx
+
+        with patch('builtins.open', mock_open(read_data=b'file_content')):
+            send_to_dropbox("test_file.zip", "/backup/test_file.zip", MagicMock())
+
+        assert [c.args[0] for c in mock_dbx.files_upload.call_args_list] == [b'file_content', b'file_content']
+
+
+class FakeDropbox:
+    """In-memory stand-in for the upload session endpoints of the Dropbox client"""
+
+    def __init__(self, failures=None):
+        self.sessions = {}
+        self.files = {}
+        self.calls = []
+        # (method, committed) pairs, committed=True fails after the data was stored
+        self.failures = list(failures or [])
+
+    def _fail(self, method, session_id=None, data=b""):
+        if self.failures and self.failures[0][0] == method:
+            _, committed = self.failures.pop(0)
+            if committed:
+                self.sessions[session_id] += data
+            raise InternalServerError("test_request_id", 500, "boom")
+
+    def _check_offset(self, cursor, error):
+        held = len(self.sessions[cursor.session_id])
+        if cursor.offset != held:
+            raise ApiError("test_request_id", error(held), None, None)
+
+    def files_get_metadata(self, path):
+        if path not in self.files:
+            raise ApiError("test_request_id", GetMetadataError.path(PathLookupError.not_found), None, None)
+        return FileMetadata(name=path.rsplit("/", 1)[-1], content_hash=content_hash(BytesIO(self.files[path])))
+
+    def files_upload(self, f, path, mode):
+        self.calls.append(("upload", 0, len(f)))
+        self.files[path] = f
+
+    def files_upload_session_start(self, f):
+        self.calls.append(("start", 0, len(f)))
+        session_id = f"session-{len(self.sessions)}"
+        self.sessions[session_id] = b""
+        self._fail("start")
+        self.sessions[session_id] = f
+        return MagicMock(session_id=session_id)
+
+    def files_upload_session_append_v2(self, f, cursor):
+        self.calls.append(("append", cursor.offset, len(f)))
+        self._check_offset(cursor, lambda held: UploadSessionAppendError.incorrect_offset(
+            UploadSessionOffsetError(correct_offset=held)
+        ))
+        self._fail("append", cursor.session_id, f)
+        self.sessions[cursor.session_id] += f
+
+    def files_upload_session_finish(self, f, cursor, commit):
+        self.calls.append(("finish", cursor.offset, len(f)))
+        self._check_offset(cursor, lambda held: UploadSessionFinishError.lookup_failed(
+            UploadSessionLookupError.incorrect_offset(UploadSessionOffsetError(correct_offset=held))
+        ))
+        self._fail("finish", cursor.session_id, f)
+        self.files[commit.path] = self.sessions.pop(cursor.session_id) + f
+
+
+class TestUploadSession:
+    @pytest.fixture
+    def archive(self, tmp_path):
+        path = tmp_path / "archive.zip"
+        path.write_bytes(bytes(range(256)) * 10)
+        return path
+
+    def upload(self, archive, fake, chunk_size=1000):
+        with patch('retrieval.send2dropbox.dropbox.Dropbox', return_value=fake), \
+                patch('retrieval.send2dropbox.sleep') as mock_sleep:
+            send_to_dropbox(archive, "/backup/archive.zip", MagicMock(), chunk_size=chunk_size)
+        return mock_sleep
+
+    def test_large_file_is_sent_in_chunks(self, archive):
+        fake = FakeDropbox()
+
+        self.upload(archive, fake)
+
+        assert fake.files["/backup/archive.zip"] == archive.read_bytes()
+        assert fake.calls == [("start", 0, 1000), ("append", 1000, 1000), ("finish", 2000, 560)]
+
+    def test_small_file_uses_single_request(self, archive):
+        fake = MagicMock()
+
+        self.upload(archive, fake, chunk_size=4096)
+
+        fake.files_upload.assert_called_once()
+        fake.files_upload_session_start.assert_not_called()
+
+    def test_file_of_exactly_one_chunk_is_committed(self, archive):
+        fake = FakeDropbox()
+
+        self.upload(archive, fake, chunk_size=2560)
+
+        assert fake.files["/backup/archive.zip"] == archive.read_bytes()
+        assert fake.calls == [("start", 0, 2560), ("finish", 2560, 0)]
+
+    def test_retry_resends_only_failed_chunk(self, archive):
+        fake = FakeDropbox(failures=[("append", False)])
+
+        mock_sleep = self.upload(archive, fake)
+
+        assert fake.files["/backup/archive.zip"] == archive.read_bytes()
+        assert fake.calls == [
+            ("start", 0, 1000), ("append", 1000, 1000), ("append", 1000, 1000), ("finish", 2000, 560)
+        ]
+        mock_sleep.assert_called_once()
+
+    def test_resumes_from_committed_offset(self, archive):
+        # the append reaches Dropbox but the response is lost, the retry is told the correct offset
+        fake = FakeDropbox(failures=[("append", True)])
+
+        self.upload(archive, fake)
+
+        assert fake.files["/backup/archive.zip"] == archive.read_bytes()
+        assert fake.calls == [
+            ("start", 0, 1000), ("append", 1000, 1000), ("append", 1000, 1000), ("finish", 2000, 560)
+        ]
+
+    def test_resumes_finish_from_committed_offset(self, archive):
+        fake = FakeDropbox(failures=[("finish", True)])
+
+        self.upload(archive, fake, chunk_size=2000)
+
+        assert fake.calls[-1] == ("finish", 2560, 0)
+        assert fake.files["/backup/archive.zip"] == archive.read_bytes()
+
+    def test_gives_up_after_max_retries(self, archive):
+        fake = FakeDropbox(failures=[("append", False)] * MAX_RETRIES)
+
+        with pytest.raises(DropboxUploadError, match=f"after {MAX_RETRIES} retries"):
+            self.upload(archive, fake)
+
+        assert [c[0] for c in fake.calls] == ["start"] + ["append"] * MAX_RETRIES
+
+
+class TestContentHashDedup:
+    def upload(self, archive, fake, chunk_size=1000):
+        logger = MagicMock()
+        with patch('retrieval.send2dropbox.dropbox.Dropbox', return_value=fake), \
+                patch('retrieval.send2dropbox.sleep'):
+            send_to_dropbox(archive, "/backup/archive.zip", logger, chunk_size=chunk_size)
+        return logger
+
+    def test_content_hash_matches_dropbox_reference(self):
+        # a single block hashes to sha256(sha256(block))
+        assert content_hash(BytesIO(b"")) == "e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855"
+        assert content_hash(BytesIO(b"abc")) == (
+            "4f8b42c22dd3729b519ba6f68d2da7cc5b2d606d05daed5ad5128cc03e6c6358"
+        )
+
+    @pytest.mark.parametrize("chunk_size", [1000, 4096])
+    def test_identical_archive_is_not_uploaded(self, tmp_path, chunk_size):
+        archive = tmp_path / "archive.zip"
+        archive.write_bytes(bytes(range(256)) * 10)
+        fake = FakeDropbox()
+        fake.files["/backup/archive.zip"] = archive.read_bytes()
+
+        logger = self.upload(archive, fake, chunk_size)
+
+        assert fake.calls == []
+        assert "Skipped upload" in logger.log.call_args[0][0]
+        assert "2560 bytes not sent" in logger.log.call_args[0][0]
+
+    @pytest.mark.parametrize("chunk_size", [1000, 4096])
+    def test_changed_archive_is_uploaded(self, tmp_path, chunk_size):
+        archive = tmp_path / "archive.zip"
+        archive.write_bytes(bytes(range(256)) * 10)
+        fake = FakeDropbox()
+        fake.files["/backup/archive.zip"] = b"older archive"
+
+        self.upload(archive, fake, chunk_size)
+
+        assert fake.calls
+        assert fake.files["/backup/archive.zip"] == archive.read_bytes()
+
+
+class TestDropboxFileExists:
+    def test_existing_and_missing_file(self):
+        fake = FakeDropbox()
+        fake.files["/backup/2023-01-01.zip"] = b"archive"
+
+        with patch('retrieval.send2dropbox.dropbox.Dropbox', return_value=fake):
+            assert dropbox_file_exists("/backup/2023-01-01.zip", MagicMock())
+            assert not dropbox_file_exists("/backup/2023-01-02.zip", MagicMock())
+
+    def test_auth_error_is_raised(self):
+        fake = MagicMock()
+        fake.files_get_metadata.side_effect = AuthError(error="Test Auth error", request_id="test_request_id")
+
+        with patch('retrieval.send2dropbox.dropbox.Dropbox', return_value=fake), \
+                patch('retrieval.send2dropbox.sleep') as mock_sleep:
+            with pytest.raises(AuthError):
+                dropbox_file_exists("/backup/2023-01-01.zip", MagicMock())
+
+        mock_sleep.assert_not_called()
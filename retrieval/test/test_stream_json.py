@@ -0,0 +1,49 @@
+import json
+import pytest
+
+from retrieval.stream_json import iter_json_array, JSONStreamError
+
+
+class FakeStream:
+    def __init__(self, payload: bytes, split: int):
+        self.payload = payload
+        self.split = split
+
+    async def iter_chunked(self, chunk_size):
+        for i in range(0, len(self.payload), self.split):
+            yield self.payload[i:i + self.split]
+
+
+async def collect(payload: bytes, split: int):
+    return [item async for item in iter_json_array(FakeStream(payload, split))]
+
+
+class TestIterJsonArray:
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("split", [1, 3, 7, 64, 10_000])
+    async def test_records_split_across_chunks(self, split):
+        records = [{"time_tag": f"2023-01-01T00:00:{i:02d}", "bt": i * 1.5, "name": "zażółć"} for i in range(50)]
+        payload = json.dumps(records, ensure_ascii=False).encode("utf-8")
+
+        assert await collect(payload, split) == records
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("split", [1, 2, 5])
+    async def test_scalars_split_across_chunks(self, split):
+        payload = b' [12345, -0.5e3, "a,b]", null, true , [1, 2]] \n'
+
+        assert await collect(payload, split) == [12345, -500.0, "a,b]", None, True, [1, 2]]
+
+    @pytest.mark.asyncio
+    async def test_empty_array(self):
+        assert await collect(b"[]", 1) == []
+
+    @pytest.mark.asyncio
+    async def test_not_an_array(self):
+        with pytest.raises(JSONStreamError, match="not a JSON array"):
+            await collect(b'{"key": 1}', 4)
+
+    @pytest.mark.asyncio
+    async def test_truncated_payload(self):
+        with pytest.raises(JSONStreamError, match="Unexpected end"):
+            await collect(b'[{"key": 1}, {"key": ', 4)
@@ -0,0 +1,71 @@
+import json
+import threading
+import pytest
+
+from retrieval.timing import RUN, RunReport, feed_context, span
+
+
+class TestRunReport:
+    def test_spans_aggregated_per_feed_and_stage(self):
+        report = RunReport("2024-05-10")
+
+        with report.activate():
+            with feed_context("feed"):
+                for rows in (10, 20):
+                    with span("write") as written:
+                        written.rows = rows
+                        written.bytes = rows * 8
+            with span("upload"):
+                pass
+
+        assert report.stages["feed"]["write"]["count"] == 2
+        assert report.stages["feed"]["write"]["rows"] == 30
+        assert report.stages["feed"]["write"]["bytes"] == 240
+        assert report.stages[RUN]["upload"]["count"] == 1
+        assert report.totals()["write"]["rows"] == 30
+
+    def test_failed_span_counted_as_error(self):
+        report = RunReport("2024-05-10")
+
+        with report.activate(), pytest.raises(ValueError):
+            with span("decode"):
+                raise ValueError("invalid payload")
+
+        assert report.stages[RUN]["decode"]["errors"] == 1
+
+    def test_span_outside_report_is_dropped(self):
+        report = RunReport("2024-05-10")
+
+        with span("write"):
+            pass
+
+        assert report.stages == {}
+
+    def test_written_on_exit(self, tmp_path):
+        report = RunReport("2024-05-10")
+        path = tmp_path / "report.json"
+
+        with pytest.raises(RuntimeError):
+            with report.activate(path), span("download"):
+                raise RuntimeError("connection reset")
+
+        data = json.loads(path.read_text())
+        assert data["run"] == "2024-05-10"
+        assert data["feeds"][RUN]["download"]["errors"] == 1
+
+    def test_concurrent_spans(self):
+        report = RunReport("2024-05-10")
+
+        def write():
+            with report.activate():
+                for _ in range(1000):
+                    with span("write") as written:
+                        written.rows = 1
+
+        threads = [threading.Thread(target=write) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert report.stages[RUN]["write"]["rows"] == 4000
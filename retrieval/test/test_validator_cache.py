@@ -0,0 +1,79 @@
+import json
+import pytest
+
+from retrieval.validator_cache import ValidatorCache, INDEX_FILE
+from retrieval.fetch_data import retrieve_data
+from retrieval.archive import DirectorySink
+
+
+class TestValidatorCache:
+    def test_no_headers_without_cached_entry(self, tmp_path):
+        cache = ValidatorCache(tmp_path)
+
+        assert cache.request_headers("f10-7cm-flux") == {}
+
+    def test_store_and_request_headers(self, tmp_path):
+        (tmp_path / "out.csv").write_text("a,b\n1,2\n")
+        cache = ValidatorCache(tmp_path / "cache")
+
+        cache.store(
+            "f10-7cm-flux",
+            {"ETag": '"abc"', "Last-Modified": "Mon, 01 Jan 2024 00:00:00 GMT"},
+            DirectorySink(tmp_path),
+            "out.csv"
+        )
+
+        assert cache.request_headers("f10-7cm-flux") == {
+            "If-None-Match": '"abc"',
+            "If-Modified-Since": "Mon, 01 Jan 2024 00:00:00 GMT"
+        }
+        assert cache.cached_file("f10-7cm-flux").read_text() == "a,b\n1,2\n"
+
+    def test_survives_restart(self, tmp_path):
+        (tmp_path / "out.csv").write_text("a\n1\n")
+        ValidatorCache(tmp_path / "cache").store("feed", {"ETag": '"abc"'}, DirectorySink(tmp_path), "out.csv")
+
+        reopened = ValidatorCache(tmp_path / "cache")
+
+        assert reopened.request_headers("feed") == {"If-None-Match": '"abc"'}
+        assert json.loads((tmp_path / "cache" / INDEX_FILE).read_text())["feed"]["etag"] == '"abc"'
+
+    def test_store_without_validators_forgets_feed(self, tmp_path):
+        (tmp_path / "out.csv").write_text("a\n1\n")
+        sink = DirectorySink(tmp_path)
+        cache = ValidatorCache(tmp_path / "cache")
+        cache.store("feed", {"ETag": '"abc"'}, sink, "out.csv")
+
+        cache.store("feed", {}, sink, "out.csv")
+
+        assert cache.request_headers("feed") == {}
+
+    def test_restore(self, tmp_path):
+        (tmp_path / "out.csv").write_text("a\n1\n")
+        sink = DirectorySink(tmp_path)
+        cache = ValidatorCache(tmp_path / "cache")
+        cache.store("feed", {"ETag": '"abc"'}, sink, "out.csv")
+
+        assert cache.restore("feed", sink, "restored.csv")
+        assert (tmp_path / "restored.csv").read_text() == "a\n1\n"
+        assert not cache.restore("other", sink, "other.csv")
+        assert not cache.restore("feed", sink, "restored.parquet")
+
+    def test_corrupted_index_is_ignored(self, tmp_path):
+        (tmp_path / INDEX_FILE).write_text("{not json")
+
+        assert ValidatorCache(tmp_path).validators == {}
+
+    @pytest.mark.asyncio
+    async def test_not_modified_reuses_cached_csv(self, feed_server, tmp_path):
+        url = str(feed_server.make_url("/f10-7cm-flux.json"))
+        cache = ValidatorCache(tmp_path / "cache")
+
+        await retrieve_data("f10-7cm-flux", url, tmp_path / "day1", cache=cache)
+        await retrieve_data("f10-7cm-flux", url, tmp_path / "day2", cache=cache)
+
+        day1 = next((tmp_path / "day1").glob("*.csv")).read_text()
+        day2 = next((tmp_path / "day2").glob("*.csv")).read_text()
+        assert feed_server.stats.requests == 2
+        assert feed_server.stats.not_modified == 1
+        assert day2 == day1
@@ -0,0 +1,106 @@
+from retrieval.watermarks import WatermarkStore, record_key
+
+
+class TestWatermarkStore:
+    def test_no_mark_writes_everything(self, tmp_path):
+        store = WatermarkStore(tmp_path)
+        watermark = store.feed("feed", "2024-01-02")
+
+        records = [{"time_tag": "2024-01-01T00:00:00"}, {"time_tag": "2024-01-01T00:01:00"}]
+
+        assert watermark.filter(records, appending=False) == records
+        assert watermark.newest == "2024-01-01T00:01:00"
+
+    def test_filter_drops_old_records(self, tmp_path):
+        store = WatermarkStore(tmp_path)
+        store.advance("feed", "2024-01-01", "2024-01-01T00:01:00")
+        watermark = store.feed("feed", "2024-01-02")
+
+        kept = watermark.filter([
+            {"time_tag": "2024-01-01T00:00:00"},
+            {"time_tag": "2024-01-01T00:01:00"},
+            {"time_tag": "2024-01-01T00:02:00"},
+            {"other": 1},
+        ], appending=False)
+
+        assert kept == [{"time_tag": "2024-01-01T00:02:00"}, {"other": 1}]
+        assert watermark.skipped == 2
+
+    def test_store_advances_only_on_commit(self, tmp_path):
+        store = WatermarkStore(tmp_path)
+        watermark = store.feed("feed", "2024-01-02")
+        watermark.filter([{"time_tag": "2024-01-01T00:05:00"}], appending=False)
+
+        assert store.cutoff("feed", "2024-01-02", appending=True) is None
+        watermark.commit()
+        assert store.cutoff("feed", "2024-01-02", appending=True) == "2024-01-01T00:05:00"
+
+    def test_rerun_on_same_date(self, tmp_path):
+        store = WatermarkStore(tmp_path)
+        store.advance("feed", "2024-01-01", "2024-01-01T00:00:00")
+        store.advance("feed", "2024-01-02", "2024-01-02T00:00:00")
+
+        # a fresh output of the same date is rebuilt from the mark of the previous date
+        assert store.cutoff("feed", "2024-01-02", appending=False) == "2024-01-01T00:00:00"
+        # an existing output of the same date is only appended to
+        assert store.cutoff("feed", "2024-01-02", appending=True) == "2024-01-02T00:00:00"
+        assert store.cutoff("feed", "2024-01-03", appending=False) == "2024-01-02T00:00:00"
+
+    def test_marks_never_move_back(self, tmp_path):
+        store = WatermarkStore(tmp_path)
+        store.advance("feed", "2024-01-02", "2024-01-02T00:05:00")
+        store.advance("feed", "2024-01-02", "2024-01-02T00:01:00")
+
+        assert store.cutoff("feed", "2024-01-02", appending=True) == "2024-01-02T00:05:00"
+
+    def test_save_and_load(self, tmp_path):
+        store = WatermarkStore(tmp_path)
+        store.advance("feed", "2024-01-02", "2024-01-02T00:05:00")
+        store.save()
+
+        assert WatermarkStore(tmp_path).marks == store.marks
+
+    def test_records_of_the_mark_published_later_are_written(self, tmp_path):
+        store = WatermarkStore(tmp_path)
+        first = store.feed("feed", "2024-01-02")
+        first.filter([
+            {"time_tag": "2024-01-02T00:00:00", "satellite": 16},
+            {"time_tag": "2024-01-02T00:01:00", "satellite": 16},
+        ], appending=False)
+        first.commit()
+
+        second = store.feed("feed", "2024-01-02")
+        kept = second.filter([
+            {"time_tag": "2024-01-02T00:00:00", "satellite": 18},
+            {"time_tag": "2024-01-02T00:01:00", "satellite": 16},
+            {"time_tag": "2024-01-02T00:01:00", "satellite": 18},
+        ], appending=True)
+        second.commit()
+
+        assert kept == [{"time_tag": "2024-01-02T00:01:00", "satellite": 18}]
+        assert second.skipped == 2
+        assert store.written("feed", "2024-01-02", appending=True) == {
+            record_key({"time_tag": "2024-01-02T00:01:00", "satellite": satellite}) for satellite in (16, 18)
+        }
+
+    def test_newer_mark_replaces_keys(self, tmp_path):
+        store = WatermarkStore(tmp_path)
+        store.advance("feed", "2024-01-02", "2024-01-02T00:00:00", ["a", "b"])
+        store.advance("feed", "2024-01-02", "2024-01-02T00:00:00", ["c"])
+        assert store.written("feed", "2024-01-02", appending=True) == {"a", "b", "c"}
+
+        store.advance("feed", "2024-01-02", "2024-01-02T00:01:00", ["d"])
+        assert store.written("feed", "2024-01-02", appending=True) == {"d"}
+        # a fresh output of the next date starts from the mark and keys of this one
+        store.advance("feed", "2024-01-03", "2024-01-03T00:00:00", ["e"])
+        assert store.written("feed", "2024-01-03", appending=False) == {"d"}
+
+    def test_marks_without_keys_skip_every_record_of_the_mark(self, tmp_path):
+        store = WatermarkStore(tmp_path)
+        store.advance("feed", "2024-01-02", "2024-01-02T00:00:00")
+        watermark = store.feed("feed", "2024-01-02")
+
+        kept = watermark.filter([{"time_tag": "2024-01-02T00:00:00", "satellite": 18}], appending=True)
+
+        assert kept == []
+        assert store.written("feed", "2024-01-02", appending=True) is None
@@ -0,0 +1,122 @@
+import pytest
+
+from retrieval.writers import CsvAppender, make_appender
+from retrieval.archive import DirectorySink
+
+
+class TestCsvAppender:
+    def test_header_only_for_new_file(self, tmp_path):
+        filename = tmp_path / "feed.csv"
+
+        for rows in ([[1, 2]], [[3, 4]]):
+            appender = CsvAppender(DirectorySink(tmp_path), "feed.csv")
+            if appender.open():
+                appender.write_header(["a", "b"])
+            appender.write_rows(rows)
+            appender.close()
+
+        assert filename.read_text().splitlines() == ["a,b", "1,2", "3,4"]
+
+    def test_rollback_drops_rows_of_current_write(self, tmp_path):
+        filename = tmp_path / "feed.csv"
+        filename.write_text("a,b\r\n1,2\r\n")
+
+        appender = CsvAppender(DirectorySink(tmp_path), "feed.csv")
+        assert not appender.open()
+        appender.write_rows([[3, 4], [5, 6]])
+        appender.rollback()
+        appender.close()
+
+        assert filename.read_text().splitlines() == ["a,b", "1,2"]
+
+
+class TestParquetAppender:
+    def test_batches_are_unified(self, tmp_path):
+        pq = pytest.importorskip("pyarrow.parquet")
+        filename = tmp_path / "feed.parquet"
+
+        appender = make_appender(DirectorySink(tmp_path), "feed.parquet", "parquet")
+        assert appender.open()
+        appender.write_header(["time_tag", "flux", "energy"])
+        appender.write_rows([["2024-01-01T00:00:00", 0, None], ["2024-01-01T00:01:00", 1, None]])
+        appender.write_rows([["2024-01-01T00:02:00", 1.5e-8, ">=10 MeV"]])
+        appender.close()
+
+        table = pq.read_table(filename)
+        assert table.column_names == ["time_tag", "flux", "energy"]
+        assert str(table.schema.field("flux").type) == "double"
+        assert table.column("flux").to_pylist() == [0.0, 1.0, 1.5e-8]
+        assert table.column("energy").to_pylist() == [None, None, ">=10 MeV"]
+
+    def test_rollback_writes_nothing(self, tmp_path):
+        pytest.importorskip("pyarrow")
+        filename = tmp_path / "feed.parquet"
+
+        appender = make_appender(DirectorySink(tmp_path), "feed.parquet", "parquet")
+        appender.open()
+        appender.write_header(["a"])
+        appender.write_rows([[1]])
+        appender.rollback()
+        appender.close()
+
+        assert not filename.exists()
+
+    def test_existing_file_is_merged(self, tmp_path):
+        pq = pytest.importorskip("pyarrow.parquet")
+
+        for rows in ([[1, "a"]], [[2, "b"]]):
+            appender = make_appender(DirectorySink(tmp_path), "feed.parquet", "parquet")
+            if appender.open():
+                appender.write_header(["value", "name"])
+            appender.write_rows(rows)
+            appender.close()
+
+        table = pq.read_table(tmp_path / "feed.parquet")
+        assert table.column_names == ["value", "name"]
+        assert table.column("value").to_pylist() == [1, 2]
+
+    def test_rollback_keeps_existing_file(self, tmp_path):
+        pq = pytest.importorskip("pyarrow.parquet")
+        appender = make_appender(DirectorySink(tmp_path), "feed.parquet", "parquet")
+        appender.open()
+        appender.write_header(["a"])
+        appender.write_rows([[1]])
+        appender.close()
+
+        appender = make_appender(DirectorySink(tmp_path), "feed.parquet", "parquet")
+        assert not appender.open()
+        appender.write_rows([[2]])
+        appender.rollback()
+        appender.close()
+
+        assert pq.read_table(tmp_path / "feed.parquet").column("a").to_pylist() == [1]
+
+    def test_failed_write_keeps_existing_file(self, tmp_path, monkeypatch):
+        pq = pytest.importorskip("pyarrow.parquet")
+        appender = make_appender(DirectorySink(tmp_path), "feed.parquet", "parquet")
+        appender.open()
+        appender.write_header(["a"])
+        appender.write_rows([[1]])
+        appender.close()
+
+        appender = make_appender(DirectorySink(tmp_path), "feed.parquet", "parquet")
+        appender.open()
+        appender.write_rows([[2]])
+
+        def fail(table, file, **kwargs):
+            file.write(b"PAR1")
+            raise OSError("disk full")
+
+        monkeypatch.setattr(pq, "write_table", fail)
+        with pytest.raises(OSError):
+            appender.close()
+        monkeypatch.undo()
+
+        assert pq.read_table(tmp_path / "feed.parquet").column("a").to_pylist() == [1]
+        assert [p.name for p in tmp_path.iterdir()] == ["feed.parquet"]
+
+
+class TestMakeAppender:
+    def test_unknown_format(self, tmp_path):
+        with pytest.raises(ValueError, match="Unknown output format"):
+            make_appender(DirectorySink(tmp_path), "feed.xml", "xml")
@@ -0,0 +1,181 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Iterator, Optional, Union
+import aiohttp
+
+# stages of a feed in the order they happen, stages of the whole run are recorded under RUN
+STAGES = ("dns", "connect", "request", "download", "decode", "stream", "flatten", "write", "compress", "upload")
+RUN = "run"
+
+_report: ContextVar[Optional["RunReport"]] = ContextVar("run_report", default=None)
+_feed: ContextVar[str] = ContextVar("feed", default=RUN)
+
+
+class Span:
+    """
+    A single timed stage, bytes and rows are filled in by the timed code when it knows them
+    """
+    def __init__(self, feed: str, stage: str):
+        self.feed = feed
+        self.stage = stage
+        self.bytes = 0
+        self.rows = 0
+        self.ok = True
+        self.started_at = time.perf_counter()
+        self.duration = 0.0
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.started_at
+
+
+class RunReport:
+    """
+    Durations, byte and row counts of the stages of every feed in a run. Spans are aggregated as they finish,
+    so a report stays small however many batches are written, and can be recorded from the writer thread
+    """
+    def __init__(self, name: str):
+        """
+        :param name: name of the run, the date of its archive
+        """
+        self.name = name
+        self.started_at = datetime.now()
+        self._start = time.perf_counter()
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, span: Span):
+        with self._lock:
+            stage = self.stages.setdefault(span.feed, {}).setdefault(
+                span.stage, {"count": 0, "errors": 0, "seconds": 0.0, "bytes": 0, "rows": 0}
+            )
+            stage["count"] += 1
+            stage["errors"] += not span.ok
+            stage["seconds"] += span.duration
+            stage["bytes"] += span.bytes
+            stage["rows"] += span.rows
+
+    def totals(self) -> dict:
+        """
+        :return: stage -> seconds, bytes and rows summed over all feeds
+        """
+        totals = {}
+        with self._lock:
+            for stages in self.stages.values():
+                for stage, stats in stages.items():
+                    total = totals.setdefault(stage, {"seconds": 0.0, "bytes": 0, "rows": 0})
+                    for key in total:
+                        total[key] += stats[key]
+        return dict(sorted(totals.items(), key=lambda item: _stage_rank(item[0])))
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            feeds = {
+                feed: dict(sorted(stages.items(), key=lambda item: _stage_rank(item[0])))
+                for feed, stages in self.stages.items()
+            }
+        return {
+            "run": self.name,
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "seconds": time.perf_counter() - self._start,
+            "totals": self.totals(),
+            "feeds": feeds,
+        }
+
+    def write(self, path: Union[str, Path]):
+        """
+        Write the report as JSON
+        """
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @contextmanager
+    def activate(self, path: Optional[Union[str, Path]] = None) -> Iterator["RunReport"]:
+        """
+        Record spans of the current context, and of the tasks and executor jobs it starts, into this report
+
+        :param path: the report is written there when the block exits, also when it fails
+        """
+        token = _report.set(self)
+        try:
+            yield self
+        finally:
+            _report.reset(token)
+            if path is not None:
+                self.write(path)
+
+
+@contextmanager
+def feed_context(name: str) -> Iterator[None]:
+    """
+    Attribute spans of the current context to a feed
+    """
+    token = _feed.set(name)
+    try:
+        yield
+    finally:
+        _feed.reset(token)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[Span]:
+    """
+    Time a stage of the current feed, a span raising an exception is counted as an error.
+    Outside of an active report the span is measured and dropped
+
+    :param stage: one of STAGES
+    """
+    current = Span(_feed.get(), stage)
+    try:
+        yield current
+    except BaseException:
+        current.ok = False
+        raise
+    finally:
+        current.finish()
+        report = _report.get()
+        if report is not None:
+            report.add(current)
+
+
+def trace_config() -> aiohttp.TraceConfig:
+    """
+    Client session tracing recording DNS resolution, connecting and waiting for response headers as spans
+    of the feed issuing the request. Connections reused from the pool have no dns and connect spans
+    """
+    config = aiohttp.TraceConfig()
+
+    def start(stage: str):
+        async def on_start(session, context: SimpleNamespace, params):
+            setattr(context, stage, Span(_feed.get(), stage))
+        return on_start
+
+    def end(stage: str, ok: bool = True):
+        async def on_end(session, context: SimpleNamespace, params):
+            current = getattr(context, stage, None)
+            report = _report.get()
+            if current is None or report is None:
+                return
+            current.ok = ok
+            current.finish()
+            report.add(current)
+            setattr(context, stage, None)
+        return on_end
+
+    config.on_dns_resolvehost_start.append(start("dns"))
+    config.on_dns_resolvehost_end.append(end("dns"))
+    config.on_connection_create_start.append(start("connect"))
+    config.on_connection_create_end.append(end("connect"))
+    config.on_request_start.append(start("request"))
+    config.on_request_end.append(end("request"))
+    config.on_request_exception.append(end("request", ok=False))
+    return config
+
+
+def _stage_rank(stage: str) -> int:
+    return STAGES.index(stage) if stage in STAGES else len(STAGES)
@@ -0,0 +1,99 @@
+import json
+from os import getenv
+from pathlib import Path
+from typing import Union, Mapping
+
+CACHE_DIR = Path(getenv("RETRIEVAL_CACHE_DIR", Path(__file__).parent / "cache"))
+INDEX_FILE = "validators.json"
+
+
+class ValidatorCache:
+    """
+    Persistent cache of HTTP validators (ETag / Last-Modified) and the last file written for each feed,
+    used to send conditional requests and reuse the previous output when the server answers 304
+    """
+    def __init__(self, cache_dir: Union[str, Path] = CACHE_DIR):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.cache_dir / INDEX_FILE
+        self.validators = self.load()
+
+    def load(self) -> dict:
+        """
+        Load validators saved by the previous run
+        """
+        if not self.index_path.exists():
+            return {}
+        try:
+            with open(self.index_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        """
+        Save validators atomically, so an interrupted run does not corrupt the index
+        """
+        tmp_path = self.index_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.validators, f, indent=2)
+        tmp_path.replace(self.index_path)
+
+    def cached_file(self, target_name: str, suffix: str = ".csv") -> Path:
+        """
+        Path of the cached output of a feed
+        """
+        return self.cache_dir / f"{target_name}{suffix}"
+
+    def request_headers(self, target_name: str, suffix: str = ".csv") -> dict:
+        """
+        Build conditional request headers for a feed
+
+        :param target_name: name of the feed
+        :param suffix: suffix of the output file, output cached in another format cannot be reused
+        :return: headers to be sent with the request, empty if nothing can be reused
+        """
+        entry = self.validators.get(target_name)
+        if not entry or entry.get("suffix", ".csv") != suffix or not self.cached_file(target_name, suffix).exists():
+            return {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def store(self, target_name: str, response_headers: Mapping, sink, name: str):
+        """
+        Remember validators of a fresh response together with a copy of the written output
+
+        :param target_name: name of the feed
+        :param response_headers: headers of the response
+        :param sink: DirectorySink or ZipSink the output was written to
+        :param name: name of the output file
+        """
+        etag = response_headers.get("ETag")
+        last_modified = response_headers.get("Last-Modified")
+        if not etag and not last_modified:
+            self.validators.pop(target_name, None)
+            self.save()
+            return
+        suffix = Path(name).suffix
+        sink.export(name, self.cached_file(target_name, suffix))
+        self.validators[target_name] = {"etag": etag, "last_modified": last_modified, "suffix": suffix}
+        self.save()
+
+    def restore(self, target_name: str, sink, name: str) -> bool:
+        """
+        Copy the cached output of a feed into the sink
+
+        :param target_name: name of the feed
+        :param sink: DirectorySink or ZipSink the output is written to
+        :param name: name of the output file
+        :return: False if nothing is cached
+        """
+        cached = self.cached_file(target_name, Path(name).suffix)
+        if not cached.exists():
+            return False
+        sink.add_file(name, cached)
+        return True
@@ -0,0 +1,161 @@
+import hashlib
+import json
+from pathlib import Path
+from typing import Iterable, Optional, Set, Tuple, Union
+
+from retrieval.validator_cache import CACHE_DIR
+
+INDEX_FILE = "watermarks.json"
+# field of the records compared with the watermark, records without it are always written
+TIME_FIELD = "time_tag"
+
+
+def record_key(record: dict) -> str:
+    """
+    Identity of a record, telling apart records of the same time_tag (e.g. of several satellites or energies)
+    """
+    return hashlib.sha1(json.dumps(record, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class WatermarkStore:
+    """
+    Persistent high-water marks of the feeds, the newest time_tag written by previous runs together with the keys
+    of the records written with it, used to append and archive only records which were not written yet.
+    Feeds with several records per time_tag may publish some of them in a later poll, so records of the newest
+    time_tag are compared by their keys rather than dropped.
+
+    Besides the newest time_tag every entry keeps the date of the run which wrote it and the mark from before
+    that date, so a rerun on the same date can rebuild a fresh output (a new zip archive or Parquet file)
+    with the same records, while appending to an existing output only adds what is new since the last run
+    """
+    def __init__(self, cache_dir: Union[str, Path] = CACHE_DIR):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.cache_dir / INDEX_FILE
+        self.marks = self.load()
+
+    def load(self) -> dict:
+        """
+        Load marks saved by the previous run
+        """
+        if not self.index_path.exists():
+            return {}
+        try:
+            with open(self.index_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        """
+        Save marks atomically, so an interrupted run does not corrupt the index
+        """
+        tmp_path = self.index_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.marks, f, indent=2)
+        tmp_path.replace(self.index_path)
+
+    def _mark(self, target_name: str, date: str, appending: bool) -> Tuple[Optional[str], Optional[list]]:
+        entry = self.marks.get(target_name)
+        if entry is None:
+            return None, None
+        if entry["date"] == date and not appending:
+            return entry["before"], entry.get("before_written")
+        return entry["time_tag"], entry.get("written")
+
+    def cutoff(self, target_name: str, date: str, appending: bool) -> Optional[str]:
+        """
+        Time tag up to which records of a feed were already written
+
+        :param target_name: name of the feed
+        :param date: date of the run, as used in output file names
+        :param appending: True when the output of this date already holds the records of an earlier run
+        :return: records with an earlier time_tag are skipped, None writes everything
+        """
+        return self._mark(target_name, date, appending)[0]
+
+    def written(self, target_name: str, date: str, appending: bool) -> Optional[Set[str]]:
+        """
+        Keys of the records written with the cutoff time_tag of a feed
+
+        :param target_name: name of the feed
+        :param date: date of the run, as used in output file names
+        :param appending: True when the output of this date already holds the records of an earlier run
+        :return: keys of record_key, None for marks saved without them, which skip every record of the cutoff
+        """
+        written = self._mark(target_name, date, appending)[1]
+        return set(written) if written is not None else None
+
+    def advance(self, target_name: str, date: str, time_tag: str, written: Optional[Iterable[str]] = None):
+        """
+        Move the mark of a feed forward
+
+        :param target_name: name of the feed
+        :param date: date of the run, as used in output file names
+        :param time_tag: newest written time_tag
+        :param written: keys of the records written with time_tag, None if unknown, every record of it is skipped then
+        """
+        keys = sorted(set(written)) if written is not None else None
+        entry = self.marks.get(target_name)
+        if entry is None or entry["date"] != date:
+            before, before_written = (entry["time_tag"], entry.get("written")) if entry is not None else (None, None)
+            self.marks[target_name] = {
+                "date": date, "before": before, "before_written": before_written, "time_tag": time_tag, "written": keys
+            }
+        elif time_tag > entry["time_tag"]:
+            entry["time_tag"], entry["written"] = time_tag, keys
+        elif time_tag == entry["time_tag"]:
+            previous = entry.get("written")
+            entry["written"] = sorted(set(previous) | set(keys)) if previous is not None and keys is not None else None
+
+    def feed(self, target_name: str, date: str) -> "FeedWatermark":
+        """
+        Create the watermark filtering a single fetch of a feed
+        """
+        return FeedWatermark(self, target_name, date)
+
+
+class FeedWatermark:
+    """
+    Filter records of a single fetch by the mark of its feed and remember the newest written time_tag
+    with the keys of its records. The store is advanced only by commit, so a failed attempt leaves the mark where it was
+    """
+    def __init__(self, store: WatermarkStore, target_name: str, date: str):
+        self.store = store
+        self.target_name = target_name
+        self.date = date
+        self.newest = None
+        self.written = set()
+        self.skipped = 0
+
+    def filter(self, records: list, appending: bool) -> list:
+        """
+        Drop records which were already written, time tags are compared as ISO 8601 strings
+
+        :param records: list of records
+        :param appending: True when the output of this date already holds the records of an earlier run
+        :return: records to be written
+        """
+        cutoff = self.store.cutoff(self.target_name, self.date, appending)
+        if cutoff is not None:
+            written = self.store.written(self.target_name, self.date, appending)
+            kept = [
+                record for record in records
+                if not record.get(TIME_FIELD) or record[TIME_FIELD] > cutoff
+                or (record[TIME_FIELD] == cutoff and written is not None and record_key(record) not in written)
+            ]
+            self.skipped += len(records) - len(kept)
+            records = kept
+        newest = max((record[TIME_FIELD] for record in records if record.get(TIME_FIELD)), default=None)
+        if newest is not None and (self.newest is None or newest > self.newest):
+            self.newest, self.written = newest, set()
+        if newest is not None and newest == self.newest:
+            self.written.update(record_key(record) for record in records if record.get(TIME_FIELD) == newest)
+        return records
+
+    def commit(self):
+        """
+        Advance the store to the newest written time_tag
+        """
+        if self.newest is not None:
+            self.store.advance(self.target_name, self.date, self.newest, self.written)
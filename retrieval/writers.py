@@ -0,0 +1,184 @@
+import csv
+import io
+from typing import Iterable
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+PARQUET_COMPRESSION = "zstd"
+
+
+class CsvAppender:
+    """
+    Append rows to a CSV file, writing the header only when the file is new.
+    All methods do blocking file I/O and are meant to be run on the writer executor
+    """
+    suffix = ".csv"
+    encoding = "utf-8"
+
+    def __init__(self, sink, name: str):
+        """
+        :param sink: DirectorySink or ZipSink the file is written to
+        :param name: name of the file
+        """
+        self.sink = sink
+        self.name = name
+        self.file = None
+        self.start_size = 0
+        # columns of a file appended to are not read back, the schema of the first batch is used
+        self.header = None
+
+    def open(self) -> bool:
+        """
+        Open the file for appending
+
+        :return: True if the file is empty and needs a header
+        """
+        self.file = self.sink.open(self.name, "ab")
+        self.start_size = self.file.tell()
+        return self.start_size == 0
+
+    def _write(self, rows: Iterable[Iterable]):
+        # format the whole batch at once, so the file gets a single write per batch
+        buffer = io.StringIO(newline="")
+        csv.writer(buffer).writerows(rows)
+        self.file.write(buffer.getvalue().encode(self.encoding))
+
+    def write_header(self, header: Iterable):
+        self._write([header])
+
+    def write_rows(self, rows: Iterable[Iterable]):
+        self._write(rows)
+
+    def write_columns(self, columns: list):
+        self._write(zip(*columns))
+
+    def rollback(self):
+        """
+        Drop everything written since the file was opened
+        """
+        if self.file is not None:
+            self.file.flush()
+            self.file.truncate(self.start_size)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class ParquetAppender:
+    """
+    Write rows to a typed, compressed Parquet file. Batches are kept as Arrow columns, which are
+    far more compact than decoded records, and written at close once their types are unified,
+    so a column holding ints in one batch and floats in another ends up as a float column.
+    Parquet files cannot be appended to, an existing file is read when opened and rewritten with the new batches.
+    Appending a poll therefore costs as much as rewriting the whole file, which makes Parquet unsuitable for
+    the polling daemon, where the file of a day is appended to many times
+    """
+    suffix = ".parquet"
+
+    def __init__(self, sink, name: str, compression: str = PARQUET_COMPRESSION):
+        """
+        :param sink: DirectorySink or ZipSink the file is written to
+        :param name: name of the file
+        :param compression: Parquet compression codec
+        """
+        if pa is None:
+            raise RuntimeError("pyarrow is required for Parquet output, install it with 'pip install pyarrow'")
+        self.sink = sink
+        self.name = name
+        self.compression = compression
+        self.header = None
+        self.tables = []
+        # number of tables read from the existing file
+        self.kept = 0
+
+    def open(self) -> bool:
+        """
+        Read the file written earlier, if any, its rows are written again together with the new ones
+
+        :return: True if there is no earlier file and the header has to be written
+        """
+        self.tables = []
+        self.kept = 0
+        if not self.sink.exists(self.name):
+            return True
+        with self.sink.open(self.name, "rb") as file:
+            existing = pq.read_table(file)
+        self.header = existing.column_names
+        self.tables = [existing]
+        self.kept = 1
+        return False
+
+    def write_header(self, header: Iterable):
+        self.header = [str(name) for name in header]
+
+    def write_rows(self, rows: Iterable[Iterable]):
+        columns = list(zip(*rows))
+        if not columns:
+            return
+        self.write_columns(columns)
+
+    def write_columns(self, columns: list):
+        self.tables.append(pa.table([pa.array(column) for column in columns], names=self.header))
+
+    def rollback(self):
+        self.tables = self.tables[:self.kept]
+
+    def close(self):
+        if len(self.tables) <= self.kept:
+            # nothing new, the earlier file (if any) stays as it is
+            self.tables = []
+            return
+        table = _concat_tables(self.tables)
+        self.tables = []
+        # a directory sink writes a temporary file moved over the earlier one, which a failed write keeps
+        with self.sink.open(self.name, "wb") as file:
+            pq.write_table(table, file, compression=self.compression)
+
+
+def _concat_tables(tables: list):
+    """
+    Concatenate batches promoting column types (null -> any type, int -> float),
+    columns mixing numbers with other types across batches are stored as strings
+    """
+    try:
+        return pa.concat_tables(tables, promote_options="permissive")
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        pass
+    conflicting = set()
+    for name in tables[0].column_names:
+        types = {t.schema.field(name).type for t in tables}
+        types = {t for t in types if not pa.types.is_null(t)}
+        if len(types) > 1 and not all(pa.types.is_integer(t) or pa.types.is_floating(t) for t in types):
+            conflicting.add(name)
+    tables = [
+        t.cast(pa.schema([pa.field(f.name, pa.string() if f.name in conflicting else f.type) for f in t.schema]))
+        for t in tables
+    ]
+    return pa.concat_tables(tables, promote_options="permissive")
+
+
+OUTPUT_FORMATS = {
+    "csv": CsvAppender,
+    "parquet": ParquetAppender,
+}
+
+
+def make_appender(sink, name: str, output_format: str = "csv"):
+    """
+    Create the appender for the selected output format
+
+    :param sink: DirectorySink or ZipSink the file is written to
+    :param name: name of the output file
+    :param output_format: one of OUTPUT_FORMATS
+    :return:
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format {output_format}, expected one of {', '.join(OUTPUT_FORMATS)}")
+    return OUTPUT_FORMATS[output_format](sink, name)